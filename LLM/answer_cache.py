@@ -0,0 +1,142 @@
+import hashlib
+import itertools
+import os
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+from metrics import metrics, CACHE_REQUESTS
+
+# --- Config ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "0") == "1"
+# Cosine similarity a new question needs to reuse a stored answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_CANDIDATES = 4
+
+ANSWER_SECONDS_SAVED = metrics.counter(
+    "assistant_answer_cache_seconds_saved_total", "Generation time skipped by replaying cached answers.")
+
+
+def context_key(context):
+    """Fingerprint of the retrieved chunks a reply was grounded on (None = no context)."""
+    digest = hashlib.sha256()
+    for chunk in context or ():
+        digest.update(chunk.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CachedAnswer:
+    __slots__ = ("question", "user_prompt", "answer", "rag_version", "context_key", "created", "gen_seconds", "hits")
+
+    def __init__(self, question, user_prompt, answer, rag_version, context_key, gen_seconds):
+        self.question = question
+        self.user_prompt = user_prompt  # the user turn as saved to history, context included
+        self.answer = answer
+        self.rag_version = rag_version
+        self.context_key = context_key
+        self.created = time.monotonic()
+        self.gen_seconds = gen_seconds
+        self.hits = 0
+
+
+class AnswerCache:
+    """
+    Reuses answers to questions that were already asked in other words.
+
+    Questions are looked up by their query embedding (the one retrieval
+    computes anyway) in a small inner-product FAISS index. A stored answer is
+    only replayed while it's still grounded on the same material: entries from
+    an older RAG index version, or whose retrieved chunks differ from the new
+    question's, are treated as stale and dropped. Eviction is LRU with a TTL.
+
+    Only opening questions belong here: a follow-up like "what about the
+    second one?" depends on the conversation, which the key doesn't cover.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._index = None  # built on first store, once the embedding size is known
+        self._entries = OrderedDict()  # id -> CachedAnswer, least recently used first
+        self._ids = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.array(embedding, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vector)  # inner product on unit vectors = cosine similarity
+        return vector
+
+    def lookup(self, embedding, rag_version, context):
+        """Returns the CachedAnswer for a similar question on the same context, or None."""
+        entry = self._find(embedding, rag_version, context_key(context))
+        if entry is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache="answer", result="miss")
+            return None
+        entry.hits += 1
+        self.hits += 1
+        self.seconds_saved += entry.gen_seconds
+        CACHE_REQUESTS.inc(cache="answer", result="hit")
+        ANSWER_SECONDS_SAVED.inc(entry.gen_seconds)
+        return entry
+
+    def store(self, question, user_prompt, embedding, rag_version, context, answer, gen_seconds):
+        if not answer:
+            return
+        vector = self._normalize(embedding)
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+        entry_id = next(self._ids)
+        self._index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+        self._entries[entry_id] = CachedAnswer(question, user_prompt, answer, rag_version, context_key(context),
+                                               gen_seconds)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_dropped": self.stale,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "seconds_saved": round(self.seconds_saved, 1),
+        }
+
+    def _find(self, embedding, rag_version, key):
+        if not self._entries:
+            return None
+        k = min(ANSWER_CACHE_CANDIDATES, len(self._entries))
+        scores, ids = self._index.search(self._normalize(embedding), k)
+        now = time.monotonic()
+        for score, entry_id in zip(scores[0], ids[0]):
+            if entry_id == -1 or score < self.threshold:
+                break  # results come best first
+            entry = self._entries.get(int(entry_id))
+            if entry is None:
+                continue
+            if now - entry.created > self.ttl or entry.rag_version != rag_version:
+                self.stale += 1
+                self._remove(int(entry_id))
+                continue
+            if entry.context_key != key:
+                continue  # same question, but it would be answered from different chunks now
+            self._entries.move_to_end(int(entry_id))
+            return entry
+        return None
+
+    def _remove(self, entry_id):
+        del self._entries[entry_id]
+        self._index.remove_ids(np.array([entry_id], dtype="int64"))
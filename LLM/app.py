@@ -1,27 +1,46 @@
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from fastapi.responses import StreamingResponse
-from fastapi import Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi import Request, WebSocket, WebSocketDisconnect
 import asyncio
-import tempfile
 from fastapi import Query
-import requests
 import json
-from datetime import datetime
 import os
 from fastapi import UploadFile, File
-import shutil
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+from pydantic import BaseModel
 
 # Assistant modules
-from rag_engine import load_rag_index, retrieve_context
-from whisper_transcript import whisper_transcript
-from chat import initialize_llm, get_gemma_response
-from caption import init_blip, caption_image
-from parse_weather import get_latest_weather_file, summarize_weather
+from rag_engine import embedder, load_rag_index, search_context, merge_contexts
+from whisper_transcript import init_whisper
+from voice_stream import StreamingTranscriber, pcm_from_int16
+from chat import initialize_llm, speculative_stats
+from llm_scheduler import init_scheduler, QueueFullError, STREAM_FLUSH_CHARS
+from prompt_cache import enable_prompt_cache
+from session_store import SessionStore
+from prompt_builder import PromptBuilder
+from embedding_service import EmbeddingService
+from ingestion import IngestionPipeline
+from doc_chunker import make_chunk_pool
+from model_registry import registry, ModelUnavailableError
+from stage_executor import StageExecutor, StageTimings
+from metrics import metrics
+import resources
+from answer_cache import AnswerCache, ANSWER_CACHE_ENABLED
+from caption import init_blip, CaptionEngine
+from weather_client import MarineWeatherClient, WeatherUnavailableError, WeatherAPIError, snap_to_grid
+from weather_store import WeatherStore, summary_text
+from weather_route import route_forecast, schedule_etas, ROUTE_MAX_WAYPOINTS
 
 # --- Config ---
 DISTANCE_THRESHOLD = 1.2
+# Per-request stage breakdown in a Server-Timing header (browser devtools show it)
+TIMING_HEADER = os.getenv("TIMING_HEADER", "1") == "1"
 
 # --- FastAPI setup ---
 app = FastAPI()
@@ -34,168 +53,567 @@ app.add_middleware(
 )
 
 # --- Global Models ---
-llm = None
-blip_processor = None
-blip_model = None
-rag_index = None
-rag_docs = None
-session_histories = {}
+# Lazy handles: each model loads on first use (or during background warm-up),
+# and requests that need a model still loading wait for it.
+prompt_cache = None
+prompt_builder = None
+session_store = SessionStore()
+stage_executor = StageExecutor(initializer=resources.pin_stage_thread)
+embedding_service = EmbeddingService(embedder, run=lambda fn, *args: stage_executor.run("embed", fn, *args))
+answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+weather_store = WeatherStore()
+weather_client = MarineWeatherClient(on_fresh=weather_store.append, fallback=weather_store.latest_response)
+
+# Models text chat can't answer without
+TEXT_CHAT_MODELS = ("llm", "embedder", "rag")
+
+
+# --- Model loaders ---
+def init_llm_pool(llm_factory=initialize_llm):
+    global prompt_cache, prompt_builder
+    scheduler = init_scheduler(llm_factory)
+    prompt_cache = enable_prompt_cache(scheduler.models)
+    prompt_builder = PromptBuilder(scheduler.models[0])
+    return scheduler
+
+async def load_llm_scheduler(llm_factory=initialize_llm):
+    scheduler = await asyncio.to_thread(init_llm_pool, llm_factory)
+    await scheduler.start()
+    return scheduler
+
+async def load_caption_engine():
+    blip_processor, blip_model = await asyncio.to_thread(init_blip)
+    return CaptionEngine(
+        blip_processor, blip_model, run=lambda fn, *args: stage_executor.run("caption", fn, *args)
+    )
+
+async def load_ingestion():
+    # One spawn-started chunking pool for the startup sync and every later upload
+    chunk_pool = make_chunk_pool()
+    rag_index, rag_docs = await load_rag_index(chunk_pool)
+    # Owns the live RAG snapshot and, from here on, the pool
+    return IngestionPipeline(rag_index, rag_docs, chunk_pool=chunk_pool).start()
+
+llm_scheduler = registry.register("llm", load_llm_scheduler)
+caption_engine = registry.register("blip", load_caption_engine)
+ingestion = registry.register("rag", load_ingestion)
+whisper_engine = registry.register("whisper", init_whisper)
+
+
+# --- Metrics ---
+REQUESTS = metrics.counter(
+    "assistant_requests_total", "HTTP requests by endpoint and status code.", ["endpoint", "status"])
+REQUEST_SECONDS = metrics.histogram(
+    "assistant_request_seconds", "Time to response headers by endpoint.", ["endpoint"])
+PROMPT_TOKENS = metrics.histogram(
+    "assistant_llm_prompt_tokens", "Prompt size per generation, in tokens.",
+    buckets=(64, 128, 256, 512, 1024, 1536, 2048, 4096))
+
+metrics.callback(
+    "assistant_model_ready", "1 once a model has loaded.", "gauge",
+    lambda: [({"model": name}, int(info["state"] == "ready")) for name, info in registry.status().items()],
+    ["model"])
+metrics.callback(
+    "assistant_llm_queue_depth", "Generations waiting for a free model.", "gauge",
+    lambda: [({}, llm_scheduler.get().stats()["queue_depth"] if llm_scheduler.ready else None)])
+metrics.callback(
+    "assistant_llm_active", "Generations running right now.", "gauge",
+    lambda: [({}, llm_scheduler.get().stats()["active"] if llm_scheduler.ready else None)])
+metrics.callback(
+    "assistant_rag_index_chunks", "Chunks in the live RAG index.", "gauge",
+    lambda: [({}, ingestion.get().snapshot.index.ntotal if ingestion.ready else None)])
+metrics.callback(
+    "assistant_sessions", "Chat sessions held in memory and on disk.", "gauge",
+    lambda: [({"where": where}, n) for where, n in session_store.stats().items() if where in ("in_memory", "on_disk")],
+    ["where"])
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Route template rather than raw path, so query strings don't explode the label set
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched"
+    REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
 
 
 # --- Startup Initialization ---
 @app.on_event("startup")
 async def startup_models():
-    global llm, blip_processor, blip_model, rag_index, rag_docs
-    print("🚀 Loading models...")
-    llm, (blip_processor, blip_model), (rag_index, rag_docs) = await asyncio.gather(
-        asyncio.to_thread(initialize_llm),
-        asyncio.to_thread(init_blip),
-        load_rag_index()
-    )
-    print("✅ All models initialized!")
+    # Don't wait: the server answers right away and models come up in the background
+    resources.apply_limits()
+    print("🚀 Warming up models in the background...")
+    registry.warm()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await weather_client.close()
+    if ingestion.ready:
+        await ingestion.get().stop()
+    stage_executor.shutdown()
+    session_store.close()  # writes out any queued turns
 
 @app.get("/health")
+@app.get("/health/live")
 def health():
-    return {"status": "Assistant is live and ready 🤖"}
+    return {"status": "Assistant is live 🤖"}
+
+@app.get("/health/ready")
+def health_ready():
+    ready = registry.is_ready(TEXT_CHAT_MODELS)
+    return JSONResponse(
+        content={"ready": ready, "models": registry.status()},
+        status_code=200 if ready else 503,
+    )
 
+@app.get("/llm-status")
+def llm_status():
+    stats = {
+        "models": registry.status(),
+        "sessions": session_store.stats(),
+        "embeddings": embedding_service.stats(),
+        "weather": {**weather_client.stats(), "store": weather_store.stats()},
+        "answer_cache": answer_cache.stats() if answer_cache else {"enabled": False},
+    }
+    if llm_scheduler.ready:
+        scheduler = llm_scheduler.get()
+        stats.update(
+            scheduler.stats(), prompt_cache=prompt_cache.stats(), speculative=speculative_stats(scheduler.models)
+        )
+    if caption_engine.ready:
+        stats["captions"] = caption_engine.get().stats()
+    return stats
+
+
+@app.get("/resources")
+def get_resources():
+    return resources.status()
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def model_unavailable(e):
+    return JSONResponse(
+        content={"error": str(e)},
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after)},
+    )
 
-@app.post("/text-chat")
-async def text_chat(user_input: str = Form(...), session_id: str = Form("default")):
-    try:
-        context, distances = retrieve_context(user_input, rag_index, rag_docs)
-        context_text = "\n- ".join(context) if distances[0] < DISTANCE_THRESHOLD else None
 
-        # Get or create chat history
-        chat_history = session_histories.get(session_id, [])
+def relevant_context(context, distances):
+    """Keeps retrieved chunks only when the best match is close enough."""
+    return context if distances[0] < DISTANCE_THRESHOLD else None
+
+
+async def embed_query(query, timings):
+    async with timings.measure("embed"):
+        return await embedding_service.embed(query)
+
+
+async def search(query_embedding, rag, timings):
+    return await stage_executor.run("search", search_context, query_embedding, rag.index, rag.docs, timings=timings)
+
+
+async def retrieve(query, rag, timings):
+    """Embeds the query through the batching service and searches off the event loop."""
+    return await search(await embed_query(query, timings), rag, timings)
+
 
-        # Get streaming generator with context and history
-        stream = get_gemma_response(llm, chat_history, user_input, context_text)
+async def caption_image(data, timings):
+    """Captions uploaded image bytes through the batching, caching caption engine."""
+    async with timings.measure("caption"):
+        engine = await caption_engine.aget()
+        return await engine.caption(data)
 
-        # Save updated history
-        session_histories[session_id] = chat_history
 
-        return StreamingResponse(stream(), media_type="text/plain")
+def wants_sse(request):
+    return "text/event-stream" in request.headers.get("accept", "")
+
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def stream_reply(frames, headers, sse, done_event, on_finish):
+    """
+    Streams text frames as plain text or Server-Sent Events. on_finish(reply,
+    completed) runs however the stream ends, including a client disconnect,
+    which Starlette surfaces by cancelling this generator.
+    """
+    async def stream():
+        reply, completed = [], False
+        try:
+            async for text in frames:
+                reply.append(text)
+                yield sse_event({"text": text}) if sse else text
+            completed = True
+            if sse:
+                yield sse_event(done_event(), "done")
+        except Exception as e:
+            if not sse:
+                raise
+            yield sse_event({"error": str(e)}, "error")
+        finally:
+            on_finish("".join(reply), completed)
+
+    if sse:
+        headers.update({"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(stream(), media_type="text/plain", headers=headers)
+
+
+async def replay_frames(answer):
+    for i in range(0, len(answer), STREAM_FLUSH_CHARS):
+        yield answer[i:i + STREAM_FLUSH_CHARS]
+
+
+def save_turn(session_id, user_prompt, reply):
+    if reply:
+        session_store.append(
+            session_id,
+            {"role": "user", "content": user_prompt},
+            {"role": "assistant", "content": reply},
+        )
+
+
+async def start_generation(session_id, user_input, context, timings, speculative=None):
+    """
+    Builds the prompt and queues the generation.
+    Returns (scheduler, job, user_prompt, usage); raises QueueFullError.
+    """
+    scheduler = await llm_scheduler.aget()
+    chat_history = session_store.get(session_id)
+    messages, user_prompt, usage = await stage_executor.run(
+        "prompt", prompt_builder.build, chat_history, user_input, context, timings=timings
+    )
+    PROMPT_TOKENS.observe(usage["system"] + usage["user"] + usage.get("context", 0) + usage.get("history", 0))
+    job = scheduler.submit(session_id, messages, speculative=speculative)
+    return scheduler, job, user_prompt, usage
+
+
+async def queue_reply(session_id, user_input, context=None, headers=None, timings=None, sse=False, answer_key=None,
+                      speculative=None):
+    """
+    Queues a generation on the shared LLM and streams it back, as plain text or
+    as Server-Sent Events. If the client disconnects mid-reply, generation is
+    stopped and whatever was produced so far is saved to the session.
+
+    answer_key is (query embedding, RAG version); with the answer cache on,
+    a similar earlier question on the same context is replayed instead. Only
+    the first question of a session is cached, since follow-ups depend on history.
+    speculative switches draft decoding for this reply (None = server default).
+    """
+    started = time.perf_counter()
+    timings = timings or StageTimings()
+    headers = dict(headers or {})
+
+    cacheable = answer_cache is not None and answer_key is not None and not session_store.get(session_id)
+    if cacheable:
+        cached = answer_cache.lookup(*answer_key, context)
+        headers["x-answer-cache"] = "miss" if cached is None else "hit"
+        if cached is not None:
+            if TIMING_HEADER:
+                headers["Server-Timing"] = timings.header()
+            return stream_reply(
+                replay_frames(cached.answer), headers, sse,
+                done_event=lambda: {"cached": True},
+                on_finish=lambda reply, _: save_turn(session_id, cached.user_prompt, reply),
+            )
+
+    try:
+        scheduler, job, user_prompt, usage = await start_generation(session_id, user_input, context, timings,
+                                                                    speculative)
+    except QueueFullError as e:
+        return JSONResponse(
+            content={"error": str(e)},
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    headers["x-prompt-tokens"] = json.dumps(usage)
+    if TIMING_HEADER:
+        headers["Server-Timing"] = timings.header()
+
+    def on_finish(reply, completed):
+        scheduler.cancel(job)  # no-op if it already finished
+        save_turn(session_id, user_prompt, reply)
+        if completed and cacheable:
+            answer_cache.store(user_input, user_prompt, *answer_key, context, reply, time.perf_counter() - started)
+
+    return stream_reply(
+        job.stream(), headers, sse,
+        done_event=lambda: {"completion_tokens": job.completion_tokens},
+        on_finish=on_finish,
+    )
+
 
+@app.post("/text-chat")
+async def text_chat(request: Request, user_input: str = Form(...), session_id: str = Form("default"),
+                    speculative: Optional[bool] = Form(None)):
+    try:
+        timings = StageTimings()
+        rag = (await ingestion.aget()).snapshot
+        query_embedding = await embed_query(user_input, timings)
+        context, distances = await search(query_embedding, rag, timings)
+        return await queue_reply(
+            session_id, user_input, relevant_context(context, distances), timings=timings, sse=wants_sse(request),
+            answer_key=(query_embedding, rag.version), speculative=speculative,
+        )
+
+    except ModelUnavailableError as e:
+        return model_unavailable(e)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 @app.post("/voice-chat")
-async def voice_chat(audio: UploadFile = File(...), session_id: str = Form("default")):
+async def voice_chat(request: Request, audio: UploadFile = File(...), session_id: str = Form("default"),
+                     speculative: Optional[bool] = Form(None)):
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-            tmp.write(await audio.read())
-            audio_path = tmp.name
-
-        user_text = whisper_transcript(audio_path)
-        os.remove(audio_path)
+        timings = StageTimings()
+        audio_bytes = await audio.read()
+        async with timings.measure("transcribe"):
+            user_text = await (await whisper_engine.aget()).transcribe(audio_bytes)
 
-        context, distances = retrieve_context(user_text, rag_index, rag_docs)
-        context_text = "\n- ".join(context) if distances[0] < DISTANCE_THRESHOLD else None
-
-        chat_history = session_histories.get(session_id, [])
-        stream = get_gemma_response(llm, chat_history, user_text, context_text)
-        session_histories[session_id] = chat_history
+        rag = (await ingestion.aget()).snapshot
+        query_embedding = await embed_query(user_text, timings)
+        context, distances = await search(query_embedding, rag, timings)
 
         headers = {"x-user-transcript": user_text}
-        return StreamingResponse(stream(), media_type="text/plain", headers=headers)
+        return await queue_reply(
+            session_id, user_text, relevant_context(context, distances), headers, timings, wants_sse(request),
+            answer_key=(query_embedding, rag.version), speculative=speculative,
+        )
 
+    except ModelUnavailableError as e:
+        return model_unavailable(e)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
-@app.post("/image-chat")
-async def image_chat(image: UploadFile = File(...), user_input: str = Form(...), session_id: str = Form("default")):
+async def send_voice_reply(websocket, session_id, user_text, timings):
+    """
+    Retrieves, generates and streams one reply over the voice WebSocket.
+    A failed reply is reported as an error event and the session stays open.
+    """
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_img:
-            tmp_img.write(await image.read())
-            img_path = tmp_img.name
+        context, distances = await retrieve(user_text, (await ingestion.aget()).snapshot, timings)
+        scheduler, job, user_prompt, _ = await start_generation(
+            session_id, user_text, relevant_context(context, distances), timings
+        )
+    except QueueFullError as e:
+        await websocket.send_json({"type": "error", "error": str(e), "retry_after": e.retry_after})
+        return
+    except ModelUnavailableError:
+        raise
+    except Exception as e:
+        await websocket.send_json({"type": "error", "error": f"Reply failed: {e}"})
+        return
 
-        caption = caption_image(blip_processor, blip_model, img_path)
-        os.remove(img_path)
+    reply = []
+    try:
+        async for text in job.stream():
+            reply.append(text)
+            await websocket.send_json({"type": "token", "text": text})
+        await websocket.send_json({"type": "done", "completion_tokens": job.completion_tokens,
+                                   "timings": timings.header() if TIMING_HEADER else None})
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        # If the socket itself is gone this send raises too, and voice_stream treats it as a disconnect
+        await websocket.send_json({"type": "error", "error": f"Reply failed: {e}"})
+    finally:
+        scheduler.cancel(job)  # stops generating if the socket dropped mid-reply
+        save_turn(session_id, user_prompt, "".join(reply))
+
+
+@app.websocket("/voice-stream")
+async def voice_stream(websocket: WebSocket, session_id: str = "default", sample_rate: int = 16000):
+    """
+    Streaming voice chat. The client sends 16-bit mono PCM as binary frames
+    (at `sample_rate`), and may send {"type": "end"} to close the utterance
+    without waiting for silence. The server answers with JSON events:
+    speech_start, partial (per transcribed segment), transcript, then the
+    reply as token events and a final done.
+    """
+    await websocket.accept()
+    try:
+        engine = await whisper_engine.aget()
+    except ModelUnavailableError as e:
+        await websocket.close(code=1013, reason=str(e))  # 1013 = try again later
+        return
+
+    transcriber = StreamingTranscriber(engine)
+
+    async def receive_audio():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    transcriber.feed(pcm_from_int16(message["bytes"], sample_rate))
+                elif message.get("text"):
+                    try:
+                        control = json.loads(message["text"])
+                    except ValueError:
+                        control = None
+                    if not isinstance(control, dict):
+                        transcriber.report_error('Text frames must be JSON objects, e.g. {"type": "end"}.')
+                    elif control.get("type") == "end":
+                        transcriber.flush()
+        finally:
+            transcriber.close()
+
+    receiver = asyncio.create_task(receive_audio())
+    try:
+        # VAD marks the start of each utterance; time the reply from when the user stopped talking
+        async for event in transcriber.events():
+            await websocket.send_json(event)
+            if event["type"] == "transcript" and event["text"].strip():
+                await send_voice_reply(websocket, session_id, event["text"], StageTimings())
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # client went away mid-send
+    except ModelUnavailableError as e:
+        await websocket.close(code=1013, reason=str(e))
+    finally:
+        receiver.cancel()
 
-        combined_input = f"The user said: {user_input}\nThe image appears to show: {caption}"
-        context, distances = retrieve_context(combined_input, rag_index, rag_docs)
-        context_text = "\n- ".join(context) if distances[0] < DISTANCE_THRESHOLD else None
 
-        chat_history = session_histories.get(session_id, [])
-        stream = get_gemma_response(llm, chat_history, combined_input, context_text)
-        session_histories[session_id] = chat_history
+@app.post("/image-chat")
+async def image_chat(request: Request, image: UploadFile = File(...), user_input: str = Form(...),
+                     session_id: str = Form("default"), speculative: Optional[bool] = Form(None)):
+    try:
+        timings = StageTimings()
+        rag = (await ingestion.aget()).snapshot
+
+        # Caption and retrieve on the user's words at the same time...
+        caption, text_hits = await asyncio.gather(
+            caption_image(await image.read(), timings),
+            retrieve(user_input, rag, timings),
+        )
+        # ...then add chunks matching the caption (one more embed + search, cheap next to BLIP)
+        caption_hits = await retrieve(caption, rag, timings)
+        context, distances = merge_contexts(text_hits, caption_hits)
 
+        combined_input = f"The user said: {user_input}\nThe image appears to show: {caption}"
         headers = {"x-image-caption": caption}
-        return StreamingResponse(stream(), media_type="text/plain", headers=headers)
+        return await queue_reply(
+            session_id, combined_input, relevant_context(context, distances), headers, timings, wants_sse(request),
+            speculative=speculative,
+        )
 
+    except ModelUnavailableError as e:
+        return model_unavailable(e)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
 @app.get("/marine-weather")
-def get_marine_weather(
+async def get_marine_weather(
     lat: float = Query(..., description="Latitude of the location"),
     lon: float = Query(..., description="Longitude of the location")
 ):
-    url = (
-        f"https://marine-api.open-meteo.com/v1/marine"
-        f"?latitude={lat}&longitude={lon}"
-        f"&hourly=wave_height,wind_wave_height,sea_surface_temperature"
-    )
-
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-    except requests.exceptions.RequestException as e:
-        return {"error": f"Network error: {e}"}
-
-    except json.JSONDecodeError:
-        return {"error": "Invalid JSON received from marine API."}
-
-    if "error" in data:
-        return {"error": data.get("reason", "Unknown API error.")}
-
-    LOG_DIRECTORY = "weather_logs"
-    os.makedirs(LOG_DIRECTORY, exist_ok=True)
-
-    # 🧹 Clean up old files
-    for filename in os.listdir(LOG_DIRECTORY):
-        if filename.endswith(".json"):
-            os.remove(os.path.join(LOG_DIRECTORY, filename))
-
-    # 📝 Save latest file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(LOG_DIRECTORY, f"weather_{timestamp}.json")
-
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=2)
-
-    print(f"✅ Weather data logged: {file_path}")
-    return data
+        data, meta = await weather_client.fetch(lat, lon)
+    except (WeatherUnavailableError, WeatherAPIError) as e:
+        return {"error": str(e)}
+
+    return JSONResponse(content=data, headers={"x-weather-cache": meta["cache"], "age": str(int(meta["age_s"]))})
+
+class Waypoint(BaseModel):
+    lat: float
+    lon: float
+    eta: Optional[datetime] = None  # naive times are taken as UTC
+
+class RouteRequest(BaseModel):
+    waypoints: List[Waypoint]
+    # Used to schedule waypoints that have no eta
+    departure: Optional[datetime] = None
+    speed_knots: Optional[float] = None
+
+
+def _unix(dt):
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+@app.post("/route-weather")
+async def route_weather(route: RouteRequest):
+    points = route.waypoints
+    if not points or len(points) > ROUTE_MAX_WAYPOINTS:
+        return JSONResponse(status_code=400, content={"error": f"Send 1 to {ROUTE_MAX_WAYPOINTS} waypoints."})
+
+    lats = np.array([p.lat for p in points])
+    lons = np.array([p.lon for p in points])
+    etas = np.array([_unix(p.eta) if p.eta else np.nan for p in points])
+    if np.isnan(etas).any():
+        if route.departure is None or not route.speed_knots:
+            return JSONResponse(status_code=400, content={"error": "Give every waypoint an eta, or a departure and speed_knots."})
+        scheduled = schedule_etas(lats, lons, _unix(route.departure), route.speed_knots)
+        etas = np.where(np.isnan(etas), scheduled, etas)
+
+    forecast = await route_forecast(weather_client, lats, lons, etas)
+    values = forecast["points"]
+    waypoints = [
+        {
+            "lat": float(lats[i]),
+            "lon": float(lons[i]),
+            "eta": datetime.fromtimestamp(float(etas[i]), timezone.utc).isoformat(timespec="minutes"),
+            "in_forecast": bool(forecast["in_range"][i]),
+            **{name: (None if np.isnan(v[i]) else round(float(v[i]), 2)) for name, v in values.items()},
+        }
+        for i in range(len(points))
+    ]
+    return {
+        "waypoints": waypoints,
+        "cells_fetched": forecast["cells"],
+        "cache": forecast["cache"],
+        "missing_cells": forecast["missing_cells"],
+    }
 
 @app.get("/marine-summary")
-def get_marine_summary():
-    try:
-        path = get_latest_weather_file()
-        summary = summarize_weather(path)
-        return {"summary": summary}
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+def get_marine_summary(
+    lat: float = Query(None, description="Latitude (defaults to the last fetched location)"),
+    lon: float = Query(None, description="Longitude (defaults to the last fetched location)")
+):
+    cell = None if lat is None or lon is None else snap_to_grid(lat, lon)
+    stats = weather_store.summary(cell)
+    if stats is None:
+        return JSONResponse(status_code=404, content={"error": "❌ No weather data found."})
+    return {"summary": summary_text(stats), "stats": stats}
 
 
 @app.post("/upload-doc")
 async def upload_document(file: UploadFile = File(...)):
     try:
-        os.makedirs("rag_folder", exist_ok=True)
-        save_path = os.path.join("rag_folder", file.filename)
-        with open(save_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        print(f"📥 Uploaded to: {save_path}")
-        return {"message": f"File {file.filename} uploaded successfully."}
+        pipeline = await ingestion.aget()
+        file_name = await asyncio.to_thread(pipeline.save_upload, file.filename, file.file)
+        job_id = pipeline.enqueue(file_name)
+        print(f"📥 Uploaded {file_name}, queued for indexing (job {job_id})")
+        return {"message": f"File {file_name} uploaded, indexing in background.", "job_id": job_id}
+    except ModelUnavailableError as e:
+        return model_unavailable(e)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+@app.get("/ingest-status")
+async def ingest_status(job_id: int = Query(None, description="Job id returned by /upload-doc")):
+    try:
+        pipeline = await ingestion.aget()
+    except ModelUnavailableError as e:
+        return model_unavailable(e)
+    status = pipeline.status(job_id)
+    if status is None:
+        return JSONResponse(content={"error": f"Unknown job {job_id}"}, status_code=404)
+    return status
+
 @app.post("/reset-session")
-def reset_session():
-    global chat_history
-    chat_history = []  # Clear it!
-    print("🔄 Chat history reset due to frontend reload")
+def reset_session(session_id: str = Form("default")):
+    session_store.reset(session_id)
+    print(f"🔄 Chat history reset for session '{session_id}'")
     return {"status": "reset"}
\ No newline at end of file
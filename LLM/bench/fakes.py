@@ -0,0 +1,129 @@
+# Deterministic stand-ins for the heavy models, so the benchmark measures the
+# serving stack (scheduling, batching, caching, streaming) rather than weights.
+# Each fake sleeps for a configurable, input-dependent time like the real one.
+import hashlib
+import re
+import time
+
+import numpy as np
+
+from caption import CaptionEngine
+from whisper_transcript import WhisperEngine, WHISPER_SAMPLE_RATE
+
+_WORDS = (
+    "the sea is calm today and the crew should keep a steady watch on deck while "
+    "waves stay low winds remain light and visibility is good for the next few hours"
+).split()
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _seed(text):
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "little")
+
+
+class FakeLlama:
+    """
+    Streams a deterministic reply: the prompt is "evaluated" at
+    prompt_tokens_per_s, then one word-token is emitted every 1/tokens_per_s.
+    Has no chat template, so prompt-cache warm-up is skipped.
+    """
+
+    def __init__(self, tokens_per_s=30.0, prompt_tokens_per_s=400.0, reply_tokens=64, n_ctx=2048):
+        self.tokens_per_s = tokens_per_s
+        self.prompt_tokens_per_s = prompt_tokens_per_s
+        self.reply_tokens = reply_tokens
+        self._n_ctx = n_ctx
+        self.metadata = {}
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def tokenize(self, text, add_bos=True, special=False):
+        # ~4 bytes per token, like a real BPE vocabulary on English text
+        return list(range(int(add_bos) + (len(text) + 3) // 4))
+
+    def set_cache(self, cache):
+        pass
+
+    def create_chat_completion(self, messages, stream=False, max_tokens=None, **kwargs):
+        prompt_tokens = sum(len(self.tokenize(m["content"].encode("utf-8"), add_bos=False)) for m in messages)
+        n = min(max_tokens or self.reply_tokens, self.reply_tokens)
+        seed = _seed(messages[-1]["content"])
+        words = [" " + _WORDS[(seed + i) % len(_WORDS)] for i in range(n)]
+
+        def chunks():
+            time.sleep(prompt_tokens / self.prompt_tokens_per_s)
+            yield {"choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]}
+            for word in words:
+                time.sleep(1.0 / self.tokens_per_s)
+                yield {"choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+            yield {"choices": [{"index": 0, "delta": {}, "finish_reason": "length"}]}
+
+        if stream:
+            return chunks()
+        for _ in chunks():
+            pass
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(words)},
+                             "finish_reason": "length"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": n}}
+
+
+class FakeTokenizer:
+    """Word/punctuation tokenizer with the offset mapping doc_chunker needs."""
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False):
+        spans = [m.span() for m in _TOKEN_RE.finditer(text)]
+        encoded = {"input_ids": list(range(len(spans)))}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = spans
+        return encoded
+
+
+class FakeEmbedder:
+    """SentenceTransformer stand-in: unit vectors seeded by the text's hash."""
+
+    def __init__(self, dim=384, batch_ms=4.0, per_text_ms=0.5):
+        self.dim = dim
+        self.batch_ms = batch_ms
+        self.per_text_ms = per_text_ms
+        self.tokenizer = FakeTokenizer()
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        time.sleep((self.batch_ms + self.per_text_ms * len(texts)) / 1000.0)
+        vectors = np.stack([
+            np.random.default_rng(_seed(text)).standard_normal(self.dim) for text in texts
+        ]).astype("float32")
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class FakeCaptionEngine(CaptionEngine):
+    """The real batching/caching engine with BLIP replaced by a sleep per batch."""
+
+    def __init__(self, batch_ms=250.0, per_image_ms=60.0, **kwargs):
+        super().__init__(None, None, **kwargs)
+        self.batch_ms = batch_ms
+        self.per_image_ms = per_image_ms
+
+    def _caption_batch(self, items):
+        time.sleep((self.batch_ms + self.per_image_ms * len(items)) / 1000.0)
+        return {key: f"a ship deck with ropes and a life buoy ({key[:6]})" for key in items}
+
+
+class FakeWhisperEngine(WhisperEngine):
+    """The real engine (decoding, worker pool) with whisper replaced by a sleep."""
+
+    def __init__(self, real_time_factor=0.15, workers=1):
+        super().__init__(workers=workers)
+        self.real_time_factor = real_time_factor
+
+    def load(self):
+        self.in_process = True
+        return self
+
+    def transcribe_pcm(self, pcm):
+        seconds = len(pcm) / WHISPER_SAMPLE_RATE
+        time.sleep(seconds * self.real_time_factor)
+        return "what is the weather looking like for the next watch"
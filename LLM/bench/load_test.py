@@ -0,0 +1,316 @@
+# Load test for the assistant API with deterministic stand-in models.
+#
+# Usage (from LLM/):
+#   python bench/load_test.py --concurrency 8 --requests 200 --mix text=6,voice=2,image=1,weather=1
+#
+# Boots app.py in-process under uvicorn with fake models and a local weather
+# stub, drives it with concurrent virtual users (one chat session each) and
+# writes latency percentiles, time-to-first-token, tokens/s and error rates to
+# bench/results/<timestamp>.json so runs can be compared across changes.
+import argparse
+import asyncio
+import functools
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from datetime import datetime
+
+import httpx
+import numpy as np
+
+LLM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LLM_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from weather_stub import start_weather_stub  # noqa: E402
+
+KINDS = ("text", "voice", "image", "weather")
+QUESTIONS = [
+    "How do I check the bilge pump?",
+    "What should I do if the engine overheats?",
+    "Can you explain the watch rotation?",
+    "How do I tie a bowline knot?",
+    "What are the signs of seasickness and how do I treat it?",
+    "I'm feeling a bit lonely on this voyage.",
+]
+POSITIONS = [(12.97, 74.80), (13.05, 74.62), (18.92, 72.83), (9.93, 76.26)]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test the assistant API with stubbed models.")
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users sending in parallel")
+    parser.add_argument("--requests", type=int, default=200, help="total requests across all users")
+    parser.add_argument("--mix", default="text=6,voice=2,image=1,weather=1", help="request mix weights")
+    parser.add_argument("--tokens-per-s", type=float, default=30.0, help="fake LLM decode speed")
+    parser.add_argument("--prompt-tokens-per-s", type=float, default=400.0, help="fake LLM prompt eval speed")
+    parser.add_argument("--reply-tokens", type=int, default=64, help="tokens per fake reply")
+    parser.add_argument("--audio-seconds", type=float, default=4.0, help="length of voice uploads")
+    parser.add_argument("--images", type=int, default=8, help="distinct images to rotate through")
+    parser.add_argument("--doc-chunks", type=int, default=2000, help="synthetic RAG corpus size (paragraphs)")
+    parser.add_argument("--weather-latency-ms", type=float, default=50.0)
+    parser.add_argument("--weather-error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default="", help="free-form tag stored with the results")
+    parser.add_argument("--out", default=None, help="results file (default bench/results/<timestamp>.json)")
+    return parser.parse_args()
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in KINDS:
+            raise SystemExit(f"Unknown request kind '{kind}'. Expected one of {KINDS}.")
+        weights[kind] = float(weight or 1)
+    return weights
+
+
+# --- Fixtures ---
+
+def seed_docs(folder, n_paragraphs, seed=0):
+    """Writes a synthetic manual so retrieval searches a realistically sized index."""
+    rng = random.Random(seed)
+    vocab = ("engine pump bilge valve rope knot deck hull anchor radio watch crew safety "
+             "fuel filter coolant battery lifejacket compass chart tide current").split()
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "bench_manual.txt"), "w") as f:
+        for i in range(n_paragraphs):
+            f.write(f"Section {i}. " + " ".join(rng.choice(vocab) for _ in range(120)) + ".\n\n")
+
+
+def make_wav(seconds, rate=16000):
+    t = np.arange(int(seconds * rate)) / rate
+    pcm = (0.2 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def install_fakes(app, rag_engine, args):
+    """Points every lazy model handle at a stand-in before the app starts."""
+    from fakes import FakeCaptionEngine, FakeEmbedder, FakeLlama, FakeWhisperEngine
+
+    def llm_factory():
+        return FakeLlama(args.tokens_per_s, args.prompt_tokens_per_s, args.reply_tokens)
+
+    async def load_captions():
+        return FakeCaptionEngine(run=lambda fn, *a: app.stage_executor.run("caption", fn, *a))
+
+    rag_engine.embedder.loader = FakeEmbedder
+    app.llm_scheduler.loader = functools.partial(app.load_llm_scheduler, llm_factory)
+    app.caption_engine.loader = load_captions
+    app.whisper_engine.loader = FakeWhisperEngine
+
+
+# --- Server ---
+
+def start_server(asgi_app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning"))
+    server.install_signal_handlers = lambda: None  # not on the main thread
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server, thread
+
+
+async def wait_until_ready(base_url, timeout=120):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                response = await client.get(f"{base_url}/health/ready")
+                models = response.json().get("models", {})
+                if models and all(m["state"] == "ready" for m in models.values()):
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit("App did not become ready in time.")
+
+
+# --- Load ---
+
+async def send(client, kind, session_id, rng, fixtures):
+    """Sends one request and times it. Chat replies are streamed to measure TTFT."""
+    record = {"kind": kind, "status": None, "latency_s": None, "ttft_s": None, "tokens": 0, "error": None}
+    question = rng.choice(QUESTIONS)
+    if kind == "text":
+        request = client.build_request("POST", "/text-chat", data={"user_input": question, "session_id": session_id})
+    elif kind == "voice":
+        request = client.build_request("POST", "/voice-chat", data={"session_id": session_id},
+                                       files={"audio": ("voice.wav", fixtures["wav"], "audio/wav")})
+    elif kind == "image":
+        image = rng.choice(fixtures["images"])
+        request = client.build_request("POST", "/image-chat", data={"user_input": question, "session_id": session_id},
+                                       files={"image": ("photo.jpg", image, "image/jpeg")})
+    else:
+        lat, lon = rng.choice(POSITIONS)
+        request = client.build_request("GET", "/marine-weather", params={"lat": lat, "lon": lon})
+
+    started = time.perf_counter()
+    try:
+        response = await client.send(request, stream=True)
+        record["status"] = response.status_code
+        text = []
+        async for piece in response.aiter_text():
+            if piece and record["ttft_s"] is None:
+                record["ttft_s"] = time.perf_counter() - started
+            text.append(piece)
+        await response.aclose()
+        body = "".join(text)
+        if response.status_code != 200:
+            record["error"] = f"HTTP {response.status_code}"
+        elif kind == "weather":
+            record["ttft_s"] = None
+            if "error" in json.loads(body):
+                record["error"] = "weather error payload"
+        else:
+            record["tokens"] = len(body.split())  # the fake LLM emits one word per token
+    except Exception as e:
+        record["error"] = type(e).__name__
+    record["latency_s"] = time.perf_counter() - started
+    return record
+
+
+async def run_load(base_url, args, fixtures):
+    rng = random.Random(args.seed)
+    weights = parse_mix(args.mix)
+    plan = rng.choices(list(weights), weights=list(weights.values()), k=args.requests)
+    queue = asyncio.Queue()
+    for kind in plan:
+        queue.put_nowait(kind)
+
+    records = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        async def user(n):
+            user_rng = random.Random(args.seed * 1000 + n)
+            while not queue.empty():
+                kind = queue.get_nowait()
+                records.append(await send(client, kind, f"bench-user-{n}", user_rng, fixtures))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(args.concurrency)))
+        wall_s = time.perf_counter() - started
+
+        status = (await client.get("/llm-status")).json()
+    return records, wall_s, status
+
+
+# --- Report ---
+
+def _percentiles(values):
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000
+    return {f"p{q}": round(float(np.percentile(ms, q)), 1) for q in (50, 95, 99)} | {"mean": round(float(ms.mean()), 1)}
+
+
+def summarize(records, wall_s):
+    groups = {kind: [r for r in records if r["kind"] == kind] for kind in KINDS}
+    groups = {kind: rs for kind, rs in groups.items() if rs}
+    groups["all"] = records
+
+    report = {}
+    for kind, rs in groups.items():
+        ok = [r for r in rs if r["error"] is None]
+        decode = [r["tokens"] / (r["latency_s"] - r["ttft_s"]) for r in ok
+                  if r["tokens"] and r["ttft_s"] is not None and r["latency_s"] > r["ttft_s"]]
+        errors = {}
+        for r in rs:
+            if r["error"]:
+                errors[r["error"]] = errors.get(r["error"], 0) + 1
+        report[kind] = {
+            "requests": len(rs),
+            "error_rate": round(1 - len(ok) / len(rs), 4),
+            "errors": errors,
+            "latency_ms": _percentiles([r["latency_s"] for r in ok]),
+            "ttft_ms": _percentiles([r["ttft_s"] for r in ok if r["ttft_s"] is not None]),
+            "tokens_per_s_per_request": round(float(np.mean(decode)), 2) if decode else None,
+            "tokens_per_s_total": round(sum(r["tokens"] for r in ok) / wall_s, 2),
+            "requests_per_s": round(len(rs) / wall_s, 2),
+        }
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=LLM_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(report):
+    print(f"{'kind':<8} {'reqs':>5} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'ttft50':>8} {'ttft95':>8} {'tok/s':>7}")
+    for kind, row in report.items():
+        latency, ttft = row["latency_ms"] or {}, row["ttft_ms"] or {}
+        print(f"{kind:<8} {row['requests']:>5} {row['error_rate'] * 100:>5.1f}% "
+              f"{latency.get('p50', '-'):>8} {latency.get('p95', '-'):>8} {latency.get('p99', '-'):>8} "
+              f"{ttft.get('p50', '-'):>8} {ttft.get('p95', '-'):>8} {row['tokens_per_s_per_request'] or '-':>7}")
+
+
+def main():
+    args = parse_args()
+    out_path = os.path.abspath(args.out or os.path.join(
+        LLM_DIR, "bench", "results", f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"))
+
+    # The app keeps its caches and stores relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="assistant-bench-")
+    os.chdir(workdir)
+    seed_docs("rag_docs", args.doc_chunks, args.seed)
+    stub, stub_url = start_weather_stub(latency_s=args.weather_latency_ms / 1000, error_rate=args.weather_error_rate)
+
+    import app
+    import rag_engine
+    install_fakes(app, rag_engine, args)
+    app.weather_client.base_url = stub_url
+
+    server, thread = start_server(app.app, args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+    fixtures = {
+        "wav": make_wav(args.audio_seconds),
+        "images": [random.Random(args.seed + i).randbytes(64 * 1024) for i in range(args.images)],
+    }
+    try:
+        print(f"⏳ Waiting for the app in {workdir} ...")
+        asyncio.run(wait_until_ready(base_url))
+        print(f"🚀 {args.requests} requests, concurrency {args.concurrency}, mix {args.mix}")
+        records, wall_s, status = asyncio.run(run_load(base_url, args, fixtures))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        stub.shutdown()
+
+    report = summarize(records, wall_s)
+    print_report(report)
+    results = {
+        "label": args.label,
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "wall_s": round(wall_s, 2),
+        "results": report,
+        "server_stats": status,
+    }
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"📊 Results saved to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# Speculative decoding benchmark on the real Gemma GGUF.
+#
+# Usage (from LLM/):
+#   python bench/speculative_bench.py --mode prompt_lookup --max-tokens 160
+#   python bench/speculative_bench.py --mode draft_model --context-file rag_docs/manual.txt
+#
+# Loads the model once with the draft attached, then answers the same
+# RAG-grounded questions with speculation off and on, greedily (temperature 0)
+# so the two replies must match token for token. Reports decode tokens/s,
+# speedup and draft acceptance, and writes them to bench/results/.
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+LLM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LLM_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chat import build_messages, format_user_turn, initialize_llm, stream_chat_completion  # noqa: E402
+from load_test import git_commit  # noqa: E402
+
+# Procedures the crew ask about; answers tend to restate them closely
+SAMPLE_CONTEXT = [
+    "Lifeboat launching: 1. Sound the general alarm (seven short blasts and one long). "
+    "2. Muster at the lifeboat station wearing lifejackets. 3. Remove the gripes and lashings. "
+    "4. Check that the drain plug is fitted. 5. Board the lifeboat and fasten seat belts. "
+    "6. Release the brake on the davit winch to lower the boat to the water. "
+    "7. Release the on-load hooks once waterborne and start the engine.",
+    "Fire drill: 1. Raise the alarm and report the location of the fire to the bridge. "
+    "2. Close doors, vents and fire dampers to contain the fire. 3. Stop ventilation fans and fuel pumps. "
+    "4. Muster the fire team with breathing apparatus, hoses and extinguishers. "
+    "5. Boundary cool adjacent spaces. 6. Account for all crew at the muster station.",
+    "Man overboard: 1. Shout 'man overboard' and throw a lifebuoy with light and smoke signal. "
+    "2. Press the MOB button on the GPS. 3. Post a lookout to keep the person in sight. "
+    "4. Execute a Williamson turn. 5. Prepare the rescue boat and notify nearby vessels.",
+]
+QUESTIONS = [
+    "How do I launch the lifeboat?",
+    "What is the fire drill procedure?",
+    "What are the steps if someone falls overboard?",
+    "Before lowering the lifeboat, what needs to be checked?",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare speculative and standard decoding on the real model.")
+    parser.add_argument("--mode", default="prompt_lookup", choices=("prompt_lookup", "draft_model"))
+    parser.add_argument("--max-tokens", type=int, default=160)
+    parser.add_argument("--repeats", type=int, default=1, help="passes over the question set")
+    parser.add_argument("--context-file", default=None, help="use this text (split on blank lines) as RAG context")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--out", default=None, help="results file (default bench/results/spec_<timestamp>.json)")
+    return parser.parse_args()
+
+
+def load_context(path):
+    if not path:
+        return SAMPLE_CONTEXT
+    with open(path, encoding="utf-8") as f:
+        return [part.strip() for part in f.read().split("\n\n") if part.strip()][:3]
+
+
+def run_once(llm, messages, speculative, max_tokens):
+    """Returns (reply, tokens, decode_seconds) for one greedy generation."""
+    parts, first_at = [], None
+    started = time.perf_counter()
+    for text in stream_chat_completion(llm, messages, speculative=speculative, temperature=0.0,
+                                       max_tokens=max_tokens):
+        if first_at is None:
+            first_at = time.perf_counter()
+        parts.append(text)
+    decode_s = time.perf_counter() - (first_at or started)
+    return "".join(parts), len(parts), decode_s
+
+
+def main():
+    args = parse_args()
+    out_path = os.path.abspath(args.out or os.path.join(
+        LLM_DIR, "bench", "results", f"spec_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"))
+
+    print(f"⏳ Loading model with {args.mode} draft...")
+    llm = initialize_llm(speculative=args.mode)
+    draft = llm.speculative_draft
+    context = "\n- ".join(load_context(args.context_file))
+
+    rows, mismatches = [], 0
+    for _ in range(args.repeats):
+        for question in QUESTIONS:
+            messages = build_messages([], format_user_turn(question, context))
+            run_once(llm, messages, False, 8)  # warm the prompt into the KV cache for both runs
+            base_reply, base_tokens, base_s = run_once(llm, messages, False, args.max_tokens)
+            accepted_before, drafted_before = draft.accepted, draft.drafted
+            spec_reply, spec_tokens, spec_s = run_once(llm, messages, True, args.max_tokens)
+            same = base_reply == spec_reply
+            mismatches += not same
+            row = {
+                "question": question,
+                "tokens": spec_tokens,
+                "standard_tok_s": round((base_tokens - 1) / base_s, 2) if base_s else None,
+                "speculative_tok_s": round((spec_tokens - 1) / spec_s, 2) if spec_s else None,
+                "drafted": draft.drafted - drafted_before,
+                "accepted": draft.accepted - accepted_before,
+                "identical": same,
+            }
+            row["speedup"] = round(base_s / spec_s, 2) if spec_s else None
+            rows.append(row)
+            print(f"{question[:40]:<40} {row['standard_tok_s']:>7} -> {row['speculative_tok_s']:>7} tok/s "
+                  f"(x{row['speedup']}, accepted {row['accepted']}/{row['drafted']}){'' if same else '  ❌ MISMATCH'}")
+
+    results = {
+        "label": args.label,
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "draft": draft.stats(),
+        "mismatches": mismatches,
+        "mean_speedup": round(sum(r["speedup"] or 0 for r in rows) / len(rows), 2),
+        "results": rows,
+    }
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"📊 Mean speedup x{results['mean_speedup']}, {mismatches} mismatches. Saved to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
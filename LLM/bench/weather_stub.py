@@ -0,0 +1,90 @@
+# Local stand-in for the Open-Meteo marine API.
+# Usage: python bench/weather_stub.py [port]  then  MARINE_API_URL=http://127.0.0.1:<port>/v1/marine
+import json
+import math
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FORECAST_HOURS = 168
+
+
+def marine_forecast(lat, lon, hours=FORECAST_HOURS):
+    """A deterministic 7-day hourly forecast that varies smoothly with position and time."""
+    start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    phase = (lat * 0.7 + lon * 0.3) % (2 * math.pi)
+    times, waves, wind_waves, temps = [], [], [], []
+    for h in range(hours):
+        times.append((start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M"))
+        swell = 1.5 + math.sin(phase + h / 12.0)
+        waves.append(round(swell, 2))
+        wind_waves.append(round(0.4 * swell, 2))
+        temps.append(round(24.0 - abs(lat) / 4.0 + 0.5 * math.sin(h / 24.0 * 2 * math.pi), 1))
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "utc_offset_seconds": 0,
+        "hourly_units": {"wave_height": "m", "wind_wave_height": "m", "sea_surface_temperature": "°C"},
+        "hourly": {
+            "time": times,
+            "wave_height": waves,
+            "wind_wave_height": wind_waves,
+            "sea_surface_temperature": temps,
+        },
+    }
+
+
+def make_handler(latency_s=0.05, error_rate=0.0):
+    counter = {"requests": 0}
+
+    class MarineHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            counter["requests"] += 1
+            query = parse_qs(urlparse(self.path).query)
+            time.sleep(latency_s)
+            try:
+                # Comma-separated lists ask for several locations, answered as a JSON list like Open-Meteo does
+                lats = [float(v) for v in query["latitude"][0].split(",")]
+                lons = [float(v) for v in query["longitude"][0].split(",")]
+                if len(lats) != len(lons):
+                    raise ValueError
+            except (KeyError, ValueError):
+                return self._reply(400, {"error": True, "reason": "latitude and longitude are required"})
+            if error_rate and counter["requests"] % round(1 / error_rate) == 0:
+                return self._reply(503, {"error": True, "reason": "stub outage"})
+            forecasts = [marine_forecast(lat, lon) for lat, lon in zip(lats, lons)]
+            self._reply(200, forecasts if len(forecasts) > 1 else forecasts[0])
+
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    MarineHandler.counter = counter
+    return MarineHandler
+
+
+def start_weather_stub(port=0, latency_s=0.05, error_rate=0.0):
+    """Serves the stub in a background thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_s, error_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1/marine"
+
+
+if __name__ == "__main__":
+    server, url = start_weather_stub(int(sys.argv[1]) if len(sys.argv) > 1 else 8081)
+    print(f"🌊 Marine API stub at {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,96 @@
+import mmap
+import os
+
+import numpy as np
+
+
+class ChunkStore:
+    """
+    Append-only, memory-mapped store for chunk texts.
+
+    chunks.bin holds the UTF-8 texts back to back; chunk_offsets.u64 holds the
+    end offset of each chunk, so chunk ID i is the i-th row. Reads decode only
+    the requested chunk straight out of the page cache, so neither startup time
+    nor resident memory grows with the corpus.
+
+    Chunks of deleted or edited files stay in the blob as dead rows (the index
+    no longer returns their IDs); a full rebuild writes a compact store.
+    Readers holding an older ChunkStore keep working while a newer one appends,
+    since existing rows are never rewritten.
+    """
+
+    def __init__(self, path, n_chunks=0):
+        os.makedirs(path, exist_ok=True)
+        self.blob_path = os.path.join(path, "chunks.bin")
+        self.offsets_path = os.path.join(path, "chunk_offsets.u64")
+        self._truncate(n_chunks)
+        self._map()
+
+    @classmethod
+    def create(cls, path):
+        """Starts an empty store, discarding any previous one."""
+        for name in ("chunks.bin", "chunk_offsets.u64"):
+            file_path = os.path.join(path, name)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        return cls(path, 0)
+
+    def _truncate(self, n_chunks):
+        """Drops rows past n_chunks (e.g. a torn tail from an interrupted run)."""
+        for file_path in (self.blob_path, self.offsets_path):
+            if not os.path.exists(file_path):
+                open(file_path, "wb").close()
+
+        if os.path.getsize(self.offsets_path) < n_chunks * 8:
+            raise ValueError(f"Chunk store has fewer than the {n_chunks} chunks the manifest expects.")
+        with open(self.offsets_path, "r+b") as f:
+            f.truncate(n_chunks * 8)
+            if n_chunks:
+                f.seek((n_chunks - 1) * 8)
+                blob_end = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+            else:
+                blob_end = 0
+        with open(self.blob_path, "r+b") as f:
+            f.truncate(blob_end)
+
+    def _map(self):
+        self._count = os.path.getsize(self.offsets_path) // 8
+        self._ends = (
+            np.memmap(self.offsets_path, dtype="<u8", mode="r", shape=(self._count,))
+            if self._count else np.zeros(0, dtype="<u8")
+        )
+        if os.path.getsize(self.blob_path):
+            with open(self.blob_path, "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._blob = b""
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, chunk_id):
+        i = int(chunk_id)
+        if not 0 <= i < self._count:
+            raise KeyError(chunk_id)
+        start = int(self._ends[i - 1]) if i else 0
+        return self._blob[start:int(self._ends[i])].decode("utf-8")
+
+    def append(self, texts):
+        """Appends texts as the next chunk IDs. Returns the first new ID."""
+        first_id = self._count
+        end = int(self._ends[-1]) if self._count else 0
+        encoded = [text.encode("utf-8") for text in texts]
+        ends = np.cumsum([len(b) for b in encoded], dtype="<u8") + np.uint64(end)
+
+        # Blob first, offsets second: a crash in between leaves only an orphaned tail
+        with open(self.blob_path, "ab") as f:
+            f.write(b"".join(encoded))
+        with open(self.offsets_path, "ab") as f:
+            f.write(ends.astype("<u8").tobytes())
+        self._map()
+        return first_id
+
+    def flush(self):
+        for file_path in (self.blob_path, self.offsets_path):
+            with open(file_path, "rb+") as f:
+                os.fsync(f.fileno())
@@ -0,0 +1,170 @@
+# Document extraction and token-aware chunking for RAG ingestion.
+# Kept free of torch/sentence-transformers imports so process-pool workers
+# stay light: each worker only loads PyMuPDF and a tokenizer.
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+# --- Config ---
+CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "200"))  # MiniLM truncates at 256
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "40"))
+INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+PDF_PAGES_PER_TASK = 16
+# Below this much source data, a process pool costs more to start than it saves
+PARALLEL_MIN_BYTES = 4 << 20
+TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+_tokenizer = None
+
+
+# --- Define your extractor functions ---
+# Extractors yield text segments (pages, paragraphs blocks) instead of one big string.
+
+def _extract_from_txt(path, start=0, stop=None):
+    """Streams a .txt file in ~64 KiB blocks, cut on line boundaries."""
+    block = []
+    size = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= 1 << 16:
+                yield "".join(block)
+                block, size = [], 0
+    if block:
+        yield "".join(block)
+
+def _extract_from_pdf(path, start=0, stop=None):
+    """Yields the text of pages [start, stop) of a .pdf file."""
+    try:
+        with fitz.open(path) as doc:
+            for page_no in range(start, min(stop or doc.page_count, doc.page_count)):
+                text = doc[page_no].get_text()
+                if text.strip():
+                    yield text
+    except Exception as e:
+        print(f"Error processing PDF {path}: {e}")
+
+# --- Create the dispatcher dictionary ---
+# This maps file extensions to the function that processes them.
+FILE_EXTRACTORS = {
+    ".txt": _extract_from_txt,
+    ".pdf": _extract_from_pdf,
+}
+
+
+# --- Token-aware sliding window ---
+
+def chunk_segments(segments, tokenizer, size=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """
+    Slides a window of `size` tokens (stepping size - overlap) over a stream of
+    text segments and yields the original text under each window. Chunks may
+    span segment (page) boundaries; only a bounded buffer is kept in memory.
+    """
+    step = max(1, size - overlap)
+    text, base = "", 0       # buffered text and its absolute start offset
+    spans = deque()          # absolute (start, end) character span per token
+    fresh = 0                # tokens not yet covered by an emitted chunk
+
+    for segment in segments:
+        sep = "\n" if text else ""
+        offset = base + len(text) + len(sep)
+        text += sep + segment
+        encoded = tokenizer(segment, add_special_tokens=False, return_offsets_mapping=True)
+        for s, e in encoded["offset_mapping"]:
+            spans.append((offset + s, offset + e))
+            fresh += 1
+
+        while len(spans) >= size:
+            yield text[spans[0][0] - base:spans[size - 1][1] - base].strip()
+            for _ in range(step):
+                spans.popleft()
+            fresh = max(0, len(spans) - overlap)
+            cut = spans[0][0] if spans else base + len(text)
+            text, base = text[cut - base:], cut
+
+    if spans and fresh:
+        yield text[spans[0][0] - base:spans[-1][1] - base].strip()
+
+
+# --- Worker side ---
+
+def _init_worker(tokenizer_name):
+    global _tokenizer
+    from transformers import AutoTokenizer
+    _tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+
+
+def chunk_task(path, start, stop, size=CHUNK_TOKENS, overlap=CHUNK_OVERLAP, tokenizer=None):
+    """Extracts one task's worth of a file (a page range for PDFs) and chunks it."""
+    extractor = FILE_EXTRACTORS[os.path.splitext(path)[1].lower()]
+    tokenizer = tokenizer or _tokenizer
+    return [c for c in chunk_segments(extractor(path, start, stop), tokenizer, size, overlap) if c]
+
+
+def plan_tasks(path):
+    """Splits a file into (path, start, stop) extraction tasks."""
+    if path.lower().endswith(".pdf"):
+        try:
+            with fitz.open(path) as doc:
+                pages = doc.page_count
+        except Exception as e:
+            print(f"Error opening PDF {path}: {e}")
+            return []
+        return [(path, p, min(p + PDF_PAGES_PER_TASK, pages)) for p in range(0, pages, PDF_PAGES_PER_TASK)]
+    return [(path, 0, None)]
+
+
+def make_chunk_pool(workers=INGEST_WORKERS):
+    """
+    Process pool for iter_file_chunks, or None when ingestion should stay inline.
+    Workers are spawned, not forked: the server process runs llama.cpp, FAISS,
+    torch and httpx threads, and a forked child can inherit a lock one of them held.
+    """
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(TOKENIZER_NAME,))
+
+
+def iter_file_chunks(paths, tokenizer, pool=None, workers=INGEST_WORKERS):
+    """
+    Yields (path, chunks, is_last_task_of_file) in file order.
+
+    Large batches fan out over `pool` (see make_chunk_pool; the caller owns it)
+    with a bounded number of tasks in flight, so memory stays flat however big
+    the folder is. Small batches, or no pool, run inline with the caller's tokenizer.
+    """
+    # Files that yield no tasks (e.g. unreadable PDFs) get an empty one so they still finish
+    tasks = [task for path in paths for task in (plan_tasks(path) or [(path, 0, 0)])]
+    last_task = {path: i for i, (path, _, _) in enumerate(tasks)}
+
+    total_bytes = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+    if pool is None or total_bytes < PARALLEL_MIN_BYTES:
+        for i, (path, start, stop) in enumerate(tasks):
+            chunks = chunk_task(path, start, stop, tokenizer=tokenizer) if stop != 0 else []
+            yield path, chunks, last_task[path] == i
+        return
+
+    def submit(i):
+        path, start, stop = tasks[i]
+        return i, path, (pool.submit(chunk_task, path, start, stop) if stop != 0 else None)
+
+    in_flight = deque(submit(i) for i in range(min(len(tasks), 2 * workers)))
+    next_task = len(in_flight)
+    try:
+        while in_flight:
+            i, path, future = in_flight.popleft()
+            chunks = future.result() if future else []
+            if next_task < len(tasks):
+                in_flight.append(submit(next_task))
+                next_task += 1
+            yield path, chunks, last_task[path] == i
+    finally:
+        # Closed early (e.g. the sync failed): don't leave queued work on the shared pool
+        for _, _, future in in_flight:
+            if future:
+                future.cancel()
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import metrics, CACHE_REQUESTS
+
+# --- Config ---
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+
+EMBED_BATCH_SIZE = metrics.histogram(
+    "assistant_embed_batch_size", "Queries per encoder call.", buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+class EmbeddingService:
+    """
+    Micro-batches concurrent query embeddings into single encoder calls.
+
+    Queries arriving within a short window are encoded together in a worker
+    thread, so a burst of requests costs one forward pass instead of one each.
+    Recent query embeddings are kept in a size-bounded LRU.
+    """
+
+    def __init__(self, embedder, window_ms=EMBED_BATCH_WINDOW_MS, max_batch=EMBED_MAX_BATCH,
+                 cache_size=EMBED_CACHE_SIZE, run=asyncio.to_thread):
+        self.embedder = embedder
+        self.run = run  # how the blocking encode is run off the event loop
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending = None
+        self._worker = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    async def embed(self, text):
+        """Returns the float32 embedding of `text`, batching with concurrent callers."""
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache="embedding", result="hit")
+            return cached
+        self.misses += 1
+        CACHE_REQUESTS.inc(cache="embedding", result="miss")
+
+        if self._pending is None:
+            self._pending = asyncio.Queue()
+            self._worker = asyncio.create_task(self._batch_loop())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._pending.put((text, future))
+        return await future
+
+    def stats(self):
+        return {
+            "cache_entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+        }
+
+    async def _batch_loop(self):
+        while True:
+            batch = [await self._pending.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._pending.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._run_batch(batch)
+
+    def _encode(self, texts):
+        # Runs in a worker thread, so a lazily loaded embedder loads there, not on the event loop
+        return self.embedder.encode(texts, batch_size=len(texts))
+
+    async def _run_batch(self, batch):
+        # Identical queries in the same window share one slot in the batch
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = await self.run(self._encode, texts)
+            vectors = np.asarray(vectors, dtype="float32")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        EMBED_BATCH_SIZE.observe(len(texts))
+        self.batched_queries += len(texts)
+        by_text = dict(zip(texts, vectors))
+        for text, vector in by_text.items():
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
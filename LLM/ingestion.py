@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+import os
+import time
+from typing import NamedTuple
+
+import faiss
+
+import vector_index
+from chunk_store import ChunkStore
+from doc_chunker import make_chunk_pool
+from rag_engine import CACHE_PATH, DOCS_PATH, FILE_EXTRACTORS, INDEX_PATH, sync_rag_index, load_rag_manifest
+
+# --- Config ---
+# Finished jobs kept for /ingest-status; older ones are forgotten
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+
+
+class RagSnapshot(NamedTuple):
+    """An immutable view of the RAG index; requests grab one and use it throughout."""
+    index: faiss.Index
+    docs: ChunkStore
+    version: int
+
+
+class IngestionPipeline:
+    """
+    Background ingestion for uploaded documents.
+
+    Uploads are queued and picked up by a single worker, which builds the
+    next index on a shadow copy (a fresh in-RAM load of the on-disk index,
+    which always matches the live one, plus the new chunks) and
+    then swaps it in with one reference assignment. Queries always see either
+    the old snapshot or the new one, never a half-built index.
+
+    The pipeline owns the process pool that extracts and chunks large files;
+    stop() shuts it down.
+    """
+
+    def __init__(self, index, docs, folder_path=DOCS_PATH, chunk_pool=None):
+        self.snapshot = RagSnapshot(index, docs, 0)
+        self.folder_path = folder_path
+        self.chunk_pool = chunk_pool if chunk_pool is not None else make_chunk_pool()
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._queue = asyncio.Queue()
+        self._worker = None
+
+    def start(self):
+        self._worker = asyncio.create_task(self._worker_loop())
+        return self
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        if self.chunk_pool is not None:
+            self.chunk_pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- Public API ---
+
+    def save_upload(self, filename, fileobj):
+        """Writes an upload into the RAG folder. Returns the stored file name."""
+        name = os.path.basename(filename or "")
+        ext = os.path.splitext(name)[1].lower()
+        if not name or ext not in FILE_EXTRACTORS:
+            raise ValueError(f"Unsupported file type. Supported: {', '.join(FILE_EXTRACTORS)}")
+
+        os.makedirs(self.folder_path, exist_ok=True)
+        tmp_path = os.path.join(self.folder_path, f".{name}.uploading")
+        with open(tmp_path, "wb") as buffer:
+            while block := fileobj.read(1 << 20):
+                buffer.write(block)
+        os.replace(tmp_path, os.path.join(self.folder_path, name))
+        return name
+
+    def enqueue(self, file_name):
+        """Queues a file for indexing and returns its job id."""
+        job_id = next(self._ids)
+        self.jobs[job_id] = {
+            "job_id": job_id,
+            "file": file_name,
+            "status": "queued",
+            "chunks_done": 0,
+            "chunks_total": 0,
+            "queued_at": time.time(),
+            "finished_at": None,
+            "error": None,
+        }
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def status(self, job_id=None):
+        if job_id is not None:
+            return self.jobs.get(job_id)
+        return {
+            "index_version": self.snapshot.version,
+            "chunks": self.snapshot.index.ntotal,
+            "pending": self._queue.qsize(),
+            "jobs": list(self.jobs.values())[-50:],
+        }
+
+    # --- Worker ---
+
+    async def _worker_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Fold everything already waiting into the same shadow build
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._ingest(batch)
+            self._prune_jobs()
+
+    async def _ingest(self, job_ids):
+        jobs = [self.jobs[job_id] for job_id in job_ids]
+        by_file = {}
+        for job in jobs:
+            by_file.setdefault(job["file"], []).append(job)
+
+        def on_progress(file_name, stage, done, total):
+            for job in by_file.get(file_name, []):
+                job["status"], job["chunks_done"], job["chunks_total"] = stage, done, total
+
+        live = self.snapshot
+        try:
+            for job in jobs:
+                job["status"] = "preparing"
+            # The live index may be memory-mapped read-only, so build on a writable copy
+            shadow_index = await asyncio.to_thread(vector_index.read_index, INDEX_PATH, False)
+            shadow_manifest = await asyncio.to_thread(load_rag_manifest)
+            # Same append-only files as the live store; new rows are invisible to it
+            shadow_docs = ChunkStore(CACHE_PATH, shadow_manifest["next_id"])
+
+            shadow_index, changed = await sync_rag_index(
+                shadow_index, shadow_docs, shadow_manifest, self.folder_path, on_progress,
+                chunk_pool=self.chunk_pool,
+            )
+            if changed:
+                self.snapshot = RagSnapshot(shadow_index, shadow_docs, live.version + 1)
+                print(f"🔁 RAG index v{self.snapshot.version} swapped in ({shadow_index.ntotal} chunks).")
+        except Exception as e:
+            print(f"❌ Ingestion failed: {e}")
+            for job in jobs:
+                job["status"], job["error"] = "failed", str(e)
+            return
+        finally:
+            for job in jobs:
+                job["finished_at"] = time.time()
+
+        for job in jobs:
+            job["status"] = "done"
+
+    def _prune_jobs(self):
+        """Drops the oldest finished jobs beyond INGEST_JOB_HISTORY; queued and running ones stay."""
+        finished = [job_id for job_id, job in self.jobs.items() if job["finished_at"] is not None]
+        for job_id in finished[:max(0, len(self.jobs) - INGEST_JOB_HISTORY)]:
+            del self.jobs[job_id]
@@ -0,0 +1,246 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from chat import stream_chat_completion, LLM_POOL_SIZE
+from metrics import metrics
+from resources import pin_thread
+
+# --- Config ---
+DEFAULT_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+DEFAULT_MAX_PER_SESSION = int(os.getenv("LLM_MAX_PER_SESSION", "2"))
+# Tokens are handed to the event loop in frames: flushed every STREAM_FLUSH_MS,
+# or sooner once STREAM_FLUSH_CHARS have piled up. The first token goes out alone.
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", "50"))
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "64"))
+
+LLM_QUEUE_WAIT = metrics.histogram(
+    "assistant_llm_queue_wait_seconds", "Time a generation waited for a free model.")
+LLM_TTFT = metrics.histogram(
+    "assistant_llm_ttft_seconds", "Time from queueing a generation to its first token.")
+LLM_REJECTED = metrics.counter(
+    "assistant_llm_rejected_total", "Generations refused because the queue was full.", ["reason"])
+LLM_CANCELLED = metrics.counter(
+    "assistant_llm_cancelled_total", "Generations stopped early because the client went away.", ["stage"])
+
+_DONE = object()
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler can't accept another generation request."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GenerationJob:
+    """A queued generation whose tokens are streamed back through an asyncio queue."""
+
+    def __init__(self, session_id, messages, kwargs, flush_interval=STREAM_FLUSH_MS / 1000.0,
+                 flush_chars=STREAM_FLUSH_CHARS):
+        self.session_id = session_id
+        self.messages = messages
+        self.kwargs = kwargs
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.completion_tokens = 0
+        self.cancelled = False  # read by the worker thread between tokens
+        self.error = None
+        self._tokens = asyncio.Queue()
+
+    @property
+    def wait_time(self):
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    async def stream(self):
+        """Yields generated text in frames as the worker produces it."""
+        while True:
+            item = await self._tokens.get()
+            if item is _DONE:
+                break
+            yield item
+        if self.error is not None:
+            raise self.error
+
+
+class LLMScheduler:
+    """
+    Owns a pool of Llama instances and serializes access to them.
+    Requests are queued per session and served round-robin across sessions,
+    so one chatty session can't starve the others. Each instance only ever
+    runs one generation at a time, in a worker thread off the event loop.
+    """
+
+    def __init__(self, models, max_queue=DEFAULT_MAX_QUEUE, max_per_session=DEFAULT_MAX_PER_SESSION):
+        self.models = list(models)
+        self.max_queue = max_queue
+        self.max_per_session = max_per_session
+        self._sessions = OrderedDict()  # session_id -> deque of pending jobs
+        self._free = None
+        self._has_work = None
+        self._dispatcher = None
+        self._depth = 0
+        self._active = 0
+        self._served = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._recent_waits = deque(maxlen=256)
+        self._recent_durations = deque(maxlen=64)
+        # One generation thread per model, kept on the llm cores
+        self._executor = ThreadPoolExecutor(max_workers=len(self.models), thread_name_prefix="llm",
+                                            initializer=pin_thread, initargs=("llm",))
+
+    async def start(self):
+        """Starts the dispatcher. Must be called from the running event loop."""
+        self._free = asyncio.Queue()
+        for model in self.models:
+            self._free.put_nowait(model)
+        self._has_work = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        return self
+
+    async def stop(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+        self._executor.shutdown(wait=False)
+
+    # --- Public API ---
+
+    def submit(self, session_id, messages, **kwargs):
+        """Queues a chat completion. Raises QueueFullError when the queue is saturated."""
+        pending = self._sessions.get(session_id)
+        if self._depth >= self.max_queue:
+            self._rejected += 1
+            LLM_REJECTED.inc(reason="queue_full")
+            raise QueueFullError("Assistant is busy, please retry shortly.", self.retry_after())
+        if pending is not None and len(pending) >= self.max_per_session:
+            self._rejected += 1
+            LLM_REJECTED.inc(reason="session_limit")
+            raise QueueFullError("Too many pending requests for this session.", self.retry_after())
+
+        job = GenerationJob(session_id, messages, kwargs)
+        self._sessions.setdefault(session_id, deque()).append(job)
+        self._depth += 1
+        self._has_work.set()
+        return job
+
+    def cancel(self, job):
+        """Stops a job: dropped from the queue if still waiting, else halted at the next token."""
+        if job.finished or job.cancelled:
+            return
+        job.cancelled = True
+        if job.started_at is None:
+            pending = self._sessions.get(job.session_id)
+            if pending is not None and job in pending:
+                pending.remove(job)
+                self._depth -= 1
+                if not pending:
+                    del self._sessions[job.session_id]
+            job.finished_at = time.monotonic()
+            job._tokens.put_nowait(_DONE)
+            LLM_CANCELLED.inc(stage="queued")
+        else:
+            LLM_CANCELLED.inc(stage="generating")
+
+    def retry_after(self):
+        """Rough seconds until a slot frees up, based on recent generation times."""
+        avg = (sum(self._recent_durations) / len(self._recent_durations)) if self._recent_durations else 5.0
+        return max(1, math.ceil(avg * (self._depth + 1) / max(1, len(self.models))))
+
+    def stats(self):
+        waits = sorted(self._recent_waits)
+        return {
+            "pool_size": len(self.models),
+            "active": self._active,
+            "queue_depth": self._depth,
+            "sessions_waiting": len(self._sessions),
+            "max_queue": self.max_queue,
+            "served": self._served,
+            "rejected": self._rejected,
+            "avg_wait_s": round(self._total_wait / self._served, 3) if self._served else 0.0,
+            "p95_wait_s": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+        }
+
+    # --- Dispatch ---
+
+    def _next_job(self):
+        """Pops the head job of the next session in round-robin order."""
+        session_id, pending = next(iter(self._sessions.items()))
+        job = pending.popleft()
+        del self._sessions[session_id]
+        if pending:
+            self._sessions[session_id] = pending  # back of the line
+        self._depth -= 1
+        return job
+
+    async def _dispatch_loop(self):
+        while True:
+            model = await self._free.get()
+            while not self._sessions:
+                self._has_work.clear()
+                await self._has_work.wait()
+            job = self._next_job()
+            asyncio.create_task(self._execute(job, model))
+
+    async def _execute(self, job, model):
+        if job.cancelled:  # client left between dispatch and start
+            self._free.put_nowait(model)
+            return
+        loop = asyncio.get_running_loop()
+        job.started_at = time.monotonic()
+        self._active += 1
+        self._served += 1
+        self._total_wait += job.wait_time
+        self._recent_waits.append(job.wait_time)
+        LLM_QUEUE_WAIT.observe(job.wait_time)
+        try:
+            await loop.run_in_executor(self._executor, self._generate, job, model, loop)
+        except Exception as e:
+            job.error = e
+        finally:
+            job.finished_at = time.monotonic()
+            self._recent_durations.append(job.finished_at - job.started_at)
+            self._active -= 1
+            self._free.put_nowait(model)
+            job._tokens.put_nowait(_DONE)
+
+    @staticmethod
+    def _generate(job, model, loop):
+        """Runs in a worker thread; hands tokens back to the event loop in coalesced frames."""
+        tokens = stream_chat_completion(model, job.messages, **job.kwargs)
+        parts, size, last_flush = [], 0, 0.0
+        try:
+            for text in tokens:
+                if job.cancelled:
+                    break
+                if not job.completion_tokens:
+                    LLM_TTFT.observe(time.monotonic() - job.enqueued_at)
+                job.completion_tokens += 1
+                parts.append(text)
+                size += len(text)
+                now = time.monotonic()
+                if size >= job.flush_chars or now - last_flush >= job.flush_interval:
+                    loop.call_soon_threadsafe(job._tokens.put_nowait, "".join(parts))
+                    parts, size, last_flush = [], 0, now
+        finally:
+            tokens.close()  # stops llama decoding when we broke out early
+            if parts and not job.cancelled:
+                loop.call_soon_threadsafe(job._tokens.put_nowait, "".join(parts))
+
+
+def init_scheduler(llm_factory, pool_size=None):
+    """Loads `pool_size` model instances and wraps them in a scheduler."""
+    pool_size = pool_size or LLM_POOL_SIZE
+    return LLMScheduler([llm_factory() for _ in range(pool_size)])
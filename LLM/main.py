@@ -5,8 +5,9 @@ import os
 from rag_engine import load_rag_index, retrieve_context
 
 # --- Your existing imports ---
-from recordingUser import record
-from whisper_transcript import whisper_transcript
+from recordingUser import record, MicStream
+from whisper_transcript import whisper_transcript, init_whisper
+from voice_stream import listen_once
 from chat import initialize_llm, get_gemma_response
 from caption import init_blip, caption_image
 
@@ -16,6 +17,8 @@ SAMPLE_RATE = 16000
 WAV_OUTPUT_FILE = "user_audio.wav"
 DISTANCE_THRESHOLD = 1.2
 IMG_PTH = "image.jpg"
+# "stream" listens until you stop talking (VAD); "fixed" records RECORDING_DURATION seconds to a WAV
+VOICE_CAPTURE = os.getenv("VOICE_CAPTURE", "stream")
 
 async def main():
     """Main asynchronous function to run the assistant."""
@@ -23,10 +26,11 @@ async def main():
     print("Rouge Coders Voice Assistant Initializing...")
 
     # Initialize all models concurrently for a faster start
-    (llm, (processor, model), (rag_index, rag_docs)) = await asyncio.gather(
+    (llm, (processor, model), (rag_index, rag_docs), whisper_engine) = await asyncio.gather(
         asyncio.to_thread(initialize_llm),
         asyncio.to_thread(init_blip),
-        load_rag_index() # This is already async
+        load_rag_index(), # This is already async
+        asyncio.to_thread(init_whisper) if VOICE_CAPTURE == "stream" else asyncio.sleep(0),
     )
 
     chat_history = []
@@ -44,7 +48,13 @@ async def main():
             if not choice:
                 continue
 
-            if choice == 'v':
+            if choice == 'v' and VOICE_CAPTURE == "stream":
+                print("🎙️  Go ahead, I'm listening (stop talking to finish)...")
+                async with MicStream(SAMPLE_RATE) as mic:
+                    user_text = await listen_once(whisper_engine, mic)
+                print(f"👤 You said: {user_text}")
+
+            elif choice == 'v':
                 print(f"🎙️  Recording for {RECORDING_DURATION} seconds...")
                 record(WAV_OUTPUT_FILE, RECORDING_DURATION, SAMPLE_RATE)
                 print("Recording complete.")
@@ -0,0 +1,164 @@
+import asyncio
+import inspect
+import os
+import threading
+import time
+
+# --- Config ---
+# Seconds a request waits for its model to finish loading before getting a 503
+MODEL_WAIT_TIMEOUT = float(os.getenv("MODEL_WAIT_TIMEOUT", "300"))
+# Models loaded in the background at startup, in this order ("none" to load purely on demand)
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "llm,embedder,rag,whisper,blip")
+
+
+class ModelUnavailableError(Exception):
+    """A model failed to load or is still loading after the wait timeout."""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LazyModel:
+    """
+    A handle that loads its model on first use.
+
+    Async callers `await handle.aget()`: concurrent callers share one load,
+    which runs off the event loop, so requests simply queue until the model
+    is ready. Sync callers (worker threads, CLI tools) can use `handle.get()`
+    or call model attributes on the handle directly, e.g. `embedder.encode(...)`.
+    A failed load is retried by the next caller.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = "not_loaded"  # not_loaded | loading | ready | failed
+        self.error = None
+        self.load_seconds = None
+        self._value = None
+        self._lock = threading.Lock()
+        self._task = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def get(self):
+        """Returns the model, loading it in the calling thread if needed."""
+        if self.state == "ready":
+            return self._value
+        if inspect.iscoroutinefunction(self.loader):
+            raise ModelUnavailableError(f"{self.name} has an async loader; use aget().")
+        with self._lock:
+            if self.state != "ready":
+                self._finish(self._timed(self.loader))
+        return self._value
+
+    async def aget(self, timeout=MODEL_WAIT_TIMEOUT):
+        """Returns the model, waiting (without blocking the event loop) for it to load."""
+        if self.state == "ready":
+            return self._value
+        task = self.load()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            raise ModelUnavailableError(f"{self.name} is still loading, try again shortly.") from None
+        except Exception as e:
+            raise ModelUnavailableError(f"{self.name} failed to load: {e}", retry_after=30) from e
+        return self._value
+
+    def load(self):
+        """Starts loading in the background (if not already) and returns the shared task."""
+        if self._task is None or (self._task.done() and self.state != "ready"):
+            self._task = asyncio.ensure_future(self._load_async())
+        return self._task
+
+    async def _load_async(self):
+        if inspect.iscoroutinefunction(self.loader):
+            started = time.perf_counter()
+            self.state = "loading"
+            try:
+                value = await self.loader()
+            except Exception as e:
+                self._fail(e)
+                raise
+            self.load_seconds = time.perf_counter() - started
+            self._finish(value)
+        else:
+            await asyncio.to_thread(self.get)
+
+    def _timed(self, loader):
+        started = time.perf_counter()
+        self.state = "loading"
+        try:
+            value = loader()
+        except Exception as e:
+            self._fail(e)
+            raise
+        self.load_seconds = time.perf_counter() - started
+        return value
+
+    def _finish(self, value):
+        self._value, self.error = value, None
+        self.state = "ready"
+        print(f"✅ {self.name} loaded in {self.load_seconds:.1f}s")
+
+    def _fail(self, e):
+        self.state, self.error = "failed", str(e)
+        print(f"❌ {self.name} failed to load: {e}")
+
+    def status(self):
+        return {
+            "state": self.state,
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "error": self.error,
+        }
+
+    def __getattr__(self, attr):
+        # Only reached for attributes the handle itself doesn't have
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+
+class ModelRegistry:
+    """Named lazy model handles shared by the app, with background warm-up."""
+
+    def __init__(self):
+        self.models = {}
+
+    def register(self, name, loader):
+        handle = LazyModel(name, loader)
+        self.models[name] = handle
+        return handle
+
+    def __getitem__(self, name):
+        return self.models[name]
+
+    def warm(self, names=MODEL_WARMUP):
+        """Loads the named models one after another in the background."""
+        if isinstance(names, str):
+            names = [] if names.strip() == "none" else [n.strip() for n in names.split(",") if n.strip()]
+
+        async def warm_up():
+            for name in names:
+                if name not in self.models:
+                    print(f"⚠️ Unknown model '{name}' in warm-up list, skipping.")
+                    continue
+                try:
+                    await self.models[name].load()
+                except Exception:
+                    pass  # already logged; the next request retries
+
+        return asyncio.create_task(warm_up())
+
+    def is_ready(self, names):
+        return all(self.models[name].ready for name in names)
+
+    def status(self):
+        return {name: handle.status() for name, handle in self.models.items()}
+
+
+# Shared by every module that owns a model
+registry = ModelRegistry()
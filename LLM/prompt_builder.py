@@ -0,0 +1,144 @@
+import os
+import threading
+from collections import OrderedDict
+
+from chat import SYSTEM_PROMPT, format_user_turn
+
+# --- Config ---
+PROMPT_REPLY_RESERVE = int(os.getenv("PROMPT_REPLY_RESERVE", "512"))
+PROMPT_CONTEXT_SHARE = float(os.getenv("PROMPT_CONTEXT_SHARE", "0.35"))
+PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "96"))
+
+# Template markup (<start_of_turn>role ... <end_of_turn>) around every message
+MESSAGE_OVERHEAD_TOKENS = 6
+# Older turns are dropped in blocks so the kept history (and its cached KV prefix)
+# stays identical for several turns instead of shifting on every request
+DROP_BLOCK_TURNS = 4
+
+
+class TokenCounter:
+    """Counts tokens with the model's tokenizer, memoizing results per text."""
+
+    def __init__(self, llm, max_entries=4096):
+        self.llm = llm
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, text):
+        with self._lock:
+            n = self._cache.get(text)
+            if n is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return n
+        n = len(self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=False))
+        with self._lock:
+            self.misses += 1
+            self._cache[text] = n
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return n
+
+
+def _summarize_turns(turns, count, budget):
+    """Extractive one-liner of what the dropped turns were about."""
+    topics = []
+    used = count("Earlier in this conversation the user asked about: ")
+    for user_msg, _ in turns[-8:]:
+        text = user_msg["content"]
+        # Stored user turns may carry retrieved context; keep only the question
+        if "\nUser: " in text:
+            text = text.rsplit("\nUser: ", 1)[1].removesuffix("\nAssistant:")
+        topic = text.strip().split("\n", 1)[0][:120]
+        cost = count(topic) + 1
+        if used + cost > budget:
+            break
+        topics.append(topic)
+        used += cost
+    if not topics:
+        return None
+    return "Earlier in this conversation the user asked about: " + "; ".join(topics) + "."
+
+
+class PromptBuilder:
+    """
+    Assembles chat messages that fit the model's context window.
+
+    Priority: system prompt and the current user message always go in, then
+    retrieved chunks (in relevance order, up to a share of the budget), then
+    the most recent history turns. Turns that don't fit are dropped and
+    replaced by a short extractive summary prepended to the user message.
+    """
+
+    def __init__(self, llm, n_ctx=None, reply_reserve=PROMPT_REPLY_RESERVE,
+                 context_share=PROMPT_CONTEXT_SHARE, summary_tokens=PROMPT_SUMMARY_TOKENS):
+        self.count = TokenCounter(llm)
+        self.budget = (n_ctx or llm.n_ctx()) - reply_reserve
+        self.context_share = context_share
+        self.summary_tokens = summary_tokens
+
+    def _message_tokens(self, text):
+        return self.count(text) + MESSAGE_OVERHEAD_TOKENS
+
+    def build(self, chat_history, user_input, context_chunks=None):
+        """Returns (messages, user_prompt, usage); user_prompt is what goes into history."""
+        usage = {"budget": self.budget}
+        remaining = self.budget
+
+        usage["system"] = self._message_tokens(SYSTEM_PROMPT)
+        usage["user"] = self._message_tokens(format_user_turn(user_input))
+        remaining -= usage["system"] + usage["user"]
+
+        # --- Retrieved context ---
+        kept_chunks, context_tokens = [], 0
+        context_budget = min(remaining, int(self.budget * self.context_share))
+        for chunk in context_chunks or []:
+            cost = self.count(chunk) + 2
+            if context_tokens + cost > context_budget:
+                break
+            kept_chunks.append(chunk)
+            context_tokens += cost
+        usage["context"] = context_tokens
+        usage["context_chunks"] = f"{len(kept_chunks)}/{len(context_chunks or [])}"
+        remaining -= context_tokens
+
+        # --- History, newest turns first ---
+        turns = [
+            (chat_history[i], chat_history[i + 1])
+            for i in range(0, len(chat_history) - 1, 2)
+            if chat_history[i]["role"] == "user" and chat_history[i + 1]["role"] == "assistant"
+        ]
+        turn_costs = [self._message_tokens(u["content"]) + self._message_tokens(a["content"]) for u, a in turns]
+
+        history_budget = max(0, remaining - self.summary_tokens)
+        start, history_tokens = len(turns), 0
+        while start > 0 and history_tokens + turn_costs[start - 1] <= history_budget:
+            start -= 1
+            history_tokens += turn_costs[start]
+        if 0 < start < len(turns):
+            # Snap the cut to a block boundary so the kept prefix is stable across turns,
+            # but never drop the latest turn just for the sake of alignment
+            snapped = min(len(turns) - 1, -(-start // DROP_BLOCK_TURNS) * DROP_BLOCK_TURNS)
+            history_tokens -= sum(turn_costs[start:snapped])
+            start = snapped
+
+        summary = _summarize_turns(turns[:start], self.count, self.summary_tokens) if start else None
+        usage["history"] = history_tokens
+        usage["history_turns"] = len(turns) - start
+        usage["dropped_turns"] = start
+        usage["summary"] = self.count(summary) if summary else 0
+
+        context_text = "\n- ".join(kept_chunks) if kept_chunks else None
+        user_prompt = format_user_turn(user_input, context_text)
+
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        for user_msg, assistant_msg in turns[start:]:
+            messages.extend((user_msg, assistant_msg))
+        # The summary only rides along with this request; history stores the plain turn
+        messages.append({"role": "user", "content": f"({summary})\n\n{user_prompt}" if summary else user_prompt})
+
+        usage["total"] = usage["system"] + usage["user"] + context_tokens + history_tokens + usage["summary"]
+        return messages, user_prompt, usage
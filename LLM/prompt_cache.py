@@ -0,0 +1,179 @@
+import hashlib
+import os
+import pickle
+import threading
+
+from llama_cpp import LlamaRAMCache
+from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+
+from chat import SYSTEM_PROMPT
+from metrics import CACHE_REQUESTS
+
+# --- Config ---
+PROMPT_CACHE_BYTES = int(os.getenv("PROMPT_CACHE_BYTES", str(1 << 30)))
+PROMPT_CACHE_DIR = os.getenv("PROMPT_CACHE_DIR", os.path.join("models", "prompt_cache"))
+
+_SENTINEL = "<<sailmate-user-turn>>"
+
+
+def compact_state(state):
+    """
+    Keeps only the last row of a state's saved logits.
+
+    A model loaded with a speculative draft keeps logits for every position
+    (logits_all), so each saved state would carry n_tokens x vocab floats,
+    hundreds of MB with Gemma's vocabulary. After a restore only the last
+    position's logits are read; load_state broadcasts the row over the prefix.
+    """
+    scores = getattr(state, "scores", None)
+    if scores is not None and scores.ndim == 2 and len(scores) > 1:
+        state.scores = scores[-1:].copy()
+    return state
+
+
+class SessionPromptCache(LlamaRAMCache):
+    """
+    Token-prefix keyed llama.cpp state cache shared by every model in the pool.
+
+    llama_cpp looks up the longest cached prefix of each prompt and restores
+    that KV state, so a follow-up turn only evaluates the tokens added since
+    the session's last reply. The system prompt entry is pinned and never
+    evicted. When a session's conversation grows, the snapshot of its previous
+    turn is a strict prefix of the new one and gets dropped.
+    """
+
+    def __init__(self, capacity_bytes=PROMPT_CACHE_BYTES):
+        super().__init__(capacity_bytes)
+        self.pinned_key = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+    @property
+    def cache_size(self):
+        # llama_cpp only counts the KV bytes; the saved logits take memory too
+        return sum(state.llama_state_size + getattr(getattr(state, "scores", None), "nbytes", 0)
+                   for state in self.cache_state.values())
+
+    def pin(self, key, state):
+        with self._lock:
+            self.pinned_key = tuple(key)
+            self.cache_state[self.pinned_key] = compact_state(state)
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value = super().__getitem__(key)
+            except KeyError:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache="prompt_kv", result="miss")
+                raise
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache="prompt_kv", result="hit")
+            return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return super().__contains__(key)
+
+    def __setitem__(self, key, value):
+        key = tuple(key)
+        with self._lock:
+            # A session's older snapshot is superseded by the longer one
+            stale = [k for k in self.cache_state
+                     if k != self.pinned_key and len(k) < len(key) and key[:len(k)] == k]
+            for k in stale:
+                del self.cache_state[k]
+            self.cache_state.pop(key, None)
+            self.cache_state[key] = compact_state(value)
+
+            while self.cache_size > self.capacity_bytes and len(self.cache_state) > 1:
+                oldest = next(k for k in self.cache_state if k != self.pinned_key)
+                del self.cache_state[oldest]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.cache_state),
+                "bytes": self.cache_size,
+                "capacity_bytes": self.capacity_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def system_prefix_tokens(llm, system_prompt=SYSTEM_PROMPT):
+    """Tokens the chat template emits before the first user message."""
+    template = llm.metadata.get("tokenizer.chat_template")
+    if not template:
+        return None
+
+    eos_id, bos_id = llm.token_eos(), llm.token_bos()
+    formatter = Jinja2ChatFormatter(
+        template=template,
+        eos_token=llm._model.token_get_text(eos_id) if eos_id != -1 else "",
+        bos_token=llm._model.token_get_text(bos_id) if bos_id != -1 else "",
+        stop_token_ids=[eos_id],
+    )
+    prompt = formatter(messages=[
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": _SENTINEL},
+    ]).prompt
+    prefix = prompt[:prompt.index(_SENTINEL)]
+    tokens = llm.tokenize(prefix.encode("utf-8"), add_bos=False, special=True)
+    # The last token may merge with the user's text, so keep it out of the shared prefix
+    return tokens[:-1]
+
+
+def _snapshot_path(llm, tokens, persist_dir):
+    digest = hashlib.sha1(
+        f"{os.path.abspath(llm.model_path)}|{llm.n_ctx()}|{tokens}".encode("utf-8")
+    ).hexdigest()[:16]
+    return os.path.join(persist_dir, f"system_{digest}.state")
+
+
+def warm_system_prompt(llm, cache, persist_dir=PROMPT_CACHE_DIR):
+    """Evaluates the system prompt once (or loads it from disk) and pins its KV state."""
+    tokens = system_prefix_tokens(llm)
+    if not tokens:
+        print("⚠️ Model has no chat template; skipping system prompt warm-up.")
+        return None
+
+    path = _snapshot_path(llm, tokens, persist_dir) if persist_dir else None
+    if path and os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            llm.load_state(state)
+            cache.pin(tokens, state)
+            print(f"⚡ Loaded system prompt KV state from {path}")
+            return state
+        except Exception as e:
+            print(f"Stale system prompt snapshot ({e}), re-evaluating...")
+
+    llm.reset()
+    llm.eval(tokens)
+    state = compact_state(llm.save_state())
+    cache.pin(tokens, state)
+    print(f"🧠 System prompt evaluated ({len(tokens)} tokens) and cached.")
+
+    if path:
+        os.makedirs(persist_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, path)
+    return state
+
+
+def enable_prompt_cache(models, capacity_bytes=PROMPT_CACHE_BYTES, persist_dir=PROMPT_CACHE_DIR):
+    """Attaches one shared prompt cache to every model and warms the system prompt."""
+    cache = SessionPromptCache(capacity_bytes)
+    for llm in models:
+        llm.set_cache(cache)
+    if models:
+        state = warm_system_prompt(models[0], cache, persist_dir)
+        if state is not None:
+            for llm in models[1:]:
+                llm.load_state(state)
+    return cache
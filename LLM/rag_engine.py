@@ -1,185 +1,337 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
-import shutil
 import faiss
 import json
-import pickle
+import hashlib
 import asyncio
 
-# --- CORE COMPONENTS ---
+import vector_index
+from chunk_store import ChunkStore
+from model_registry import registry
+from metrics import metrics
+from resources import configure_torch
 
-# Initialize a single instance of the embedding model
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# --- CORE COMPONENTS ---
 
-import os
-import fitz  # PyMuPDF
+def _load_embedder():
+    # Imported here so importing this module doesn't pull in torch
+    from sentence_transformers import SentenceTransformer
+    configure_torch()
+    return SentenceTransformer("all-MiniLM-L6-v2")
 
-# --- Define your extractor functions ---
+# A single, lazily loaded instance of the embedding model
+embedder = registry.register("embedder", _load_embedder)
 
-def _extract_from_txt(path):
-    """Extracts text from a .txt file."""
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
+import os
+from doc_chunker import FILE_EXTRACTORS, iter_file_chunks
+
+
+# --- Incremental indexing ---
+#
+# The manifest records, per source file, its content hash, mtime, size and the
+# contiguous range of chunk IDs it owns in the ID-mapped FAISS index. On startup
+# only new or changed files are embedded; chunks of changed or deleted files
+# are removed by ID. Raw embeddings are kept in vectors.f32 (row = chunk ID) so
+# the index can be retrained or switched to another type without re-embedding.
+
+CACHE_PATH = "rag_cache"
+DOCS_PATH = "rag_docs"
+INDEX_PATH = os.path.join(CACHE_PATH, "index.faiss")
+VECTORS_PATH = os.path.join(CACHE_PATH, "vectors.f32")
+MANIFEST_VERSION = 5
+EMBED_BATCH_SIZE = 64
+
+RAG_SEARCH_SECONDS = metrics.histogram(
+    "assistant_rag_search_seconds", "FAISS search time per query.")
+RAG_CHUNKS_INDEXED = metrics.counter(
+    "assistant_rag_chunks_indexed_total", "Chunks embedded and added to the index.")
+
+
+def _file_sha256(path):
+    """Hashes a file in 1 MiB blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _empty_manifest():
+    return {
+        "version": MANIFEST_VERSION,
+        "dim": embedder.get_sentence_embedding_dimension(),
+        "next_id": 0,
+        "index": {"type": "flat", "trained_on": 0},
+        "files": {},
+    }
+
+
+def _read_manifest(manifest_path):
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError("Manifest is from an older cache format.")
+    return manifest
+
+
+def _diff_folder(folder_path, manifest):
+    """
+    Compares the folder with the manifest.
+    Returns (files to (re)index as {name: file_info}, names to drop, touched).
+    Hashes are only computed when mtime or size moved.
+    """
+    known = manifest["files"]
+    to_index, seen, touched = {}, set(), False
+    for file_name in sorted(os.listdir(folder_path)):
+        file_path = os.path.join(folder_path, file_name)
+        if not os.path.isfile(file_path) or os.path.splitext(file_name)[1].lower() not in FILE_EXTRACTORS:
+            continue
+        seen.add(file_name)
+        stat = os.stat(file_path)
+        entry = known.get(file_name)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            continue
+
+        digest = _file_sha256(file_path)
+        if entry and entry["sha256"] == digest:
+            # Touched but not edited; just refresh the stat fields
+            entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+            touched = True
+            continue
+        to_index[file_name] = {"sha256": digest, "mtime": stat.st_mtime, "size": stat.st_size}
+
+    to_drop = [name for name in known if name not in seen or name in to_index]
+    return to_index, to_drop, touched
+
+
+def _drop_files(index, manifest, names):
+    """Removes the chunks owned by `names` from the index and manifest."""
+    for name in names:
+        entry = manifest["files"].pop(name, None)
+        if not entry:
+            continue
+        start, end = entry["ids"]
+        if end > start:
+            if vector_index.supports_removal(index):
+                index.remove_ids(np.arange(start, end, dtype="int64"))
+            else:
+                # HNSW can't delete; rebuild from the stored vectors after this sync
+                manifest["index"]["stale"] = True
+
+
+async def _index_files(index, docs, manifest, folder_path, to_index, on_progress=None, chunk_pool=None):
+    """
+    Streams chunks of new/changed files into the index in fixed-size embedding
+    batches. Extraction runs in `chunk_pool` (doc_chunker.make_chunk_pool) when
+    given; each file still gets a contiguous chunk-ID range, in the order files
+    are processed.
+    """
+    paths = [os.path.join(folder_path, name) for name in to_index]
+    stream = iter_file_chunks(paths, embedder.tokenizer, chunk_pool)
+    pending = []            # (file_name, chunk) waiting for the next batch
+    first_id, counts, embedded = {}, {}, {}
+
+    def store(batch, embeddings):
+        start = len(docs)  # chunk IDs are row numbers in the store
+        vector_index.append_vectors(VECTORS_PATH, embeddings)
+        index.add_with_ids(embeddings, np.arange(start, start + len(batch), dtype="int64"))
+        docs.append(batch)
+
+    async def flush():
+        batch = [chunk for _, chunk in pending]
+        embeddings = await asyncio.to_thread(embedder.encode, batch, batch_size=len(batch))
+        # Writes and index adds are blocking too; queries keep running meanwhile
+        await asyncio.to_thread(store, batch, np.asarray(embeddings, dtype="float32"))
+        RAG_CHUNKS_INDEXED.inc(len(batch))
+        for file_name, _ in pending:
+            embedded[file_name] += 1
+        if on_progress:
+            for file_name in dict.fromkeys(name for name, _ in pending):
+                on_progress(file_name, "embedding", embedded[file_name], counts[file_name])
+        pending.clear()
 
-def _extract_from_pdf(path):
-    """Extracts text from a .pdf file."""
     try:
-        doc = fitz.open(path)
-        full_text = "\n".join(page.get_text() for page in doc)
-        doc.close()
-        return full_text
-    except Exception as e:
-        print(f"Error processing PDF {path}: {e}")
-        return "" # Return empty string on failure
-
-# --- Create the dispatcher dictionary ---
-# This maps file extensions to the function that processes them.
-FILE_EXTRACTORS = {
-    ".txt": _extract_from_txt,
-    ".pdf": _extract_from_pdf,
-}
-
-def _load_and_chunk_doc(file_path):
-    """Loads a single file using the correct extractor and splits it into chunks."""
-    ext = os.path.splitext(file_path)[1].lower()
-    extractor = FILE_EXTRACTORS.get(ext)
+        while (item := await asyncio.to_thread(next, stream, None)) is not None:
+            path, chunks, file_done = item
+            file_name = os.path.basename(path)
+            if file_name not in first_id:
+                first_id[file_name] = manifest["next_id"]
+                counts[file_name], embedded[file_name] = 0, 0
+                if on_progress:
+                    on_progress(file_name, "extracting", 0, 0)
+            counts[file_name] += len(chunks)
+            manifest["next_id"] += len(chunks)
+            pending.extend((file_name, chunk) for chunk in chunks)
+
+            while len(pending) >= EMBED_BATCH_SIZE:
+                rest = pending[EMBED_BATCH_SIZE:]
+                del pending[EMBED_BATCH_SIZE:]
+                await flush()
+                pending.extend(rest)
+
+            if file_done:
+                manifest["files"][file_name] = {
+                    **to_index[file_name],
+                    "ids": [first_id[file_name], first_id[file_name] + counts[file_name]],
+                }
+                print(f"Chunked {file_name}: {counts[file_name]} chunks.")
+
+        if pending:
+            await flush()
+    finally:
+        stream.close()  # cancels extraction still queued on the pool if we stopped early
+
+
+def _atomic_write(path, write):
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _save_cache(index, docs, manifest, cache_path=CACHE_PATH):
+    """Persists index, chunk store and manifest; files are replaced atomically."""
+    def write_manifest(path):
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    _atomic_write(INDEX_PATH, lambda path: faiss.write_index(index, path))
+    docs.flush()
+    # Manifest last: it only ever describes an index that is already on disk
+    _atomic_write(os.path.join(cache_path, "manifest.json"), write_manifest)
+
+
+async def sync_rag_index(index, docs, manifest, folder_path=DOCS_PATH, on_progress=None, mmapped=False,
+                         chunk_pool=None):
+    """
+    Brings a loaded index up to date with the folder, retraining or switching
+    index type when the corpus size calls for it.
+    Returns (index, changed); the index may be a new object. Pass mmapped=True
+    when `index` is the read-only copy of INDEX_PATH loaded by read_index.
+    """
+    to_index, to_drop, touched = await asyncio.to_thread(_diff_folder, folder_path, manifest)
+    rebuild = vector_index.needs_rebuild(index, manifest)
+    if not to_index and not to_drop and not rebuild:
+        if touched:
+            await asyncio.to_thread(_save_cache, index, docs, manifest)
+        return index, False
 
-    if not extractor:
-        print(f"Skipping unsupported file type: {file_path}")
-        return []
+    if mmapped:
+        index = await asyncio.to_thread(vector_index.read_index, INDEX_PATH, False)
 
-    print(f"Processing file: {os.path.basename(file_path)}...")
-    full_text = extractor(file_path)
-    # Using a simple split, which works well with the text extracted from PDFs page by page.
-    return [chunk for chunk in full_text.split('\n\n') if chunk.strip()]
+    if to_index or to_drop:
+        print(f"Updating RAG index: {len(to_index)} new/changed, "
+              f"{len([n for n in to_drop if n not in to_index])} removed file(s).")
+        # Drop any torn tail left by an interrupted run so rows keep matching chunk IDs
+        await asyncio.to_thread(vector_index.open_vectors, VECTORS_PATH, manifest["dim"], manifest["next_id"])
+        # remove_ids scans the whole index on flat types; keep it off the event loop
+        await asyncio.to_thread(_drop_files, index, manifest, to_drop)
+        await _index_files(index, docs, manifest, folder_path, to_index, on_progress, chunk_pool)
 
+    if vector_index.needs_rebuild(index, manifest):
+        index = await asyncio.to_thread(vector_index.rebuild_index, manifest, VECTORS_PATH, manifest["dim"])
 
-# --- The main loader function, now upgraded! ---
+    await asyncio.to_thread(_save_cache, index, docs, manifest)
+    return index, True
 
-def _load_docs_from_folder(folder_path):
-    """Private helper to load and chunk docs of various supported types from a folder."""
-    all_chunks = []
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
-        if os.path.isfile(file_path): # Ensure we're only processing files
-             all_chunks.extend(_load_and_chunk_doc(file_path))
-    return all_chunks
 
-async def _rebuild_rag_index(folder_path="rag_docs"):
+async def _rebuild_rag_index(folder_path=DOCS_PATH, chunk_pool=None):
     """
     Private helper function to build the index from scratch and create a manifest.
     """
-    # Get the list of filenames that will be included in this build
-    source_filenames = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
-
-    docs = await asyncio.to_thread(_load_docs_from_folder, folder_path)
-    docs = [doc for doc in docs if doc.strip()]
-
-    if not docs:
-        print("No content found in documents. Creating a new, empty index.")
-        d = embedder.get_sentence_embedding_dimension()
-        return faiss.IndexFlatL2(d), []
-
-    print(f"Found {len(docs)} chunks from {len(source_filenames)} files. Building new index...")
-    embeddings = await asyncio.to_thread(embedder.encode, docs)
-
-    index = faiss.IndexFlatL2(embeddings[0].shape[0])
-    index.add(np.array(embeddings).astype("float32"))
-
-    # Save everything to disk, including our new manifest
-    await asyncio.gather(
-        asyncio.to_thread(pickle.dump, docs, open("rag_cache/docs.pkl", "wb")),
-        asyncio.to_thread(faiss.write_index, index, "rag_cache/index.faiss"),
-        # Save the list of filenames that this cache represents
-        asyncio.to_thread(json.dump, source_filenames, open("rag_cache/manifest.json", "w"))
-    )
-    print("Index rebuilt and saved successfully.")
+    manifest, docs = _empty_manifest(), ChunkStore.create(CACHE_PATH)
+    index = vector_index.new_flat_index(manifest["dim"])
+    if os.path.exists(VECTORS_PATH):
+        os.remove(VECTORS_PATH)
+    index, changed = await sync_rag_index(index, docs, manifest, folder_path, chunk_pool=chunk_pool)
+    if not changed:
+        print("No documents found. Creating a new, empty index.")
+        await asyncio.to_thread(_save_cache, index, docs, manifest)
+    print(f"Index rebuilt with {index.ntotal} chunks and saved successfully.")
     return index, docs
 
 # --- PUBLIC API FUNCTIONS ---
 
-async def load_rag_index():
+async def load_rag_index(chunk_pool=None):
     """
-    Loads the RAG index from cache. If cache is invalid or outdated,
-    it triggers a full rebuild automatically.
+    Loads the RAG index from cache and incrementally re-indexes any files
+    that were added, edited or removed since. Falls back to a full rebuild
+    when the cache is missing or unreadable. `chunk_pool` is the process pool
+    extraction may use (see doc_chunker.make_chunk_pool).
     """
-    cache_path = "rag_cache"
-    docs_path = "rag_docs"
-    manifest_path = os.path.join(cache_path, "manifest.json")
-    index_path = os.path.join(cache_path, "index.faiss")
+    manifest_path = os.path.join(CACHE_PATH, "manifest.json")
+    # Syncing needs the embedder; load it off the event loop first
+    await embedder.aget()
 
     # Ensure directories exist before we do anything
-    os.makedirs(cache_path, exist_ok=True)
-    os.makedirs(docs_path, exist_ok=True)
+    os.makedirs(CACHE_PATH, exist_ok=True)
+    os.makedirs(DOCS_PATH, exist_ok=True)
 
     try:
-        # Check 1: Do the core cache files exist?
-        if not os.path.exists(index_path) or not os.path.exists(manifest_path):
-             raise FileNotFoundError("Cache or manifest missing.")
+        if not os.path.exists(INDEX_PATH) or not os.path.exists(manifest_path):
+            raise FileNotFoundError("Cache or manifest missing.")
 
-        # Check 2: Are the source documents the same as when the cache was built?
-        with open(manifest_path, "r") as f:
-            cached_files = set(json.load(f))
-        current_files = set(os.listdir(docs_path))
+        manifest = _read_manifest(manifest_path)
+        print("Found cache. Loading index...")
+        index = await asyncio.to_thread(vector_index.read_index, INDEX_PATH)
+        docs = ChunkStore(CACHE_PATH, manifest["next_id"])
 
-        if cached_files != current_files:
-            print("Source documents have changed. Forcing a rebuild.")
-            # We don't raise an error, we just proceed to the rebuild logic
-            return await _rebuild_rag_index()
+    except Exception as e:
+        print(f"Cache invalid or loading failed ({e}). Rebuilding from scratch...")
+        return await _rebuild_rag_index(chunk_pool=chunk_pool)
 
-        # If all checks pass, load from the trusted cache
-        print("Found valid and up-to-date cache. Loading index...")
-        index = await asyncio.to_thread(faiss.read_index, index_path)
-        with open(os.path.join(cache_path, "docs.pkl"), "rb") as f:
-            docs = await asyncio.to_thread(pickle.load, f)
+    index, _ = await sync_rag_index(index, docs, manifest, mmapped=True, chunk_pool=chunk_pool)
+    print("RAG engine is ready.")
+    return index, docs
 
-        print("RAG engine is ready.")
-        return index, docs
+def _stored_vectors(n_rows, d):
+    """Read-only map of the raw vectors for chunk IDs below n_rows, reused while the corpus is unchanged."""
+    global _vector_view
+    if _vector_view is None or _vector_view.shape != (n_rows, d):
+        _vector_view = vector_index.map_vectors(VECTORS_PATH, d, n_rows)
+    return _vector_view
 
-    except Exception as e:
-        print(f"Cache invalid or loading failed ({e}). Rebuilding from scratch...")
-        return await _rebuild_rag_index()
+_vector_view = None
 
-def retrieve_context(query: str, index: faiss.Index, docs: list, k: int = 3):
+def search_context(query_embedding, index: faiss.Index, docs: ChunkStore, k: int = 3):
+    """
+    Searches the index with an already computed query embedding.
+    Compressed indexes are re-scored exactly, so distances are always true
+    squared L2 and DISTANCE_THRESHOLD means the same whatever the index type.
+    """
+    query = np.asarray(query_embedding, dtype="float32").reshape(1, -1)
+    with RAG_SEARCH_SECONDS.time():
+        if vector_index.is_compressed(index):
+            vectors = _stored_vectors(len(docs), index.d)
+            distances, indices = vector_index.search_rescored(index, vectors, query, k)
+        else:
+            distances, indices = index.search(query, k)
+
+    # Return both the text chunks and their corresponding distances (-1 pads short results)
+    hits = [(docs[i], dist) for i, dist in zip(indices[0], distances[0]) if i != -1]
+    return [text for text, _ in hits], np.array([dist for _, dist in hits] or [np.inf], dtype="float32")
+
+def retrieve_context(query: str, index: faiss.Index, docs: ChunkStore, k: int = 3):
     """
     Retrieves the top 'k' most relevant document chunks and their distances.
     """
     query_embedding = embedder.encode([query])
-    distances, indices = index.search(np.array(query_embedding).astype("float32"), k)
-
-    # Return both the text chunks and their corresponding distances
-    return [docs[i] for i in indices[0]], distances[0]
+    return search_context(query_embedding[0], index, docs, k)
 
-async def add_document_to_rag(file_path: str, index: faiss.Index, docs: list):
+def merge_contexts(*results, k: int = 3):
     """
-    Adds a new document to the existing in-memory index and doc list,
-    then saves the updated versions to disk.
+    Merges several (context, distances) search results into one, keeping the
+    k closest distinct chunks.
     """
-    if not os.path.isfile(file_path) or not file_path.endswith(".txt"):
-        raise ValueError("Invalid file provided. Must be a .txt file.")
-
-    # Process ONLY the new document
-    new_chunks = _load_and_chunk_doc(file_path)
-
-    if not new_chunks:
-        print("File is empty or contains no valid chunks. Nothing to add.")
-        return index, docs
-
-    # Add to the existing index and doc list
-    new_embeddings = await asyncio.to_thread(embedder.encode, new_chunks)
-    index.add(np.array(new_embeddings).astype("float32"))
-    docs.extend(new_chunks)
-
-    # Save the updated versions to disk
-    await asyncio.gather(
-        asyncio.to_thread(pickle.dump, docs, open("rag_cache/docs.pkl", "wb")),
-        asyncio.to_thread(faiss.write_index, index, "rag_cache/index.faiss")
-    )
-
-    # Copy the source file to your RAG document collection
-    shutil.copy(file_path, os.path.join("rag_docs", os.path.basename(file_path)))
-    print(f"Successfully updated RAG with: {os.path.basename(file_path)}")
-    return index, docs
+    best = {}
+    for context, distances in results:
+        for text, dist in zip(context, distances):
+            if text not in best or dist < best[text]:
+                best[text] = dist
+    hits = sorted(best.items(), key=lambda hit: hit[1])[:k]
+    return [text for text, _ in hits], np.array([dist for _, dist in hits] or [np.inf], dtype="float32")
+
+def load_rag_manifest():
+    """Reads the manifest describing the index currently on disk."""
+    return _read_manifest(os.path.join(CACHE_PATH, "manifest.json"))
 
 # --- USAGE EXAMPLE ---
 
@@ -195,9 +347,8 @@ async def example_usage():
     print(f"\nQuery: {user_query}")
     print(f"Retrieved Context: {context}")
 
-    # 3. (Optional) When a user uploads a file, add it to the RAG
-    # Note: In a real app, you'd get the file path from a file dialog
-    # rag_index, rag_docs = await add_document_to_rag("path/to/new_file.txt", rag_index, rag_docs)
+    # 3. (Optional) Uploaded files go through ingestion.IngestionPipeline, which
+    # indexes them on a shadow copy and swaps the new snapshot in
 
 
 if __name__ == "__main__":
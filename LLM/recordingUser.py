@@ -1,3 +1,5 @@
+import asyncio
+
 import sounddevice as sd
 from scipy.io.wavfile import write
 
@@ -30,3 +32,43 @@ def record(output_file, duration, sample_rate, device=None):
         sd.wait()
         write(output_file, sample_rate, recording)
         print(f"✅ Recording saved to {output_file} using default mic.")
+
+
+class MicStream:
+    """
+    Live microphone capture as an async iterator of float32 mono blocks.
+    The audio callback runs on PortAudio's thread and hands each block to
+    the event loop, so nothing is written to disk.
+
+        async with MicStream() as mic:
+            async for block in mic: ...
+    """
+
+    def __init__(self, sample_rate=16000, block_ms=30, device=None):
+        self.sample_rate = sample_rate
+        self.blocksize = sample_rate * block_ms // 1000
+        self.device = device
+        self._stream = None
+        self._queue = None
+        self._loop = None
+
+    def _callback(self, indata, frames, time, status):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, indata[:, 0].copy())
+
+    async def __aenter__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._stream = sd.InputStream(samplerate=self.sample_rate, channels=1, dtype="float32",
+                                      blocksize=self.blocksize, device=self.device, callback=self._callback)
+        self._stream.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        self._stream.stop()
+        self._stream.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._queue.get()
@@ -0,0 +1,179 @@
+import os
+import sys
+
+# --- Config ---
+# Thread budgets per model pool; "auto" splits the usable physical cores.
+# THREADS_LLM is the total across the llama pool, THREADS_WHISPER across whisper workers.
+THREADS_LLM = os.getenv("THREADS_LLM", "auto")
+THREADS_WHISPER = os.getenv("THREADS_WHISPER", "auto")
+THREADS_TORCH = os.getenv("THREADS_TORCH", "auto")  # embedder + BLIP share torch's intra-op pool
+THREADS_FAISS = os.getenv("THREADS_FAISS", "1")  # single-query searches gain nothing from OpenMP
+# Pin each pool's threads to its own cores, so pools can't steal each other's caches
+CPU_AFFINITY = os.getenv("CPU_AFFINITY", "0") == "1"
+# llama.cpp layers to offload; "auto" offloads when the build has a usable GPU backend
+LLM_GPU_LAYERS = os.getenv("LLM_GPU_LAYERS", "auto")
+LLM_GPU_LAYERS_DEFAULT = 20
+
+# Share of the physical cores each pool gets under "auto" (torch takes what's left)
+AUTO_SHARES = {"llm": 0.5, "whisper": 0.25}
+
+# Which core set each stage pool's threads run on (see stage_executor)
+STAGE_POOLS = {"caption": "torch", "embed": "torch", "search": "faiss", "prompt": "faiss"}
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def usable_cpus():
+    """Logical CPUs this process may run on (respects taskset / cgroup cpusets)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def physical_cores(cpus):
+    """Groups logical CPUs into physical cores (hyperthread siblings together)."""
+    cores = {}
+    for cpu in cpus:
+        topology = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        core_id = _read(f"{topology}/core_id")
+        package_id = _read(f"{topology}/physical_package_id")
+        key = (package_id, core_id) if core_id is not None else ("cpu", cpu)
+        cores.setdefault(key, []).append(cpu)
+    return sorted(cores.values())
+
+
+def gpu_offload_supported():
+    """True when llama-cpp was built with a GPU backend (CUDA, Metal, Vulkan...)."""
+    try:
+        import llama_cpp
+        return bool(llama_cpp.llama_supports_gpu_offload())
+    except Exception:
+        return False
+
+
+def _budget(setting, auto):
+    return max(1, auto if setting == "auto" else int(setting))
+
+
+class ResourcePlan:
+    """
+    Thread counts and core sets for each model pool, decided once at startup.
+
+    Cores are split between llama.cpp, whisper and torch so that a voice turn
+    and an image turn overlapping with a reply don't oversubscribe the CPU.
+    On machines with two or fewer cores every pool shares everything.
+    """
+
+    def __init__(self, cpus=None, cores=None, gpu=None):
+        self.cpus = cpus if cpus is not None else usable_cpus()
+        self.cores = cores if cores is not None else physical_cores(self.cpus)
+        self.gpu = gpu_offload_supported() if gpu is None else gpu
+        self.affinity = CPU_AFFINITY and hasattr(os, "sched_setaffinity")
+
+        n = len(self.cores)
+        if n <= 2:
+            auto = {"llm": n, "whisper": n, "torch": n}
+        else:
+            llm = max(1, round(n * AUTO_SHARES["llm"]))
+            whisper = max(1, round(n * AUTO_SHARES["whisper"]))
+            auto = {"llm": llm, "whisper": whisper, "torch": max(1, n - llm - whisper)}
+        self.threads = {
+            "llm": _budget(THREADS_LLM, auto["llm"]),
+            "whisper": _budget(THREADS_WHISPER, auto["whisper"]),
+            "torch": _budget(THREADS_TORCH, auto["torch"]),
+            "faiss": _budget(THREADS_FAISS, 1),
+        }
+        self.core_sets = self._assign_cores(n)
+        if LLM_GPU_LAYERS == "auto":
+            self.gpu_layers = LLM_GPU_LAYERS_DEFAULT if self.gpu else 0
+        else:
+            self.gpu_layers = int(LLM_GPU_LAYERS)
+
+    def _assign_cores(self, n):
+        """Hands out whole physical cores in order: llm, whisper, torch; faiss shares torch's."""
+        if n <= 2:
+            return {pool: list(self.cpus) for pool in ("llm", "whisper", "torch", "faiss")}
+        sets, start = {}, 0
+        for pool in ("llm", "whisper", "torch"):
+            cores = self.cores[start:start + self.threads[pool]]
+            start += len(cores)
+            cores = cores or self.cores[-1:]  # out of cores: share the last one
+            sets[pool] = sorted(cpu for core in cores for cpu in core)
+        sets["faiss"] = sets["torch"]
+        return sets
+
+    def llm_threads(self, pool_size=1):
+        return max(1, self.threads["llm"] // max(1, pool_size))
+
+    def whisper_threads(self, workers=1):
+        return max(1, self.threads["whisper"] // max(1, workers))
+
+    def as_dict(self):
+        return {
+            "logical_cpus": len(self.cpus),
+            "physical_cores": len(self.cores),
+            "gpu_offload": self.gpu,
+            "llm_gpu_layers": self.gpu_layers,
+            "threads": dict(self.threads),
+            "affinity": self.affinity,
+            "core_sets": dict(self.core_sets) if self.affinity else None,
+        }
+
+
+# Shared by every module that starts model threads
+plan = ResourcePlan()
+
+
+# --- Enforcement ---
+
+def pin_thread(pool):
+    """Restricts the calling thread (and threads it spawns later) to the pool's cores."""
+    if plan.affinity:
+        os.sched_setaffinity(0, plan.core_sets[pool])  # 0 = the calling thread on Linux
+
+
+def pin_stage_thread(stage):
+    """ThreadPoolExecutor initializer for stage_executor pools."""
+    pool = STAGE_POOLS.get(stage)
+    if pool is not None:
+        pin_thread(pool)
+
+
+def configure_torch():
+    """Caps torch's intra-op threads. Call right after torch is first imported."""
+    import torch
+    torch.set_num_threads(plan.threads["torch"])
+    try:
+        torch.set_num_interop_threads(1)  # only allowed before torch runs any parallel work
+    except RuntimeError:
+        pass
+
+
+def apply_limits():
+    """Enforces the plan for libraries that are configured process-wide. Call once at startup."""
+    import faiss
+    faiss.omp_set_num_threads(plan.threads["faiss"])
+    if "torch" in sys.modules:
+        configure_torch()
+    print(f"🧮 Threads: {plan.threads} on {len(plan.cores)} cores"
+          f"{' (pinned)' if plan.affinity else ''}, GPU layers: {plan.gpu_layers}")
+
+
+def status():
+    """The plan plus what the process is actually running with right now."""
+    current = {}
+    if hasattr(os, "sched_getaffinity"):
+        current["process_cpus"] = sorted(os.sched_getaffinity(0))
+    if hasattr(os, "getloadavg"):
+        current["load_avg"] = [round(x, 2) for x in os.getloadavg()]
+    if "torch" in sys.modules:
+        current["torch_threads"] = sys.modules["torch"].get_num_threads()
+    if "faiss" in sys.modules:
+        current["faiss_threads"] = sys.modules["faiss"].omp_get_max_threads()
+    return {**plan.as_dict(), "current": current}
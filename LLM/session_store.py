@@ -0,0 +1,246 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# --- Config ---
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join("sessions", "sessions.db"))
+SESSION_MAX_IN_MEMORY = int(os.getenv("SESSION_MAX_IN_MEMORY", "256"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 << 20)))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def _message_bytes(message):
+    return len(message["content"].encode("utf-8")) + len(message["role"]) + 64
+
+
+class _Session:
+    __slots__ = ("messages", "bytes", "last_access")
+
+    def __init__(self, messages, last_access):
+        self.messages = messages
+        self.bytes = sum(_message_bytes(m) for m in messages)
+        self.last_access = last_access
+
+
+class SessionStore:
+    """
+    Chat histories keyed by session_id, with a bounded in-memory LRU in front
+    of a write-through SQLite log.
+
+    Sessions past SESSION_MAX_IN_MEMORY or SESSION_MAX_BYTES are evicted from
+    RAM (least recently used first) and reloaded from disk on their next turn.
+    Sessions idle longer than the TTL are deleted from both.
+
+    append() only updates memory and queues the rows; a writer thread commits
+    everything queued since its last pass in one transaction, so the WAL fsync
+    never runs on the event loop. Reads that go to disk write the queue out first.
+    """
+
+    def __init__(self, db_path=SESSION_DB_PATH, max_sessions=SESSION_MAX_IN_MEMORY,
+                 max_bytes=SESSION_MAX_BYTES, ttl_seconds=SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()  # the in-memory sessions
+        self._db_lock = threading.Lock()  # the connection; never taken before _lock
+        self._pending = []  # (session_id, first seq, messages, last_access) not yet on disk
+        self._wake = threading.Condition(threading.Lock())
+        self._closed = False
+        self._last_sweep = 0.0
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            );
+        """)
+        self._db.commit()
+        self._writer = threading.Thread(target=self._writer_loop, name="session-writer", daemon=True)
+        self._writer.start()
+
+    # --- Public API ---
+
+    def get(self, session_id):
+        """Returns a copy of the session's messages (empty for a new session)."""
+        with self._lock:
+            session = self._load(session_id)
+            return list(session.messages) if session else []
+
+    def append(self, session_id, *messages):
+        """Appends messages to a session; the disk write happens on the writer thread."""
+        now = time.time()
+        with self._lock:
+            session = self._load(session_id)
+            if session is None:
+                session = _Session([], now)
+                self._sessions[session_id] = session
+
+            with self._wake:
+                self._pending.append((session_id, len(session.messages), messages, now))
+                self._wake.notify()
+
+            for message in messages:
+                session.messages.append(message)
+                size = _message_bytes(message)
+                session.bytes += size
+                self._bytes += size
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+            self._evict()
+
+    def reset(self, session_id):
+        """Forgets a session in memory and on disk."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session:
+                self._bytes -= session.bytes
+            self._delete(session_id)
+
+    def flush(self):
+        """Writes out every queued append before returning."""
+        with self._db_lock:
+            self._write_pending()
+
+    def stats(self):
+        self.flush()
+        with self._db_lock:
+            on_disk = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        with self._lock:
+            return {
+                "in_memory": len(self._sessions),
+                "in_memory_bytes": self._bytes,
+                "on_disk": on_disk,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+            }
+
+    def close(self):
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+        self._writer.join()
+        with self._db_lock:
+            self._write_pending()
+            self._db.close()
+
+    # --- Internals ---
+
+    def _load(self, session_id):
+        """Returns the in-memory session, pulling it from disk if it was evicted."""
+        now = time.time()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            if now - session.last_access > self.ttl_seconds:
+                self.reset(session_id)
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+        with self._db_lock:
+            self._write_pending(session_id)  # an evicted session may still have rows queued
+            row = self._db.execute(
+                "SELECT last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is not None and now - row[0] <= self.ttl_seconds:
+                messages = [
+                    {"role": role, "content": content}
+                    for role, content in self._db.execute(
+                        "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+                    )
+                ]
+        if row is None:
+            return None
+        if now - row[0] > self.ttl_seconds:
+            self._delete(session_id)
+            return None
+
+        session = _Session(messages, row[0])
+        self._sessions[session_id] = session
+        self._bytes += session.bytes
+        self._evict()
+        return session
+
+    def _evict(self):
+        # Always keep the most recent session resident, even if it alone is over budget
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            _, session = self._sessions.popitem(last=False)
+            self._bytes -= session.bytes
+
+    def _delete(self, session_id):
+        with self._db_lock:
+            self._write_pending(session_id)  # so a queued append can't bring the session back
+            self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+
+    def _write_pending(self, session_id=None):
+        """
+        Commits the queued appends in one transaction. Hold _db_lock.
+        With session_id, only bothers when that session has something queued.
+        """
+        with self._wake:
+            if session_id is not None and all(queued[0] != session_id for queued in self._pending):
+                return
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        self._db.executemany(
+            "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [(session_id, start + i, m["role"], m["content"])
+             for session_id, start, messages, _ in pending for i, m in enumerate(messages)],
+        )
+        self._db.executemany(
+            "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+            [(session_id, now) for session_id, _, _, now in pending],
+        )
+        self._db.commit()
+
+    def _writer_loop(self):
+        while True:
+            with self._wake:
+                while not self._pending and not self._closed:
+                    self._wake.wait()
+                if self._closed:
+                    return
+            with self._db_lock:
+                self._write_pending()
+            self._maybe_sweep(time.time())
+
+    def _maybe_sweep(self, now):
+        """Purges expired sessions from disk, at most once a minute. Runs on the writer thread."""
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        cutoff = now - self.ttl_seconds
+        with self._db_lock:
+            expired = [r[0] for r in self._db.execute(
+                "SELECT session_id FROM sessions WHERE last_access < ?", (cutoff,)
+            )]
+        for session_id in expired:
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session and session.last_access >= cutoff:
+                    continue  # came back since the query
+                if session:
+                    del self._sessions[session_id]
+                    self._bytes -= session.bytes
+                self._delete(session_id)
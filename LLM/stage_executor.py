@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from metrics import STAGE_SECONDS
+
+# --- Config ---
+# Max concurrent calls per blocking stage. Model stages release the GIL inside
+# torch / faiss / ggml, so threads give real parallelism here.
+DEFAULT_STAGE_LIMITS = {
+    "caption": int(os.getenv("STAGE_CAPTION_WORKERS", "1")),
+    "embed": 1,  # the embedding service already batches; one encode at a time
+    "search": int(os.getenv("STAGE_SEARCH_WORKERS", "2")),
+    "prompt": int(os.getenv("STAGE_PROMPT_WORKERS", "2")),
+}
+
+
+class StageTimings:
+    """Wall-clock duration of each stage of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def record(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+    @asynccontextmanager
+    async def measure(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def header(self):
+        """Formats the timings as a Server-Timing header value (milliseconds)."""
+        parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+class StageExecutor:
+    """
+    Runs blocking model stages off the event loop, each stage in its own
+    thread pool so a slow BLIP caption can't starve FAISS searches and
+    vice versa. Pool size is the stage's concurrency limit.
+    """
+
+    def __init__(self, limits=None, initializer=None):
+        """initializer(stage), if given, runs in each new worker thread (e.g. to pin it to cores)."""
+        self.limits = {**DEFAULT_STAGE_LIMITS, **(limits or {})}
+        self._pools = {
+            stage: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"stage-{stage}",
+                                      initializer=initializer, initargs=(stage,) if initializer else ())
+            for stage, limit in self.limits.items()
+        }
+
+    async def run(self, stage, fn, *args, timings=None):
+        """Runs fn(*args) in the stage's pool, recording its duration in `timings`."""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._pools[stage], fn, *args)
+        finally:
+            if timings is not None:
+                timings.record(stage, time.perf_counter() - started)
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False)
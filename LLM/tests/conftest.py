@@ -0,0 +1,8 @@
+# Tests import the app modules the way the app does (flat, from LLM/),
+# and the model stand-ins from bench/fakes.py.
+import os
+import sys
+
+LLM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LLM_DIR)
+sys.path.insert(0, os.path.join(LLM_DIR, "bench"))
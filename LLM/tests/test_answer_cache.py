@@ -0,0 +1,60 @@
+import numpy as np
+
+from answer_cache import AnswerCache
+
+CONTEXT = ["Lifeboat launching: sound the general alarm.", "Muster at the lifeboat station."]
+
+
+def vector(seed, noise=0.0):
+    rng = np.random.default_rng(seed)
+    v = rng.standard_normal(64).astype("float32")
+    if noise:
+        v += noise * np.random.default_rng(seed + 1000).standard_normal(64).astype("float32")
+    return v
+
+
+def cache_with_answer(**kwargs):
+    cache = AnswerCache(threshold=0.95, **kwargs)
+    cache.store("how do I launch the lifeboat", "prompt with context", vector(1), 3, CONTEXT, "Sound the alarm.", 2.0)
+    return cache
+
+
+def test_similar_question_on_same_context_hits():
+    cache = cache_with_answer()
+    hit = cache.lookup(vector(1, noise=0.05), 3, CONTEXT)
+    assert hit.answer == "Sound the alarm."
+    assert hit.user_prompt == "prompt with context"
+    assert cache.stats()["hits"] == 1 and cache.stats()["seconds_saved"] == 2.0
+
+
+def test_different_question_misses():
+    cache = cache_with_answer()
+    assert cache.lookup(vector(2), 3, CONTEXT) is None
+
+
+def test_new_rag_version_drops_the_entry():
+    cache = cache_with_answer()
+    assert cache.lookup(vector(1), 4, CONTEXT) is None
+    assert cache.stats()["stale_dropped"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_changed_context_is_not_replayed():
+    cache = cache_with_answer()
+    assert cache.lookup(vector(1), 3, CONTEXT[:1]) is None
+    assert cache.stats()["entries"] == 1  # still valid for the old context
+
+
+def test_expired_entries_are_dropped():
+    cache = cache_with_answer(ttl=0.0)
+    assert cache.lookup(vector(1), 3, CONTEXT) is None
+    assert cache.stats()["stale_dropped"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(threshold=0.95, max_entries=2)
+    for seed in (1, 2):
+        cache.store(f"q{seed}", f"q{seed}", vector(seed), 1, None, f"a{seed}", 1.0)
+    cache.lookup(vector(1), 1, None)  # q1 is now the most recently used
+    cache.store("q3", "q3", vector(3), 1, None, "a3", 1.0)
+    assert cache.lookup(vector(2), 1, None) is None
+    assert cache.lookup(vector(1), 1, None).answer == "a1"
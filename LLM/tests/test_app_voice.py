@@ -0,0 +1,89 @@
+import functools
+import json
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("llama_cpp")
+pytest.importorskip("torch")
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+
+import rag_engine
+from fakes import FakeEmbedder, FakeLlama
+
+SAMPLE_RATE = 16000
+
+
+class FakeTranscriber:
+    async def transcribe_samples(self, pcm):
+        return "how do I launch the lifeboat"
+
+
+def speech_pcm():
+    """Half a second of silence, a second of tone, then a second of near silence, as 16-bit PCM."""
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    audio = np.concatenate([np.zeros(SAMPLE_RATE // 2), 0.3 * np.sin(2 * np.pi * 220 * t),
+                            np.random.default_rng(0).standard_normal(SAMPLE_RATE) * 0.001])
+    return (audio * 32767).astype("<i2").tobytes()
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    """One app for the module: loaded models are bound to the event loop of the first client."""
+    tmp_path = tmp_path_factory.mktemp("app")
+    (tmp_path / rag_engine.DOCS_PATH).mkdir()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path)
+        import app  # creates its session and weather stores in the working directory
+        mp.setattr(app.llm_scheduler, "loader", functools.partial(
+            app.load_llm_scheduler, lambda: FakeLlama(tokens_per_s=1000, prompt_tokens_per_s=1e6, reply_tokens=5)))
+        mp.setattr(rag_engine.embedder, "loader", lambda: FakeEmbedder(batch_ms=0, per_text_ms=0))
+        mp.setattr(app.whisper_engine, "loader", lambda: FakeTranscriber())
+        with TestClient(app.app) as test_client:
+            deadline = time.monotonic() + 10
+            while test_client.get("/health/ready").status_code != 200 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            yield test_client
+
+
+def talk(ws):
+    pcm = speech_pcm()
+    for i in range(0, len(pcm), 960):
+        ws.send_bytes(pcm[i:i + 960])
+    ws.send_text(json.dumps({"type": "end"}))
+
+
+def receive_until(ws, *types):
+    events = []
+    while not events or events[-1]["type"] not in types:
+        events.append(ws.receive_json())
+    return events
+
+
+def test_bad_control_frames_are_reported_and_the_session_goes_on(client):
+    with client.websocket_connect("/voice-stream?session_id=bad-frames") as ws:
+        ws.send_text("not json")
+        ws.send_text("[1, 2]")
+        assert ws.receive_json()["type"] == "error"
+        assert ws.receive_json()["type"] == "error"
+
+        talk(ws)
+        events = receive_until(ws, "done", "error")
+    assert [e["text"] for e in events if e["type"] == "transcript"] == ["how do I launch the lifeboat"]
+    assert events[-1]["type"] == "done"
+
+
+def test_failed_reply_sends_an_error_event(client, monkeypatch):
+    import app
+
+    async def broken_retrieve(query, rag, timings):
+        raise RuntimeError("index file is corrupt")
+
+    monkeypatch.setattr(app, "retrieve", broken_retrieve)
+    with client.websocket_connect("/voice-stream?session_id=broken") as ws:
+        talk(ws)
+        events = receive_until(ws, "done", "error")
+    assert events[-1] == {"type": "error", "error": "Reply failed: index file is corrupt"}
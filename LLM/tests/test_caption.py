@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("torch")
+
+from fakes import FakeCaptionEngine
+
+
+class CountingCaptionEngine(FakeCaptionEngine):
+    """Records each batch; images starting with b"bad" fail to decode."""
+
+    def __init__(self, **kwargs):
+        super().__init__(batch_ms=0, per_image_ms=0, **kwargs)
+        self.calls = []
+
+    def _caption_batch(self, items):
+        self.calls.append(sorted(items))
+        results = super()._caption_batch(items)
+        for key, data in items.items():
+            if data.startswith(b"bad"):
+                results[key] = ValueError("Could not decode image")
+        return results
+
+
+def test_concurrent_uploads_are_captioned_in_one_batch():
+    async def main():
+        engine = CountingCaptionEngine(window_ms=20)
+        captions = await asyncio.gather(*(engine.caption(data) for data in [b"deck", b"mast", b"deck"]))
+        return engine, captions
+
+    engine, captions = asyncio.run(main())
+    assert len(engine.calls) == 1 and len(engine.calls[0]) == 2  # identical images share a slot
+    assert captions[0] == captions[2] != captions[1]
+    assert engine.stats()["avg_batch_size"] == 2
+
+
+def test_resent_image_skips_the_model_and_lru_is_bounded():
+    async def main():
+        engine = CountingCaptionEngine(window_ms=1, cache_size=1)
+        for data in [b"deck", b"deck", b"mast", b"deck"]:
+            await engine.caption(data)
+        return engine
+
+    engine = asyncio.run(main())
+    assert len(engine.calls) == 3 and engine.hits == 1
+    assert engine.stats()["cache_entries"] == 1
+
+
+def test_undecodable_image_fails_alone_and_is_not_cached():
+    async def main():
+        engine = CountingCaptionEngine(window_ms=20)
+        results = await asyncio.gather(engine.caption(b"bad bytes"), engine.caption(b"deck"), return_exceptions=True)
+        return engine, results
+
+    engine, (bad, good) = asyncio.run(main())
+    assert isinstance(bad, ValueError) and isinstance(good, str)
+    assert engine.stats()["cache_entries"] == 1
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("llama_cpp")
+
+import numpy as np
+
+from chat import CountingDraft, GREEDY_SAMPLING, build_messages, stream_chat_completion
+from fakes import FakeLlama
+
+
+class RecordingLlama(FakeLlama):
+    """FakeLlama that remembers the sampling settings and draft of each call."""
+
+    def __init__(self, draft=None):
+        super().__init__(tokens_per_s=1e6, prompt_tokens_per_s=1e9, reply_tokens=6)
+        self.speculative_draft = draft
+        self.draft_model = draft
+        self.calls = []
+
+    def create_chat_completion(self, messages, stream=False, max_tokens=None, **kwargs):
+        self.calls.append({"draft": self.draft_model, **kwargs})
+        return super().create_chat_completion(messages, stream=stream, max_tokens=max_tokens, **kwargs)
+
+
+class FixedDraft:
+    def __call__(self, input_ids, /, **kwargs):
+        return np.array([1, 2], dtype=np.intc)
+
+
+def generate(llm, speculative, **kwargs):
+    messages = build_messages([], "How do I launch the lifeboat?")
+    return "".join(stream_chat_completion(llm, messages, speculative=speculative, **kwargs))
+
+
+def test_draft_forces_greedy_and_keeps_the_reply():
+    draft = CountingDraft(FixedDraft(), "prompt_lookup")
+    llm = RecordingLlama(draft)
+
+    plain = generate(llm, False, temperature=0.8)
+    speculative = generate(llm, True, temperature=0.8)
+
+    assert plain == speculative
+    assert llm.calls[0]["draft"] is None and llm.calls[0]["temperature"] == 0.8
+    assert llm.calls[1]["draft"] is draft
+    assert {k: llm.calls[1][k] for k in GREEDY_SAMPLING} == GREEDY_SAMPLING
+    assert draft.generations == 1
+
+
+def test_model_without_draft_ignores_speculative_flag():
+    llm = RecordingLlama()
+    generate(llm, True)
+    assert "top_k" not in llm.calls[0]
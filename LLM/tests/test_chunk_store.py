@@ -0,0 +1,44 @@
+import pytest
+
+from chunk_store import ChunkStore
+
+
+def test_append_and_read_back_unicode(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    assert store.append(["Lifeboat drill", "Température de la mer: 18°C", ""]) == 0
+    assert store.append(["⚓ anchor"]) == 3
+    assert len(store) == 4
+    assert [store[i] for i in range(4)] == ["Lifeboat drill", "Température de la mer: 18°C", "", "⚓ anchor"]
+    with pytest.raises(KeyError):
+        store[4]
+
+
+def test_reopen_truncates_rows_the_manifest_does_not_know(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.append(["one", "two", "three"])
+    store.flush()
+
+    reopened = ChunkStore(str(tmp_path), n_chunks=2)  # the run that wrote "three" never saved its manifest
+    assert len(reopened) == 2 and reopened[1] == "two"
+    assert reopened.append(["again"]) == 2 and reopened[2] == "again"
+
+
+def test_store_shorter_than_the_manifest_is_an_error(tmp_path):
+    ChunkStore(str(tmp_path)).append(["only one"])
+    with pytest.raises(ValueError):
+        ChunkStore(str(tmp_path), n_chunks=5)
+
+
+def test_older_reader_keeps_its_view_while_a_newer_one_appends(tmp_path):
+    live = ChunkStore(str(tmp_path))
+    live.append(["a", "b"])
+    shadow = ChunkStore(str(tmp_path), n_chunks=2)
+    shadow.append(["c"])
+    assert len(live) == 2 and live[1] == "b"
+    assert len(shadow) == 3 and shadow[2] == "c"
+
+
+def test_create_discards_the_previous_store(tmp_path):
+    ChunkStore(str(tmp_path)).append(["old"])
+    store = ChunkStore.create(str(tmp_path))
+    assert len(store) == 0
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("torch")
+
+import doc_chunker
+from doc_chunker import chunk_segments, iter_file_chunks, make_chunk_pool
+from fakes import FakeTokenizer
+
+TOKENIZER = FakeTokenizer()
+
+
+def words(text):
+    return text.split()
+
+
+def test_windows_overlap_and_cover_every_token():
+    text = " ".join(f"w{i}" for i in range(25))
+    chunks = list(chunk_segments([text], TOKENIZER, size=10, overlap=3))
+
+    assert chunks[0] == " ".join(f"w{i}" for i in range(10))
+    assert words(chunks[1])[:3] == words(chunks[0])[-3:]
+    assert all(len(words(c)) <= 10 for c in chunks)
+    assert words(chunks[-1])[-1] == "w24"
+
+
+def test_chunks_span_segment_boundaries_with_original_text():
+    pages = ["Muster at station B.", "Lower the lifeboat, then release."]
+    chunks = list(chunk_segments(pages, TOKENIZER, size=6, overlap=0))
+    assert chunks[0] == "Muster at station B.\nLower"
+    assert "".join(chunks).replace("\n", " ").count("lifeboat") == 1
+
+
+def test_no_tail_chunk_when_the_last_window_covered_everything():
+    text = " ".join(f"w{i}" for i in range(10))
+    assert list(chunk_segments([text], TOKENIZER, size=10, overlap=2)) == [text]
+
+
+def test_small_files_chunk_inline_in_file_order(tmp_path):
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_text(" ".join(["anchor"] * 30))
+    second.write_text("Short note.")
+    with ThreadPoolExecutor(2) as pool:
+        results = list(iter_file_chunks([str(first), str(second)], TOKENIZER, pool))
+
+    assert [(path, last) for path, _, last in results] == [(str(first), True), (str(second), True)]
+    assert results[1][1] == ["Short note."]
+    assert sum(len(words(c)) for c in results[0][1]) >= 30
+
+
+def test_large_batches_fan_out_over_the_given_pool_in_file_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(doc_chunker, "PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(doc_chunker, "_tokenizer", TOKENIZER)  # what _init_worker sets in a real worker
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(f"doc{i} " * 20)
+        paths.append(str(path))
+
+    with ThreadPoolExecutor(2) as pool:
+        results = list(iter_file_chunks(paths, None, pool, workers=2))
+    assert [path for path, _, _ in results] == paths
+    assert all(chunks[0].startswith(f"doc{i} ") for i, (_, chunks, _) in enumerate(results))
+
+
+def test_chunk_pool_spawns_workers_instead_of_forking():
+    assert make_chunk_pool(workers=1) is None
+    pool = make_chunk_pool(workers=2)
+    try:
+        assert pool._mp_context.get_start_method() == "spawn"
+    finally:
+        pool.shutdown()
@@ -0,0 +1,63 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from embedding_service import EmbeddingService
+from fakes import FakeEmbedder
+
+
+class CountingEmbedder(FakeEmbedder):
+    def __init__(self):
+        super().__init__(dim=16, batch_ms=0, per_text_ms=0)
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        self.calls.append(list(texts))
+        return super().encode(texts, batch_size, **kwargs)
+
+
+def test_concurrent_queries_share_one_encoder_call():
+    embedder = CountingEmbedder()
+
+    async def main():
+        service = EmbeddingService(embedder, window_ms=20)
+        return service, await asyncio.gather(*(service.embed(q) for q in ["mast", "keel", "mast", "hull"]))
+
+    service, vectors = asyncio.run(main())
+    assert embedder.calls == [["mast", "keel", "hull"]]  # duplicates share one slot
+    assert np.array_equal(vectors[0], vectors[2])
+    assert np.allclose(vectors[1], FakeEmbedder(dim=16).encode(["keel"])[0])
+    assert service.stats()["batches"] == 1 and service.stats()["avg_batch_size"] == 3
+
+
+def test_batches_are_capped_and_repeats_come_from_the_cache():
+    embedder = CountingEmbedder()
+
+    async def main():
+        service = EmbeddingService(embedder, window_ms=20, max_batch=2, cache_size=2)
+        await asyncio.gather(*(service.embed(q) for q in ["a", "b", "c"]))
+        await service.embed("c")
+        await service.embed("a")  # evicted by the LRU bound
+        return service
+
+    service = asyncio.run(main())
+    assert [len(call) for call in embedder.calls] == [2, 1, 1]
+    assert service.hits == 1 and service.stats()["cache_entries"] == 2
+
+
+def test_encoder_failure_reaches_every_waiter():
+    class Broken(CountingEmbedder):
+        def encode(self, texts, batch_size=32, **kwargs):
+            raise RuntimeError("CUDA out of memory")
+
+    async def main():
+        service = EmbeddingService(Broken(), window_ms=5)
+        results = await asyncio.gather(service.embed("a"), service.embed("b"), return_exceptions=True)
+        return service, results
+
+    service, results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert service.stats()["cache_entries"] == 0
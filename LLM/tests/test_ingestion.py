@@ -0,0 +1,71 @@
+import asyncio
+import io
+
+import pytest
+
+pytest.importorskip("torch")
+
+import ingestion
+import rag_engine
+from fakes import FakeEmbedder
+from ingestion import IngestionPipeline
+
+
+@pytest.fixture
+def rag_dir(tmp_path, monkeypatch):
+    """An empty RAG folder and cache (the paths are relative to the working directory)."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rag_engine.embedder, "loader", lambda: FakeEmbedder(batch_ms=0, per_text_ms=0))
+    rag_engine.embedder.get()
+    (tmp_path / rag_engine.DOCS_PATH).mkdir()
+    (tmp_path / rag_engine.DOCS_PATH / "manual.txt").write_text(
+        "Lifeboat launching starts with the general alarm.\n\nMuster at the lifeboat station.")
+    return tmp_path
+
+
+async def wait_for(pipeline, job_id):
+    while pipeline.status(job_id)["status"] not in ("done", "failed"):
+        await asyncio.sleep(0.01)
+    return pipeline.status(job_id)
+
+
+def test_upload_is_indexed_and_swapped_in(rag_dir):
+    async def run():
+        index, docs = await rag_engine.load_rag_index()
+        pipeline = IngestionPipeline(index, docs).start()
+        before = pipeline.snapshot
+
+        name = pipeline.save_upload("fire.txt", io.BytesIO(b"Fire drill: raise the alarm and close the dampers."))
+        job = await wait_for(pipeline, pipeline.enqueue(name))
+        await pipeline.stop()
+        return before, pipeline.snapshot, job
+
+    before, after, job = asyncio.run(run())
+    assert job["status"] == "done" and job["error"] is None
+    assert after.version == before.version + 1
+    assert after.index.ntotal > before.index.ntotal
+    assert before.index.ntotal == len(before.docs)  # the old snapshot is untouched
+    assert any("Fire drill" in after.docs[i] for i in range(len(after.docs)))
+
+
+def test_unsupported_upload_is_rejected(rag_dir):
+    pipeline = IngestionPipeline(None, None)
+    with pytest.raises(ValueError):
+        pipeline.save_upload("notes.docx", io.BytesIO(b""))
+
+
+def test_finished_jobs_are_pruned(rag_dir, monkeypatch):
+    monkeypatch.setattr(ingestion, "INGEST_JOB_HISTORY", 2)
+
+    async def run():
+        index, docs = await rag_engine.load_rag_index()
+        pipeline = IngestionPipeline(index, docs).start()
+        for i in range(4):
+            name = pipeline.save_upload(f"note{i}.txt", io.BytesIO(f"Note {i} about the deck.".encode()))
+            job_id = pipeline.enqueue(name)
+            await wait_for(pipeline, job_id)
+            await asyncio.sleep(0)  # let the worker prune after the batch
+        return pipeline.jobs
+
+    jobs = asyncio.run(run())
+    assert list(jobs) == [3, 4]
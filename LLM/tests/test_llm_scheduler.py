@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("llama_cpp")
+
+from fakes import FakeLlama
+from llm_scheduler import LLMScheduler, QueueFullError
+
+MESSAGES = [{"role": "user", "content": "How do I launch the lifeboat?"}]
+
+
+def run(test):
+    """Runs test(scheduler-factory) on a fresh event loop, stopping every scheduler it made."""
+    async def main():
+        made = []
+
+        async def make(pool=1, **kwargs):
+            llama = kwargs.pop("llama", {})
+            scheduler = LLMScheduler([FakeLlama(**llama) for _ in range(pool)], **kwargs)
+            made.append(scheduler)
+            return await scheduler.start()
+
+        try:
+            return await test(make)
+        finally:
+            for scheduler in made:
+                await scheduler.stop()
+
+    return asyncio.run(main())
+
+
+async def collect(job):
+    return "".join([text async for text in job.stream()])
+
+
+def test_generation_streams_the_whole_reply():
+    async def test(make):
+        scheduler = await make(llama={"tokens_per_s": 2000, "reply_tokens": 12})
+        job = scheduler.submit("a", MESSAGES)
+        return await collect(job), job, scheduler.stats()
+
+    reply, job, stats = run(test)
+    assert len(reply.split()) == 12 and job.completion_tokens == 12
+    assert stats["served"] == 1 and stats["queue_depth"] == 0
+
+
+def test_full_queue_and_session_limit_are_rejected():
+    async def test(make):
+        scheduler = await make(max_queue=3, max_per_session=2, llama={"tokens_per_s": 20})
+        scheduler.submit("a", MESSAGES)
+        await asyncio.sleep(0.05)  # let the first job take the only model
+        scheduler.submit("a", MESSAGES)
+        scheduler.submit("a", MESSAGES)
+        with pytest.raises(QueueFullError) as session_limit:
+            scheduler.submit("a", MESSAGES)
+        scheduler.submit("b", MESSAGES)
+        with pytest.raises(QueueFullError) as queue_full:
+            scheduler.submit("c", MESSAGES)
+        return session_limit.value, queue_full.value, scheduler.stats()
+
+    session_limit, queue_full, stats = run(test)
+    assert "session" in str(session_limit)
+    assert "busy" in str(queue_full) and queue_full.retry_after >= 1
+    assert stats["rejected"] == 2 and stats["queue_depth"] == 3
+
+
+def test_sessions_are_served_round_robin():
+    async def test(make):
+        scheduler = await make(llama={"tokens_per_s": 2000, "reply_tokens": 3})
+        jobs = {name: scheduler.submit(session, MESSAGES)
+                for name, session in [("a1", "a"), ("a2", "a"), ("b1", "b")]}
+        await asyncio.gather(*(collect(job) for job in jobs.values()))
+        return sorted(jobs, key=lambda name: jobs[name].started_at)
+
+    assert run(test) == ["a1", "b1", "a2"]
+
+
+def test_cancelling_a_queued_job_ends_its_stream():
+    async def test(make):
+        scheduler = await make(llama={"tokens_per_s": 50, "reply_tokens": 5})
+        running = scheduler.submit("a", MESSAGES)
+        queued = scheduler.submit("b", MESSAGES)
+        await asyncio.sleep(0.02)
+        scheduler.cancel(queued)
+        depth = scheduler.stats()["queue_depth"]
+        return await collect(queued), depth, await collect(running), queued
+
+    reply, depth, other, queued = run(test)
+    assert reply == "" and depth == 0 and queued.started_at is None
+    assert other  # the running job is unaffected
+
+
+def test_cancelling_a_running_job_stops_decoding():
+    async def test(make):
+        scheduler = await make(llama={"tokens_per_s": 100, "reply_tokens": 200})
+        job = scheduler.submit("a", MESSAGES)
+        async for _ in job.stream():
+            scheduler.cancel(job)
+        await asyncio.sleep(0.05)
+        return job, scheduler.stats()
+
+    job, stats = run(test)
+    assert job.finished and job.completion_tokens < 20
+    assert stats["active"] == 0
@@ -0,0 +1,47 @@
+import pytest
+
+from metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    registry = MetricsRegistry()
+    seconds = registry.histogram("stage_seconds", "Stage time.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        seconds.observe(value, stage="search")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP stage_seconds Stage time.", "# TYPE stage_seconds histogram"]
+    assert 'stage_seconds_bucket{stage="search",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="search",le="1.0"} 3' in lines
+    assert 'stage_seconds_bucket{stage="search",le="+Inf"} 4' in lines
+    assert 'stage_seconds_sum{stage="search"} 4.25' in lines
+    assert 'stage_seconds_count{stage="search"} 4' in lines
+
+
+def test_counters_escape_labels_and_reject_wrong_ones():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests.", ["path"])
+    requests.inc(path='/chat "quoted"\n')
+    requests.inc(2, path='/chat "quoted"\n')
+    assert 'requests_total{path="/chat \\"quoted\\"\\n"} 3' in registry.render()
+    with pytest.raises(ValueError):
+        requests.inc(route="/chat")
+
+
+def test_registering_twice_returns_the_same_metric():
+    registry = MetricsRegistry()
+    assert registry.gauge("queue_depth", "Depth.") is registry.gauge("queue_depth", "Depth.")
+
+
+def test_callback_metrics_skip_missing_values_and_failing_sources():
+    registry = MetricsRegistry()
+    registry.callback("index_vectors", "Vectors.", "gauge", lambda: [({"index": "rag"}, 42), ({"index": "x"}, None)],
+                      ["index"])
+
+    def not_loaded():
+        raise RuntimeError("model still loading")
+
+    registry.callback("llm_tokens", "Tokens.", "counter", not_loaded)
+    text = registry.render()
+    assert 'index_vectors{index="rag"} 42' in text and 'index="x"' not in text
+    assert "# TYPE llm_tokens counter" in text
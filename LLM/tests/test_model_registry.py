@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+from model_registry import LazyModel, ModelRegistry, ModelUnavailableError
+
+
+def test_sync_get_loads_once_and_proxies_attributes():
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return "whisper-small"
+
+    handle = LazyModel("whisper", loader)
+    assert handle.status()["state"] == "not_loaded"
+    assert handle.upper() == "WHISPER-SMALL"  # attribute access loads the model
+    assert handle.get() == "whisper-small"
+    assert loads == [1] and handle.ready
+
+
+def test_concurrent_async_callers_share_one_load():
+    loads = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return object()
+
+    async def main():
+        handle = LazyModel("llm", loader)
+        return await asyncio.gather(*(handle.aget() for _ in range(5)))
+
+    models = asyncio.run(main())
+    assert loads == [1] and all(m is models[0] for m in models)
+
+
+def test_failed_load_is_reported_and_retried():
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("model file missing")
+        return "blip"
+
+    async def main():
+        handle = LazyModel("blip", loader)
+        with pytest.raises(ModelUnavailableError) as failed:
+            await handle.aget()
+        assert failed.value.retry_after == 30
+        assert handle.status() == {"state": "failed", "load_seconds": None, "error": "model file missing"}
+        return await handle.aget()
+
+    assert asyncio.run(main()) == "blip"
+
+
+def test_slow_load_times_out_without_cancelling_it():
+    async def loader():
+        await asyncio.sleep(0.1)
+        return "rag"
+
+    async def main():
+        handle = LazyModel("rag", loader)
+        with pytest.raises(ModelUnavailableError):
+            await handle.aget(timeout=0.01)
+        assert handle.state == "loading"
+        return await handle.aget()
+
+    assert asyncio.run(main()) == "rag"
+
+
+def test_warm_loads_the_listed_models_and_skips_unknown_ones():
+    registry = ModelRegistry()
+    registry.register("embedder", lambda: "minilm")
+    registry.register("llm", lambda: "gemma")
+
+    async def main():
+        await registry.warm("embedder, ghost")
+        return registry.is_ready(["embedder"]), registry.is_ready(["embedder", "llm"])
+
+    assert asyncio.run(main()) == (True, False)
+    assert registry.status()["llm"]["state"] == "not_loaded"
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("llama_cpp")
+
+from fakes import FakeLlama
+from prompt_builder import DROP_BLOCK_TURNS, PromptBuilder, TokenCounter
+
+
+def history(n_turns, words=40):
+    turns = []
+    for i in range(n_turns):
+        turns.append({"role": "user", "content": f"question {i} " + "rope " * words})
+        turns.append({"role": "assistant", "content": f"answer {i} " + "knot " * words})
+    return turns
+
+
+def test_short_conversation_goes_in_whole():
+    builder = PromptBuilder(FakeLlama(n_ctx=4096))
+    messages, user_prompt, usage = builder.build(history(3), "How do I tie a bowline?", ["Bowline: loop, rabbit, tree."])
+
+    assert usage["dropped_turns"] == 0 and usage["history_turns"] == 3
+    assert usage["context_chunks"] == "1/1"
+    assert messages[0]["role"] == "system" and len(messages) == 1 + 6 + 1
+    assert "Bowline: loop, rabbit, tree." in user_prompt and messages[-1]["content"] == user_prompt
+    assert usage["total"] <= usage["budget"]
+
+
+def test_long_history_is_cut_on_a_block_boundary_and_summarized():
+    builder = PromptBuilder(FakeLlama(n_ctx=2048), reply_reserve=512)
+    messages, user_prompt, usage = builder.build(history(30), "What's next?")
+
+    assert 0 < usage["dropped_turns"] < 30
+    assert usage["dropped_turns"] % DROP_BLOCK_TURNS == 0
+    assert usage["history_turns"] == 30 - usage["dropped_turns"]
+    assert usage["total"] <= usage["budget"]
+    # The first kept turn follows the system prompt; the summary rides on the last message only
+    assert messages[1]["content"].startswith(f"question {usage['dropped_turns']} ")
+    # Summaries cover the most recent of the dropped turns
+    first_summarized = max(0, usage["dropped_turns"] - 8)
+    assert messages[-1]["content"].startswith(f"(Earlier in this conversation the user asked about: question {first_summarized} ")
+    assert user_prompt == "What's next?"
+
+
+def test_latest_turn_is_kept_even_when_snapping_would_drop_it():
+    # Room for one turn out of three: the block boundary (turn 4) would drop them all
+    builder = PromptBuilder(FakeLlama(n_ctx=1170), reply_reserve=512)
+    messages, _, usage = builder.build(history(3), "And then?")
+    assert (usage["dropped_turns"], usage["history_turns"]) == (2, 1)
+    assert messages[1]["content"].startswith("question 2 ")
+
+
+def test_context_chunks_stop_at_their_share_in_relevance_order():
+    builder = PromptBuilder(FakeLlama(n_ctx=2048), reply_reserve=512, context_share=0.1)
+    chunks = [f"chunk {i} " + "hull " * 30 for i in range(10)]
+    _, user_prompt, usage = builder.build([], "Hull check?", chunks)
+
+    kept = int(usage["context_chunks"].split("/")[0])
+    assert 0 < kept < 10 and usage["context_chunks"].endswith("/10")
+    assert usage["context"] <= int(builder.budget * 0.1)
+    assert "chunk 0 " in user_prompt and f"chunk {kept} " not in user_prompt
+
+
+def test_token_counter_memoizes_and_evicts():
+    count = TokenCounter(FakeLlama(), max_entries=2)
+    assert count("abcdefgh") == 2
+    count("abcdefgh")
+    assert (count.hits, count.misses) == (1, 1)
+    count("x"), count("y")
+    count("abcdefgh")
+    assert count.misses == 4
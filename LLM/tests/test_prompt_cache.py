@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("llama_cpp")
+
+import numpy as np
+
+from prompt_cache import SessionPromptCache
+
+VOCAB = 1000
+
+
+def state(n_tokens, kv_bytes=100):
+    """A LlamaState as saved by a model with logits_all (speculative draft loaded)."""
+    scores = np.tile(np.arange(n_tokens, dtype=np.single)[:, None], (1, VOCAB))
+    return SimpleNamespace(scores=scores, n_tokens=n_tokens, llama_state_size=kv_bytes)
+
+
+def test_states_are_stored_with_only_the_last_logits_row():
+    cache = SessionPromptCache(capacity_bytes=10 * (100 + 4 * VOCAB))
+    cache[(1, 2, 3)] = state(3)
+    stored = cache.cache_state[(1, 2, 3)]
+    assert stored.scores.shape == (1, VOCAB)
+    assert stored.scores[0, 0] == 2  # the last position's logits
+    assert cache.cache_size == 100 + 4 * VOCAB
+
+
+def test_session_entries_survive_next_to_the_pinned_system_prompt():
+    cache = SessionPromptCache(capacity_bytes=3 * (100 + 4 * VOCAB))
+    cache.pin((1,), state(1))
+    cache[(1, 2, 3)] = state(3)
+    cache[(1, 5, 6, 7)] = state(4)
+    assert set(cache.cache_state) == {(1,), (1, 2, 3), (1, 5, 6, 7)}
+
+
+def test_longer_snapshot_replaces_its_prefix_and_eviction_spares_the_pin():
+    cache = SessionPromptCache(capacity_bytes=2 * (100 + 4 * VOCAB))
+    cache.pin((1,), state(1))
+    cache[(1, 2)] = state(2)
+    cache[(1, 2, 3)] = state(3)  # supersedes (1, 2)
+    assert set(cache.cache_state) == {(1,), (1, 2, 3)}
+    cache[(1, 9)] = state(2)  # over capacity: the oldest session entry goes
+    assert set(cache.cache_state) == {(1,), (1, 9)}
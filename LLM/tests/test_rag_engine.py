@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+pytest.importorskip("torch")
+
+import rag_engine
+from fakes import FakeEmbedder
+
+
+@pytest.fixture
+def rag_dir(tmp_path, monkeypatch):
+    """A RAG folder with two documents and an empty cache, relative to the working directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rag_engine.embedder, "loader", lambda: FakeEmbedder(batch_ms=0, per_text_ms=0))
+    rag_engine.embedder.get()
+    docs = tmp_path / rag_engine.DOCS_PATH
+    docs.mkdir()
+    (docs / "lifeboat.txt").write_text("Lifeboat launching starts with the general alarm.")
+    (docs / "fire.txt").write_text("Fire drill: close the dampers and muster on deck.")
+    return docs
+
+
+def load():
+    return asyncio.run(rag_engine.load_rag_index())
+
+
+def manifest():
+    return rag_engine.load_rag_manifest()
+
+
+def texts(docs, entry):
+    start, end = entry["ids"]
+    return [docs[i] for i in range(start, end)]
+
+
+def best_match(text, index, docs):
+    query = FakeEmbedder().encode([text])[0]
+    context, distances = rag_engine.search_context(query, index, docs, k=1)
+    return context[0], float(distances[0])
+
+
+def test_manifest_round_trips_and_a_reload_changes_nothing(rag_dir):
+    index, docs = load()
+    saved = manifest()
+    assert saved["version"] == rag_engine.MANIFEST_VERSION
+    assert set(saved["files"]) == {"fire.txt", "lifeboat.txt"}
+    entry = saved["files"]["fire.txt"]
+    assert entry["size"] == os.path.getsize(rag_dir / "fire.txt") and len(entry["sha256"]) == 64
+    assert texts(docs, entry) == ["Fire drill: close the dampers and muster on deck."]
+    assert index.ntotal == saved["next_id"] == 2
+
+    # Same files: nothing to index or drop, and the manifest is left as it was
+    assert rag_engine._diff_folder(str(rag_dir), manifest()) == ({}, [], False)
+    index, docs = load()
+    assert manifest() == saved and index.ntotal == 2
+
+
+def test_edited_file_replaces_its_chunks(rag_dir):
+    load()
+    old_ids = manifest()["files"]["fire.txt"]["ids"]
+    (rag_dir / "fire.txt").write_text("Fire drill, revised: sound the alarm, then fight the fire with foam.")
+
+    index, docs = load()
+    entry = manifest()["files"]["fire.txt"]
+    assert entry["ids"][0] >= old_ids[1]  # new IDs; the old range is gone from the index
+    assert texts(docs, entry) == ["Fire drill, revised: sound the alarm, then fight the fire with foam."]
+    assert index.ntotal == 2
+    text, distance = best_match("Fire drill, revised: sound the alarm, then fight the fire with foam.", index, docs)
+    assert "revised" in text and distance < 1e-4
+    _, distance = best_match("Fire drill: close the dampers and muster on deck.", index, docs)
+    assert distance > 1e-4
+
+
+def test_deleted_file_drops_its_id_range(rag_dir):
+    load()
+    (rag_dir / "lifeboat.txt").unlink()
+
+    index, docs = load()
+    assert set(manifest()["files"]) == {"fire.txt"}
+    assert index.ntotal == 1
+    assert "Fire drill" in best_match("Lifeboat launching starts with the general alarm.", index, docs)[0]
+
+
+def test_touched_but_unchanged_file_is_not_reindexed(rag_dir, monkeypatch):
+    load()
+    before = manifest()
+    path = rag_dir / "lifeboat.txt"
+    os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 60))
+
+    to_index, to_drop, touched = rag_engine._diff_folder(str(rag_dir), manifest())
+    assert (to_index, to_drop, touched) == ({}, [], True)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("an unchanged file was re-embedded")
+
+    monkeypatch.setattr(rag_engine, "_index_files", fail)
+    index, _ = load()
+    after = manifest()
+    # Only the stat fields moved, and they were saved so the next start skips hashing
+    assert after["files"]["lifeboat.txt"]["mtime"] == path.stat().st_mtime
+    assert after["files"]["lifeboat.txt"]["ids"] == before["files"]["lifeboat.txt"]["ids"]
+    assert after["next_id"] == before["next_id"] and index.ntotal == 2
+
+
+def test_older_manifest_format_forces_a_rebuild(rag_dir):
+    load()
+    manifest_path = os.path.join(rag_engine.CACHE_PATH, "manifest.json")
+    with open(manifest_path) as f:
+        old = json.load(f)
+    old["version"] = rag_engine.MANIFEST_VERSION - 1
+    with open(manifest_path, "w") as f:
+        json.dump(old, f)
+
+    index, docs = load()
+    assert manifest()["version"] == rag_engine.MANIFEST_VERSION
+    assert index.ntotal == len(docs) == 2
+    assert sorted(docs[i] for i in range(len(docs))) == [
+        "Fire drill: close the dampers and muster on deck.",
+        "Lifeboat launching starts with the general alarm.",
+    ]
@@ -0,0 +1,37 @@
+import resources
+from resources import ResourcePlan
+
+
+def plan_for(n_cores, smt=2, gpu=False):
+    cores = [[c * smt + i for i in range(smt)] for c in range(n_cores)]
+    return ResourcePlan(cpus=[cpu for core in cores for cpu in core], cores=cores, gpu=gpu)
+
+
+def test_auto_splits_physical_cores_without_overlap():
+    plan = plan_for(8)
+    assert plan.threads == {"llm": 4, "whisper": 2, "torch": 2, "faiss": 1}
+    llm, whisper, torch = (set(plan.core_sets[p]) for p in ("llm", "whisper", "torch"))
+    assert len(llm) == 8 and not (llm & whisper or llm & torch or whisper & torch)
+    assert plan.core_sets["faiss"] == plan.core_sets["torch"]
+    assert plan.llm_threads(pool_size=2) == 2 and plan.whisper_threads(workers=4) == 1
+
+
+def test_small_machines_share_every_core():
+    plan = plan_for(2)
+    assert plan.threads["llm"] == plan.threads["whisper"] == plan.threads["torch"] == 2
+    assert all(cpus == [0, 1, 2, 3] for cpus in plan.core_sets.values())
+
+
+def test_explicit_budgets_past_the_core_count_share_the_last_core(monkeypatch):
+    monkeypatch.setattr(resources, "THREADS_LLM", "4")
+    monkeypatch.setattr(resources, "THREADS_WHISPER", "4")
+    plan = plan_for(4, smt=1)
+    assert plan.threads["llm"] == plan.threads["whisper"] == 4
+    assert plan.core_sets["llm"] == [0, 1, 2, 3] and plan.core_sets["whisper"] == [3]
+
+
+def test_gpu_layers_follow_offload_support(monkeypatch):
+    assert plan_for(4, gpu=True).gpu_layers == resources.LLM_GPU_LAYERS_DEFAULT
+    assert plan_for(4, gpu=False).gpu_layers == 0
+    monkeypatch.setattr(resources, "LLM_GPU_LAYERS", "99")
+    assert plan_for(4, gpu=False).gpu_layers == 99
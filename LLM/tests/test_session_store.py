@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+import session_store
+from session_store import SessionStore
+
+
+def turn(text):
+    return {"role": "user", "content": text}, {"role": "assistant", "content": f"re: {text}"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(session_store.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions" / "sessions.db")
+
+
+def test_history_is_written_through_and_survives_a_restart(db_path):
+    store = SessionStore(db_path)
+    store.append("a", *turn("hello"))
+    store.append("a", *turn("lifeboat?"))
+    store.close()
+
+    reopened = SessionStore(db_path)
+    history = reopened.get("a")
+    assert [m["content"] for m in history] == ["hello", "re: hello", "lifeboat?", "re: lifeboat?"]
+    assert reopened.get("unknown") == []
+
+
+def test_get_returns_a_copy(db_path):
+    store = SessionStore(db_path)
+    store.append("a", *turn("hello"))
+    store.get("a").append({"role": "user", "content": "not saved"})
+    assert len(store.get("a")) == 2
+
+
+def test_least_recently_used_sessions_leave_memory_but_reload(db_path):
+    store = SessionStore(db_path, max_sessions=2)
+    for session_id in ("a", "b", "c"):
+        store.append(session_id, *turn(session_id))
+    assert store.stats()["in_memory"] == 2 and store.stats()["on_disk"] == 3
+    assert store.get("a")[0]["content"] == "a"  # reloaded from SQLite
+
+
+def test_byte_budget_keeps_at_least_the_latest_session(db_path):
+    store = SessionStore(db_path, max_bytes=10)
+    store.append("a", *turn("x" * 100))
+    store.append("b", *turn("y" * 100))
+    assert store.stats()["in_memory"] == 1
+    assert store.get("b")[0]["content"] == "y" * 100
+
+
+def test_idle_sessions_expire(db_path, clock):
+    store = SessionStore(db_path, ttl_seconds=3600)
+    store.append("a", *turn("hello"))
+    store.append("b", *turn("hello"))
+    clock[0] += 1800
+    store.append("b", *turn("still here"))
+    clock[0] += 2400
+    assert store.get("a") == []  # idle for 70 minutes
+    assert len(store.get("b")) == 4
+    assert store.stats()["on_disk"] == 1
+
+
+def test_reset_forgets_a_session(db_path):
+    store = SessionStore(db_path)
+    store.append("a", *turn("hello"))
+    store.reset("a")
+    assert store.get("a") == [] and store.stats()["on_disk"] == 0
+
+
+class RecordingConnection:
+    """Wraps the store's SQLite connection, noting which thread commits and how many rows each commit carries."""
+
+    def __init__(self, db):
+        self.db = db
+        self.commits = []
+        self.rows = 0
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        if sql.startswith("INSERT INTO messages"):
+            self.rows += len(rows)
+        return self.db.executemany(sql, rows)
+
+    def commit(self):
+        self.commits.append((threading.current_thread().name, self.rows))
+        self.rows = 0
+        self.db.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def wait_for_commits(db, n):
+    deadline = time.monotonic() + 5
+    while len(db.commits) < n and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return db.commits
+
+
+def test_appends_commit_on_the_writer_thread_in_batches(db_path):
+    store = SessionStore(db_path)
+    db = store._db = RecordingConnection(store._db)
+
+    store.append("a", *turn("zero"))
+    assert wait_for_commits(db, 1) == [("session-writer", 2)]
+
+    with store._db_lock:  # the writer is busy, so these three turns queue up
+        for text in ("one", "two", "three"):
+            store.append("a", *turn(text))
+        assert len(db.commits) == 1 and len(store.get("a")) == 8  # memory is already up to date
+    assert wait_for_commits(db, 2)[1] == ("session-writer", 6)
+
+    store.close()
+    assert [m["content"] for m in SessionStore(db_path).get("a")][::2] == ["zero", "one", "two", "three"]
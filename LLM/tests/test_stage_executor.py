@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from stage_executor import StageExecutor, StageTimings
+
+
+def test_stages_run_in_their_own_named_pools_and_are_timed():
+    seen = {}
+
+    def work(stage):
+        seen[stage] = threading.current_thread().name
+        time.sleep(0.01)
+        return stage
+
+    async def main():
+        executor = StageExecutor({"search": 1})
+        timings = StageTimings()
+        try:
+            results = await asyncio.gather(*(executor.run(s, work, s, timings=timings) for s in ("search", "caption")))
+        finally:
+            executor.shutdown()
+        return results, timings
+
+    results, timings = asyncio.run(main())
+    assert results == ["search", "caption"]
+    assert seen["search"].startswith("stage-search") and seen["caption"].startswith("stage-caption")
+    assert set(timings.stages) == {"search", "caption"} and timings.stages["search"] >= 0.01
+    parts = [part.split(";")[0] for part in timings.header().split(", ")]
+    assert sorted(parts[:-1]) == ["caption", "search"] and parts[-1] == "total"
+
+
+def test_a_busy_stage_does_not_block_another():
+    release = threading.Event()
+
+    async def main():
+        executor = StageExecutor({"caption": 1, "search": 1})
+        try:
+            slow = asyncio.ensure_future(executor.run("caption", release.wait, 5))
+            started = time.perf_counter()
+            await executor.run("search", lambda: None)
+            waited = time.perf_counter() - started
+            release.set()
+            await slow
+        finally:
+            executor.shutdown()
+        return waited
+
+    assert asyncio.run(main()) < 1.0
+
+
+def test_timing_is_recorded_when_the_stage_fails():
+    def broken():
+        raise OSError("index missing")
+
+    async def main():
+        executor = StageExecutor()
+        timings = StageTimings()
+        try:
+            with pytest.raises(OSError):
+                await executor.run("search", broken, timings=timings)
+        finally:
+            executor.shutdown()
+        return timings
+
+    assert "search" in asyncio.run(main()).stages
@@ -0,0 +1,74 @@
+import faiss
+import numpy as np
+import pytest
+
+import vector_index
+
+D = 32
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    # Clustered like real embeddings; IVF recall on uniform noise says little
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((40, D)) * 3
+    vectors = centers[rng.integers(0, 40, 2000)] + rng.standard_normal((2000, D))
+    queries = centers[rng.integers(0, 40, 20)] + rng.standard_normal((20, D))
+    return vectors.astype("float32"), queries.astype("float32")
+
+
+def exact_ids(vectors, queries, k):
+    distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def test_auto_type_follows_corpus_size():
+    assert vector_index.choose_index_type(100, "auto") == "flat"
+    assert vector_index.choose_index_type(50_000, "auto") == "ivf"
+    assert vector_index.choose_index_type(1_000_000, "auto") == "ivfpq"
+    assert vector_index.effective_type("sq8", 100) == "flat"
+    assert vector_index.effective_type("ivfpq", 500) == "ivf"
+
+
+@pytest.mark.parametrize("kind", vector_index.INDEX_TYPES)
+def test_built_index_reports_its_type_and_ids(corpus, kind):
+    vectors, queries = corpus
+    ids = np.arange(1000, 1000 + len(vectors), dtype="int64")
+    index = vector_index.build_index(kind, vectors, ids)
+    assert vector_index.index_type(index) == kind
+    _, found = index.search(queries[:1], 5)
+    assert ((found >= 1000) & (found < 1000 + len(vectors))).all()
+
+
+@pytest.mark.parametrize("kind", vector_index.COMPRESSED_TYPES)
+def test_rescored_search_returns_exact_distances(corpus, kind):
+    vectors, queries = corpus
+    index = vector_index.build_index(kind, vectors, np.arange(len(vectors), dtype="int64"))
+    results = [vector_index.search_rescored(index, vectors, query, 5) for query in queries]
+    ids = np.concatenate([found for _, found in results])
+    distances = np.concatenate([dist for dist, _ in results])
+    truth = exact_ids(vectors, queries, 5)
+    recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ids, truth)])
+    assert recall >= 0.8
+    assert np.allclose(distances, ((queries[:, None, :] - vectors[ids]) ** 2).sum(axis=2), rtol=1e-4)
+
+
+@pytest.mark.parametrize("kind", ["flat", "ivf", "sq8"])
+def test_read_index_mmap_matches_in_ram(tmp_path, corpus, kind):
+    vectors, queries = corpus
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(vector_index.build_index(kind, vectors, np.arange(len(vectors), dtype="int64")), path)
+    mapped = vector_index.read_index(path)
+    in_ram = vector_index.read_index(path, mmap=False)
+    assert mapped.search(queries, 5)[1].tolist() == in_ram.search(queries, 5)[1].tolist()
+
+
+def test_vector_file_truncates_torn_tail(tmp_path, corpus):
+    vectors, _ = corpus
+    path = str(tmp_path / "vectors.f32")
+    vector_index.append_vectors(path, vectors[:10])
+    with open(path, "ab") as f:
+        f.write(b"\0" * 7)  # an interrupted append
+    rows = vector_index.open_vectors(path, D, 10)
+    assert np.array_equal(rows, vectors[:10])
+    assert vector_index.map_vectors(path, D, 4).shape == (4, D)
@@ -0,0 +1,85 @@
+import asyncio
+
+import numpy as np
+
+from voice_stream import (PCMRingBuffer, Segmenter, StreamingTranscriber, EnergyVAD, MAX_SEGMENT_S,
+                          pcm_from_int16)
+
+SR = 16000
+
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * SR)) / SR
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.random.default_rng(0).normal(0, 0.001, int(seconds * SR)).astype(np.float32)
+
+
+def feed_all(segmenter, audio, block=480):
+    events = []
+    for i in range(0, len(audio), block):
+        events += segmenter.feed(audio[i:i + block])
+    return events
+
+
+def segments(events):
+    return [(start, end) for kind, *span in events if kind == "segment" for start, end in [span]]
+
+
+def test_ring_buffer_wraps_and_keeps_absolute_positions():
+    ring = PCMRingBuffer(seconds=1, sample_rate=10)
+    ring.write(np.arange(7, dtype=np.float32))
+    ring.write(np.arange(7, 14, dtype=np.float32))
+    assert ring.start == 4 and ring.end == 14
+    assert ring.read(0, 6).tolist() == [4, 5]  # positions before start are gone
+    assert ring.read(10, 14).tolist() == [10, 11, 12, 13]
+
+
+def test_pause_splits_segments_and_long_silence_ends_utterance():
+    audio = np.concatenate([silence(0.5), tone(1.0), silence(0.5), tone(0.8), silence(1.2)])
+    events = feed_all(Segmenter(PCMRingBuffer(), EnergyVAD()), audio)
+    kinds = [kind for kind, *_ in events]
+    assert kinds == ["speech_start", "segment", "segment", "utterance_end"]
+
+
+def test_long_speech_is_cut_into_contiguous_segments():
+    segmenter = Segmenter(PCMRingBuffer(), EnergyVAD())
+    events = feed_all(segmenter, np.concatenate([silence(0.3), tone(40.0)]))
+    events += segmenter.flush()
+    spans = segments(events)
+    assert len(spans) == 3
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert start == end  # no overlap, no gap
+    assert all(end - start <= MAX_SEGMENT_S * SR + segmenter.frame for start, end in spans)
+
+
+def test_pcm_from_int16_scales_to_unit_range():
+    data = np.array([0, 16384, -16384], dtype="<i2").tobytes()
+    assert pcm_from_int16(data, SR).tolist() == [0.0, 0.5, -0.5]
+
+
+class FakeEngine:
+    def __init__(self):
+        self.calls = 0
+
+    async def transcribe_samples(self, pcm):
+        self.calls += 1
+        return f"part{self.calls}"
+
+
+def test_transcriber_emits_partials_then_joined_transcript():
+    async def run():
+        engine = FakeEngine()
+        transcriber = StreamingTranscriber(engine, vad=EnergyVAD())
+        audio = np.concatenate([silence(0.3), tone(1.0), silence(0.5), tone(1.0)])
+        for i in range(0, len(audio), 480):
+            transcriber.feed(audio[i:i + 480])
+        transcriber.close()  # the client hung up mid-sentence
+        return [event async for event in transcriber.events()], engine.calls
+
+    events, calls = asyncio.run(run())
+    assert [e["type"] for e in events] == ["speech_start", "partial", "partial", "transcript"]
+    assert events[-1]["text"] == "part1 part2"
+    assert calls == 2
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+
+from weather_client import MarineWeatherClient, WeatherAPIError, WeatherUnavailableError
+from weather_store import WeatherStore
+from weather_stub import marine_forecast
+
+
+def client_with(handler, **kwargs):
+    """A client whose HTTP calls go to `handler(request)` instead of the network."""
+    client = MarineWeatherClient(base_url="http://marine.test/v1/marine", **kwargs)
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def forecast_handler(calls):
+    def handler(request):
+        calls.append(request)
+        lat, lon = float(request.url.params["latitude"]), float(request.url.params["longitude"])
+        return httpx.Response(200, json=marine_forecast(lat, lon, hours=48))
+    return handler
+
+
+def offline(request):
+    raise httpx.ConnectError("no route to host")
+
+
+def test_nearby_requests_share_a_cell_and_one_fetch():
+    async def run():
+        calls = []
+        client = client_with(forecast_handler(calls))
+        first = await asyncio.gather(client.fetch(10.01, 20.02), client.fetch(10.04, 19.98))
+        again = await client.fetch(10.0, 20.0)
+        await client.close()
+        return calls, first, again, client.stats()
+
+    calls, first, again, stats = asyncio.run(run())
+    assert len(calls) == 1
+    assert [meta["cache"] for _, meta in first] == ["miss", "miss"]
+    assert again[1]["cache"] == "hit"
+    assert stats["coalesced"] == 1 and stats["hits"] == 1
+
+
+def test_expired_cell_is_served_stale_when_offline():
+    async def run():
+        client = client_with(forecast_handler([]), ttl=0.0)
+        await client.fetch(10.0, 20.0)
+        client._http = httpx.AsyncClient(transport=httpx.MockTransport(offline))
+        data, meta = await client.fetch(10.0, 20.0)
+        return data, meta
+
+    data, meta = asyncio.run(run())
+    assert meta["cache"] == "stale" and data["hourly"]["wave_height"]
+
+
+def test_restart_while_offline_serves_the_stored_forecast(tmp_path):
+    async def run():
+        store = WeatherStore(str(tmp_path))
+        online = client_with(forecast_handler([]), on_fresh=store.append)
+        fresh, _ = await online.fetch(10.0, 20.0)
+
+        # A new process: empty memory cache, same store on disk, no network
+        restarted = client_with(offline, fallback=WeatherStore(str(tmp_path)).latest_response)
+        stale, meta = await restarted.fetch(10.0, 20.0)
+        return fresh, stale, meta
+
+    fresh, stale, meta = asyncio.run(run())
+    assert meta["cache"] == "stale"
+    assert stale["hourly"]["time"] == fresh["hourly"]["time"]
+    assert stale["hourly"]["wave_height"] == fresh["hourly"]["wave_height"]
+
+
+def test_offline_with_nothing_stored_raises():
+    client = client_with(offline, fallback=lambda cell: None)
+    with pytest.raises(WeatherUnavailableError):
+        asyncio.run(client.fetch(10.0, 20.0))
+
+
+def test_api_errors_are_not_masked_by_stale_data():
+    def bad_request(request):
+        return httpx.Response(400, json={"error": True, "reason": "Latitude must be in range"})
+
+    client = client_with(bad_request)
+    with pytest.raises(WeatherAPIError, match="Latitude"):
+        asyncio.run(client.fetch(95.0, 20.0))
+
+
+def test_bad_position_in_a_batch_only_fails_that_position():
+    def handler(request):
+        lats = [float(v) for v in request.url.params["latitude"].split(",")]
+        lons = [float(v) for v in request.url.params["longitude"].split(",")]
+        if any(abs(lat) > 90 for lat in lats):
+            return httpx.Response(400, json={"error": True, "reason": "Latitude must be in range"})
+        forecasts = [marine_forecast(lat, lon, hours=24) for lat, lon in zip(lats, lons)]
+        return httpx.Response(200, json=forecasts if len(forecasts) > 1 else forecasts[0])
+
+    client = client_with(handler)
+    results = asyncio.run(client.fetch_many([(10.0, 20.0), (95.0, 20.0), (11.0, 21.0)]))
+    assert isinstance(results[1], WeatherAPIError)
+    assert [meta["cache"] for _, meta in (results[0], results[2])] == ["miss", "miss"]
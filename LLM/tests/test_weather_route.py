@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+import numpy as np
+
+from weather_client import MarineWeatherClient
+from weather_route import route_forecast, schedule_etas
+
+T0 = 1_700_000_000 - 1_700_000_000 % 3600
+
+
+def linear_forecast(lat, lon, hours=48):
+    """Wave height linear in position and time, so interpolation must reproduce it exactly."""
+    times = [str(np.datetime64(T0 + 3600 * h, "s").astype("datetime64[m]")) for h in range(hours)]
+    return {"utc_offset_seconds": 0, "hourly": {
+        "time": times,
+        "wave_height": [1.0 + 0.5 * lat + 0.25 * lon + 0.01 * h for h in range(hours)],
+        "wind_wave_height": [0.5] * hours,
+        "sea_surface_temperature": [None] * hours,
+    }}
+
+
+def route_client(calls, batch_size=50):
+    def handler(request):
+        lats = [float(v) for v in request.url.params["latitude"].split(",")]
+        lons = [float(v) for v in request.url.params["longitude"].split(",")]
+        calls.append(len(lats))
+        forecasts = [linear_forecast(lat, lon) for lat, lon in zip(lats, lons)]
+        return httpx.Response(200, json=forecasts if len(forecasts) > 1 else forecasts[0])
+
+    client = MarineWeatherClient(base_url="http://marine.test/v1/marine", batch_size=batch_size)
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_values_are_interpolated_in_space_and_time():
+    lats, lons = np.array([10.03, 10.27]), np.array([20.06, 20.11])
+    etas = np.array([T0 + 1800, T0 + 5 * 3600 + 900])
+    forecast = asyncio.run(route_forecast(route_client([]), lats, lons, etas))
+
+    hours = (etas - T0) / 3600
+    expected = 1.0 + 0.5 * lats + 0.25 * lons + 0.01 * hours
+    assert np.allclose(forecast["points"]["wave_height"], expected, atol=1e-4)
+    assert np.isnan(forecast["points"]["sea_surface_temperature"]).all()
+    assert forecast["in_range"].all()
+
+
+def test_long_route_uses_few_batched_requests():
+    calls = []
+    lats = np.linspace(0.0, 19.9, 200)  # 200 waypoints ~0.1° apart: ~400 distinct cells
+    lons = np.linspace(0.0, 5.0, 200)
+    forecast = asyncio.run(route_forecast(route_client(calls), lats, lons, np.full(200, T0 + 3600.0)))
+    assert forecast["cells"] > 200
+    assert len(calls) == -(-forecast["cells"] // 50)
+    assert sum(calls) == forecast["cells"]
+    assert not forecast["missing_cells"]
+
+
+def test_eta_outside_the_forecast_is_flagged():
+    forecast = asyncio.run(route_forecast(route_client([]), [10.0], [20.0], [T0 + 100 * 3600]))
+    assert not forecast["in_range"][0]
+    assert np.isnan(forecast["points"]["wave_height"][0])
+
+
+def test_schedule_etas_at_constant_speed():
+    # One degree of latitude is 60 nautical miles
+    etas = schedule_etas(np.array([0.0, 1.0, 2.0]), np.array([0.0, 0.0, 0.0]), T0, 10.0)
+    assert np.allclose((etas - T0) / 3600, [0.0, 6.0, 12.0], atol=0.01)
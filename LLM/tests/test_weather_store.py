@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+
+from parse_weather import summarize_latest_weather
+from weather_store import WeatherStore, parse_forecast, summarize_forecast, summary_text
+
+T0 = 1_700_000_400 - 1_700_000_400 % 3600  # on the hour
+
+
+def response(waves, start=T0, wind=None, sst=None):
+    """An Open-Meteo marine response with one value per hour from `start`."""
+    times = [str(np.datetime64(start + 3600 * i, "s").astype("datetime64[m]")) for i in range(len(waves))]
+    return {"utc_offset_seconds": 0, "hourly": {
+        "time": times,
+        "wave_height": waves,
+        "wind_wave_height": wind or [0.5] * len(waves),
+        "sea_surface_temperature": sst or [18.0] * len(waves),
+    }}
+
+
+def test_parse_forecast_converts_nulls_and_times():
+    columns = parse_forecast(response([1.0, None, 2.0]))
+    assert columns["time"].tolist() == [T0, T0 + 3600, T0 + 7200]
+    assert np.isnan(columns["wave_height"][1])
+
+
+def test_summary_stats_trend_and_alert():
+    waves = [1.0 + 0.25 * i for i in range(12)]  # 1.0 .. 3.75 m, building
+    stats = summarize_forecast(parse_forecast(response(waves)), T0 + 60, window_hours=12, wave_alert=2.5)
+    assert stats["current"]["wave_height"] == 1.0
+    assert stats["next"]["wave_height"] == {"min": 1.0, "max": 3.75, "mean": 2.38, "trend_per_hour": 0.25}
+    assert stats["wave_alert"]["hours_above"] == 6
+    assert stats["wave_alert"]["peak_m"] == 3.75
+    text = summary_text(stats)
+    assert "building" in text and "⚠️ Waves above 2.5 m" in text
+
+
+def test_window_without_wave_values_skips_range_and_alert():
+    waves = [None] * 30 + [1.5, 1.6]  # only known beyond the 24 h window
+    stats = summarize_forecast(parse_forecast(response(waves)), T0, window_hours=24)
+    assert stats["wave_alert"] is None
+    assert "wave_height" not in stats["next"]
+    text = summary_text(stats)
+    assert "waves range" not in text and "Stay safe" in text
+
+
+def test_no_wave_data_at_all():
+    assert summarize_forecast(parse_forecast(response([None, None])), T0) is None
+    assert summary_text(None) == "⚠️ Weather data is incomplete."
+
+
+def test_store_keeps_history_and_serves_the_newest_forecast(tmp_path):
+    store = WeatherStore(str(tmp_path))
+    cell = (10.0, 20.0)
+    store.append(cell, response([1.0, 1.1, 1.2]), fetched_at=T0)
+    store.append(cell, response([2.0, 2.1, 2.2], start=T0 + 3600), fetched_at=T0 + 3600)
+    store.append((0.0, 0.0), response([0.3, 0.3]), fetched_at=T0 + 3600)
+
+    assert np.allclose(store.forecast(cell)["wave_height"], [2.0, 2.1, 2.2])  # float32 columns
+    times, values = store.history(cell, "wave_height")
+    assert times.tolist() == [T0, T0 + 3600, T0 + 7200, T0 + 10800]
+    assert np.allclose(values, [1.0, 2.0, 2.1, 2.2])  # later fetches win per hour
+
+    reopened = WeatherStore(str(tmp_path))  # the index is rebuilt from the column files
+    assert reopened.rows == 8
+    assert reopened.forecast(cell)["wave_height"].tolist() == store.forecast(cell)["wave_height"].tolist()
+    assert reopened.summary(cell, now=T0 + 3600)["cell"] == list(cell)
+
+
+def test_cli_summary_reads_the_latest_forecast_from_the_store(tmp_path):
+    assert summarize_latest_weather(str(tmp_path)) == "⚠️ Weather data is incomplete."
+
+    hour = int(time.time()) // 3600 * 3600
+    store = WeatherStore(str(tmp_path))
+    store.append((10.0, 20.0), response([1.0, 1.5, 2.0], start=hour))
+    store.append((30.0, 40.0), response([3.0, 3.5, 4.0], start=hour))
+    text = summarize_latest_weather(str(tmp_path))  # a fresh store, as after a restart
+    assert "waves are about 3.0 meters" in text
@@ -0,0 +1,78 @@
+import asyncio
+import io
+import os
+import subprocess
+import wave
+
+import numpy as np
+
+import whisper_transcript
+from whisper_transcript import WHISPER_SAMPLE_RATE, WhisperEngine, decode_wav_bytes, resample
+
+
+def wav_bytes(frames, sample_rate, channels=1, sample_width=2):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(sample_rate)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+
+def test_stereo_is_mixed_down_to_mono():
+    left = np.full(160, 8192, dtype="<i2")
+    right = np.full(160, -16384, dtype="<i2")
+    data = wav_bytes(np.column_stack([left, right]).tobytes(), WHISPER_SAMPLE_RATE, channels=2)
+
+    pcm = decode_wav_bytes(data)
+    assert pcm.dtype == np.float32 and len(pcm) == 160
+    assert np.allclose(pcm, (0.25 - 0.5) / 2)
+
+
+def test_eight_bit_audio_is_unsigned_around_128():
+    data = wav_bytes(bytes([128, 255, 0, 192]), WHISPER_SAMPLE_RATE, sample_width=1)
+    assert np.allclose(decode_wav_bytes(data), [0.0, 127 / 128, -1.0, 0.5])
+
+
+def test_other_rates_are_resampled_linearly_to_16k():
+    t = np.arange(8000) / 8000
+    tone = (0.5 * np.sin(2 * np.pi * 100 * t) * 32767).astype("<i2")
+    pcm = decode_wav_bytes(wav_bytes(tone.tobytes(), 8000))
+
+    assert len(pcm) == WHISPER_SAMPLE_RATE  # one second either way
+    expected = 0.5 * np.sin(2 * np.pi * 100 * np.arange(WHISPER_SAMPLE_RATE) / WHISPER_SAMPLE_RATE)
+    assert np.abs(pcm[:-2] - expected[:-2]).max() < 0.01
+    # Samples that line up with the source come through unchanged
+    assert np.allclose(pcm[::2], tone / 32768.0)
+
+
+def test_resample_passes_16k_through_and_handles_empty_input():
+    pcm = np.linspace(-1, 1, 100, dtype=np.float64)
+    assert resample(pcm, WHISPER_SAMPLE_RATE).dtype == np.float32
+    assert len(resample(np.zeros(0), 44100)) == 0
+    assert len(resample(np.zeros(44100), 44100)) == WHISPER_SAMPLE_RATE
+
+
+def test_cli_fallback_writes_a_16bit_wav_and_returns_stdout(monkeypatch):
+    calls = []
+
+    def fake_run(cmd, capture_output, text, check):
+        audio_path = cmd[cmd.index("-f") + 1]
+        with wave.open(audio_path, "rb") as wav:
+            calls.append((cmd, wav.getnchannels(), wav.getsampwidth(), wav.getframerate(), wav.getnframes()))
+        return subprocess.CompletedProcess(cmd, 0, stdout="  Lower the lifeboat.\n", stderr="")
+
+    monkeypatch.setattr(whisper_transcript.subprocess, "run", fake_run)
+    engine = WhisperEngine("tiny.en", n_threads=3)
+    assert not engine.in_process  # load() was never called, so there are no bindings in use
+    try:
+        text = asyncio.run(engine.transcribe(wav_bytes(np.zeros(8000, dtype="<i2").tobytes(), 8000)))
+    finally:
+        engine.close()
+
+    assert text == "Lower the lifeboat."
+    (cmd, channels, width, rate, frames), = calls
+    assert (channels, width, rate, frames) == (1, 2, WHISPER_SAMPLE_RATE, WHISPER_SAMPLE_RATE)
+    assert cmd[cmd.index("-m") + 1].endswith("ggml-tiny.en.bin") and cmd[cmd.index("-t") + 1] == "3"
+    assert not os.path.exists(cmd[cmd.index("-f") + 1])  # the temp WAV is cleaned up
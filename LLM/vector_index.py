@@ -0,0 +1,315 @@
+import json
+import math
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+# --- Config ---
+# flat | ivf | ivfpq | hnsw | sq8 | binary | auto (pick by corpus size)
+# sq8 keeps 1 byte per dimension (4x smaller), binary 1 bit (32x smaller).
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "auto")
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "80"))
+# Compressed indexes fetch k * factor candidates, then re-score them exactly.
+# Binary codes rank coarsely, so they need a much wider net.
+RESCORE_FACTORS = {"ivfpq": 8, "sq8": 4, "binary": 64}
+if os.getenv("RAG_RESCORE_FACTOR"):
+    RESCORE_FACTORS = dict.fromkeys(RESCORE_FACTORS, int(os.getenv("RAG_RESCORE_FACTOR")))
+
+# Corpus sizes (in chunks) where auto mode switches index type
+AUTO_IVF_MIN = 20_000
+AUTO_IVFPQ_MIN = 500_000
+# Retrain IVF once the corpus outgrows the data it was trained on by this factor
+RETRAIN_GROWTH = 4
+
+INDEX_TYPES = ("flat", "ivf", "ivfpq", "hnsw", "sq8", "binary")
+# Types whose distances are approximate; their hits get exact re-scoring from the raw vectors
+COMPRESSED_TYPES = ("ivfpq", "sq8", "binary")
+# Types that learn ranges/centroids from the data and go stale as the corpus grows
+TRAINED_TYPES = ("ivf", "ivfpq", "sq8", "binary")
+# Types whose codes read_index leaves on disk. IO_FLAG_MMAP_IFC (faiss >= 1.10) maps
+# flat, binary and IVF codes; older builds' IO_FLAG_MMAP only maps IVF inverted lists.
+# sq8 and HNSW storage is read into RAM regardless.
+if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+    MMAP_FLAG, MMAP_TYPES = faiss.IO_FLAG_MMAP_IFC, ("flat", "binary", "ivf", "ivfpq")
+else:
+    MMAP_FLAG, MMAP_TYPES = faiss.IO_FLAG_MMAP, ("ivf", "ivfpq")
+
+
+def choose_index_type(n_vectors, requested=RAG_INDEX_TYPE):
+    """Resolves 'auto' to a concrete index type for a corpus of n_vectors."""
+    if requested != "auto":
+        return requested
+    if n_vectors < AUTO_IVF_MIN:
+        return "flat"
+    if n_vectors < AUTO_IVFPQ_MIN:
+        return "ivf"
+    return "ivfpq"
+
+
+def effective_type(kind, n_vectors):
+    """The type build_index actually produces: tiny corpora can't train IVF/PQ."""
+    if kind == "ivfpq" and n_vectors < 1024:
+        kind = "ivf"  # the 8-bit PQ codebooks need at least 256 training points
+    if kind == "ivf" and n_vectors < 32:
+        kind = "flat"
+    if kind in ("sq8", "binary") and n_vectors < 256:
+        kind = "flat"  # too few points to learn ranges from, and nothing worth compressing
+    return kind
+
+
+def new_flat_index(d):
+    """Empty exact L2 index that stores vectors under explicit chunk IDs."""
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(d))
+
+
+def _nlist_for(n_vectors):
+    return int(min(65536, max(16, 4 * math.sqrt(n_vectors))))
+
+
+def _pq_subquantizers(d):
+    """Largest sub-quantizer count <= d/8 that divides d (8 dims per byte code)."""
+    for m in range(max(1, d // 8), 0, -1):
+        if d % m == 0:
+            return m
+    return 1
+
+
+def build_index(kind, vectors, ids):
+    """Builds (and trains, if needed) an index of the given type over vectors/ids."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    ids = np.ascontiguousarray(ids, dtype="int64")
+    n, d = len(ids), vectors.shape[1]
+    kind = effective_type(kind, n)
+
+    if kind == "flat":
+        index = new_flat_index(d)
+    elif kind in ("ivf", "ivfpq"):
+        nlist = min(_nlist_for(n), n // 2)
+        quantizer = faiss.IndexFlatL2(d)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, _pq_subquantizers(d), 8)
+        # ~64 points per centroid is plenty for k-means
+        sample = vectors[np.random.default_rng(0).choice(n, size=min(n, nlist * 64), replace=False)]
+        index.train(sample)
+    elif kind in ("sq8", "binary"):
+        if kind == "sq8":
+            codes = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        else:
+            # One bit per dimension, thresholded at the trained per-dimension median
+            codes = faiss.IndexLSH(d, d, False, True)
+        index = faiss.IndexIDMap2(codes)
+        index.train(vectors[np.random.default_rng(0).choice(n, size=min(n, 65536), replace=False)])
+    elif kind == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(d, HNSW_M)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index = faiss.IndexIDMap2(hnsw)
+    else:
+        raise ValueError(f"Unknown index type '{kind}'. Expected one of {INDEX_TYPES} or 'auto'.")
+
+    if n:
+        index.add_with_ids(vectors, ids)
+    configure_search(index)
+    return index
+
+
+def index_type(index):
+    """Reports the concrete type of a (possibly ID-wrapped) index."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(inner, faiss.IndexLSH):
+        return "binary"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def configure_search(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    """Applies the nprobe / efSearch knobs, whatever wrapper the index sits in."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+    return index
+
+
+def supports_removal(index):
+    return index_type(index) != "hnsw"
+
+
+def is_compressed(index):
+    return index_type(index) in COMPRESSED_TYPES
+
+
+def search_rescored(index, vectors, query, k, factor=None):
+    """
+    Searches a compressed index for k * factor candidates and re-ranks them by
+    exact squared L2 against the raw vectors, so distances match a flat index.
+    """
+    query = np.asarray(query, dtype="float32").reshape(1, -1)
+    _, found = index.search(query, k * (factor or RESCORE_FACTORS[index_type(index)]))
+    ids = found[0][found[0] != -1]
+    if not len(ids):
+        return np.full((1, k), np.inf, dtype="float32"), np.full((1, k), -1, dtype="int64")
+    order = np.argsort(ids)  # memmap reads in file order
+    exact = np.empty(len(ids), dtype="float32")
+    exact[order] = ((np.asarray(vectors[ids[order]]) - query) ** 2).sum(axis=1)
+    best = np.argsort(exact, kind="stable")[:k]
+    distances = np.full((1, k), np.inf, dtype="float32")
+    indices = np.full((1, k), -1, dtype="int64")
+    distances[0, :len(best)], indices[0, :len(best)] = exact[best], ids[best]
+    return distances, indices
+
+
+def read_index(path, mmap=True):
+    """
+    Loads an index; with mmap, read-only and memory-mapped. Only MMAP_TYPES
+    actually stay on disk, other types are read into RAM either way.
+    """
+    if mmap:
+        try:
+            index = faiss.read_index(path, MMAP_FLAG | faiss.IO_FLAG_READ_ONLY)
+            kind = index_type(index)
+            print(f"Loaded {kind} index ({index.ntotal} vectors) "
+                  f"{'memory-mapped' if kind in MMAP_TYPES else 'into RAM; this type cannot be memory-mapped'}.")
+            return configure_search(index)
+        except RuntimeError as e:
+            print(f"Memory-mapped load not supported for this index ({e}); reading into RAM.")
+    return configure_search(faiss.read_index(path))
+
+
+# --- Raw vector file ---
+#
+# Every embedding is also appended to a float32 file where row i is chunk ID i.
+# That's what lets us retrain or switch index types without re-embedding.
+
+def open_vectors(path, d, n_rows):
+    """Memory-maps the first n_rows of the vector file, truncating any torn tail."""
+    expected = n_rows * d * 4
+    if not os.path.exists(path):
+        open(path, "wb").close()
+    if os.path.getsize(path) != expected:
+        with open(path, "r+b") as f:
+            f.truncate(expected)
+    if n_rows == 0:
+        return np.zeros((0, d), dtype="float32")
+    return np.memmap(path, dtype="float32", mode="r", shape=(n_rows, d))
+
+
+def map_vectors(path, d, n_rows):
+    """Read-only view of the first n_rows, for searching; unlike open_vectors it never truncates."""
+    if n_rows == 0:
+        return np.zeros((0, d), dtype="float32")
+    return np.memmap(path, dtype="float32", mode="r", shape=(n_rows, d))
+
+
+def append_vectors(path, vectors):
+    with open(path, "ab") as f:
+        f.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+
+
+def live_ids(manifest):
+    """All chunk IDs currently owned by files in the manifest."""
+    ranges = [np.arange(*entry["ids"], dtype="int64") for entry in manifest["files"].values()]
+    return np.concatenate(ranges) if ranges else np.zeros(0, dtype="int64")
+
+
+def needs_rebuild(index, manifest, requested=RAG_INDEX_TYPE):
+    """Whether the index should be rebuilt for the current corpus size or state."""
+    info = manifest.get("index", {})
+    n = sum(end - start for start, end in (e["ids"] for e in manifest["files"].values()))
+    if info.get("stale"):
+        return True
+    if effective_type(choose_index_type(n, requested), n) != index_type(index):
+        return True
+    if index_type(index) in TRAINED_TYPES:
+        return n > RETRAIN_GROWTH * max(1, info.get("trained_on", n))
+    return False
+
+
+def rebuild_index(manifest, vectors_path, d, requested=RAG_INDEX_TYPE):
+    """Builds a fresh index of the configured type from the stored vectors."""
+    ids = live_ids(manifest)
+    vectors = open_vectors(vectors_path, d, manifest["next_id"])
+    kind = choose_index_type(len(ids), requested)
+    started = time.perf_counter()
+    index = build_index(kind, vectors[ids] if len(ids) else np.zeros((0, d), "float32"), ids)
+    manifest["index"] = {"type": index_type(index), "trained_on": len(ids)}
+    print(f"Built {manifest['index']['type']} index over {len(ids)} chunks "
+          f"in {time.perf_counter() - started:.1f}s.")
+    return index
+
+
+# --- Recall vs latency report ---
+
+def index_report(vectors, kinds=INDEX_TYPES, n_queries=200, k=10, seed=0):
+    """
+    Builds every index type over `vectors` and measures recall@k against the
+    exact flat baseline, mean query latency and serialized size.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    rng = np.random.default_rng(seed)
+    ids = np.arange(len(vectors), dtype="int64")
+    picks = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    # Perturbed corpus vectors stand in for real queries
+    queries = vectors[picks] + rng.normal(0, 0.01, size=(len(picks), vectors.shape[1])).astype("float32")
+
+    baseline = build_index("flat", vectors, ids)
+    _, truth = baseline.search(queries, k)
+
+    rows = []
+    for kind in kinds:
+        started = time.perf_counter()
+        index = build_index(kind, vectors, ids)
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for q in queries:
+            _, found = index.search(q.reshape(1, -1), k)
+        latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        _, found = index.search(queries, k)
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        size = len(faiss.serialize_index(index))
+        row = {
+            "type": index_type(index),
+            "recall_at_k": round(float(recall), 4),
+            "latency_ms": round(latency_ms, 3),
+            "build_s": round(build_s, 2),
+            "size_mb": round(size / 2**20, 2),
+            "bytes_per_vector": round(size / len(vectors), 1),
+        }
+        if is_compressed(index):
+            # What search_context serves: candidates re-scored from the raw vectors (on disk, paged in)
+            started = time.perf_counter()
+            rescored = [search_rescored(index, vectors, q, k)[1][0] for q in queries]
+            row["rescored_latency_ms"] = round((time.perf_counter() - started) * 1000 / len(queries), 3)
+            row["rescored_recall_at_k"] = round(float(np.mean(
+                [len(set(f) & set(t)) / k for f, t in zip(rescored, truth)])), 4)
+        rows.append(row)
+    return {"vectors": len(vectors), "dim": vectors.shape[1], "k": k, "queries": len(queries), "results": rows}
+
+
+if __name__ == "__main__":
+    # Usage: python vector_index.py [rag_cache]
+    cache_path = sys.argv[1] if len(sys.argv) > 1 else "rag_cache"
+    with open(os.path.join(cache_path, "manifest.json")) as f:
+        manifest = json.load(f)
+    dim = manifest["dim"]
+    stored = open_vectors(os.path.join(cache_path, "vectors.f32"), dim, manifest["next_id"])
+    report = index_report(stored[live_ids(manifest)])
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,268 @@
+import asyncio
+import os
+
+import numpy as np
+
+from whisper_transcript import WHISPER_SAMPLE_RATE, resample
+
+# --- Config ---
+RING_SECONDS = 60
+VAD_BACKEND = os.getenv("VAD_BACKEND", "auto")  # auto | webrtc | energy
+VAD_AGGRESSIVENESS = int(os.getenv("VAD_AGGRESSIVENESS", "2"))  # webrtcvad 0-3
+VAD_FRAME_MS = 30
+VAD_START_MS = 90  # voiced audio this long opens a segment
+VAD_PREROLL_MS = 200  # audio kept from before the detected start, so the first syllable isn't clipped
+VAD_TAIL_MS = 150  # trailing silence kept on each segment
+# A short pause closes a segment, which is transcribed right away while the user keeps talking;
+# a longer one ends the utterance, and only the last segment is left to transcribe.
+VAD_SEGMENT_SILENCE_MS = int(os.getenv("VAD_SEGMENT_SILENCE_MS", "350"))
+VAD_END_SILENCE_MS = int(os.getenv("VAD_END_SILENCE_MS", "800"))
+VAD_ENERGY_RATIO = float(os.getenv("VAD_ENERGY_RATIO", "3.0"))
+VAD_MIN_RMS = 0.003
+MAX_SEGMENT_S = 15  # cut long unbroken speech so the transcript keeps up
+
+
+# --- Audio buffer ---
+
+class PCMRingBuffer:
+    """
+    The most recent RING_SECONDS of float32 PCM in a fixed NumPy array.
+    Samples are addressed by absolute position since the stream began, so
+    segment boundaries stay valid as the ring wraps around.
+    """
+
+    def __init__(self, seconds=RING_SECONDS, sample_rate=WHISPER_SAMPLE_RATE):
+        self.capacity = int(seconds * sample_rate)
+        self._buffer = np.zeros(self.capacity, dtype=np.float32)
+        self.end = 0  # samples written so far
+
+    @property
+    def start(self):
+        """Oldest position still held."""
+        return max(0, self.end - self.capacity)
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) > self.capacity:
+            self.end += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        pos = self.end % self.capacity
+        first = min(len(samples), self.capacity - pos)
+        self._buffer[pos:pos + first] = samples[:first]
+        self._buffer[:len(samples) - first] = samples[first:]
+        self.end += len(samples)
+
+    def read(self, start, end):
+        """Copy of samples [start, end); anything already overwritten is skipped."""
+        start, end = max(start, self.start), min(end, self.end)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+        return self._buffer.take(np.arange(start, end) % self.capacity)
+
+
+# --- Voice activity detection ---
+
+class EnergyVAD:
+    """RMS energy against a noise floor that adapts during silence."""
+
+    def __init__(self, ratio=VAD_ENERGY_RATIO, min_rms=VAD_MIN_RMS):
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.noise = None
+
+    def is_speech(self, frame):
+        rms = float(np.sqrt(np.mean(frame * frame)))
+        if self.noise is None:
+            self.noise = rms
+        speech = rms > max(self.min_rms, self.noise * self.ratio)
+        if not speech:
+            self.noise = 0.95 * self.noise + 0.05 * rms
+        return speech
+
+
+class WebRTCVAD:
+    """Google's WebRTC VAD (pip install webrtcvad); far more robust to engine noise than energy."""
+
+    def __init__(self, aggressiveness=VAD_AGGRESSIVENESS, sample_rate=WHISPER_SAMPLE_RATE):
+        import webrtcvad
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.sample_rate = sample_rate
+
+    def is_speech(self, frame):
+        pcm = (np.clip(frame, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        return self.vad.is_speech(pcm, self.sample_rate)
+
+
+def make_vad(backend=VAD_BACKEND):
+    if backend in ("auto", "webrtc"):
+        try:
+            return WebRTCVAD()
+        except ImportError:
+            if backend == "webrtc":
+                raise
+    return EnergyVAD()
+
+
+class Segmenter:
+    """
+    Runs VAD over 30 ms frames as audio arrives and reports, by absolute
+    sample position: ("speech_start", pos), ("segment", start, end) when a
+    pause closes a stretch of speech, and ("utterance_end", pos) when the
+    user has stopped talking.
+    """
+
+    def __init__(self, ring, vad=None, sample_rate=WHISPER_SAMPLE_RATE):
+        self.ring = ring
+        self.vad = vad or make_vad()
+        self.sample_rate = sample_rate
+        self.frame = sample_rate * VAD_FRAME_MS // 1000
+        self._pos = ring.end  # next frame to classify
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._segment_start = None
+        self._in_utterance = False
+
+    def _ms(self, frames):
+        return frames * VAD_FRAME_MS
+
+    def _samples(self, ms):
+        return self.sample_rate * ms // 1000
+
+    def feed(self, samples):
+        self.ring.write(samples)
+        events = []
+        while self.ring.end - self._pos >= self.frame:
+            voiced = self.vad.is_speech(self.ring.read(self._pos, self._pos + self.frame))
+            self._pos += self.frame
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            self._silent_run = 0 if voiced else self._silent_run + 1
+
+            if self._segment_start is None:
+                if self._ms(self._voiced_run) >= VAD_START_MS:
+                    start = self._pos - self._voiced_run * self.frame - self._samples(VAD_PREROLL_MS)
+                    self._segment_start = max(self.ring.start, start)
+                    if not self._in_utterance:
+                        self._in_utterance = True
+                        events.append(("speech_start", self._segment_start))
+                elif self._in_utterance and self._ms(self._silent_run) >= VAD_END_SILENCE_MS:
+                    self._in_utterance = False
+                    events.append(("utterance_end", self._pos))
+                continue
+
+            if self._ms(self._silent_run) >= VAD_SEGMENT_SILENCE_MS:
+                silence = self._silent_run * self.frame
+                end = self._pos - max(0, silence - self._samples(VAD_TAIL_MS))
+                events.append(("segment", self._segment_start, end))
+                self._segment_start = None
+            elif self._pos - self._segment_start >= MAX_SEGMENT_S * self.sample_rate:
+                # Still talking: cut here and carry on from the cut, without pre-roll
+                events.append(("segment", self._segment_start, self._pos))
+                self._segment_start = self._pos
+                self._voiced_run = self._silent_run = 0
+        return events
+
+    def flush(self):
+        """Closes whatever is open, e.g. when the client says it's done talking."""
+        events = []
+        if self._segment_start is not None:
+            events.append(("segment", self._segment_start, self.ring.end))
+            self._segment_start = None
+        if self._in_utterance:
+            self._in_utterance = False
+            events.append(("utterance_end", self.ring.end))
+        self._voiced_run = self._silent_run = 0
+        return events
+
+
+# --- Incremental transcription ---
+
+def pcm_from_int16(data, sample_rate=WHISPER_SAMPLE_RATE):
+    """Little-endian 16-bit mono PCM bytes -> float32 at whisper's rate."""
+    pcm = np.frombuffer(data[:len(data) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+    return resample(pcm, sample_rate)
+
+
+class StreamingTranscriber:
+    """
+    Turns a live PCM stream into transcripts. Each segment goes to whisper
+    as soon as a pause closes it, so by the time the utterance ends most of
+    it is already transcribed.
+
+    Events come out of events() in order, as dicts: speech_start, partial
+    (one per segment) and transcript (the whole utterance).
+    """
+
+    def __init__(self, engine, vad=None, sample_rate=WHISPER_SAMPLE_RATE):
+        self.engine = engine
+        self.ring = PCMRingBuffer(sample_rate=sample_rate)
+        self.segmenter = Segmenter(self.ring, vad, sample_rate)
+        self.sample_rate = sample_rate
+        self._segments = []  # transcription tasks of the utterance in progress
+        self._pending = asyncio.Queue()  # events in order; (awaitable, make_event) pairs resolve in events()
+
+    def feed(self, samples):
+        """Adds float32 PCM at the engine's rate. Must be called on the event loop."""
+        self._handle(self.segmenter.feed(samples))
+
+    def flush(self):
+        self._handle(self.segmenter.flush())
+
+    def close(self):
+        self.flush()
+        self._pending.put_nowait(None)
+
+    def report_error(self, message):
+        """Queues an error event for the client, in order with the transcription events."""
+        self._pending.put_nowait({"type": "error", "error": message})
+
+    async def events(self):
+        while (item := await self._pending.get()) is not None:
+            if isinstance(item, dict):
+                yield item
+                continue
+            awaitable, make_event = item
+            try:
+                yield make_event(await awaitable)
+            except Exception as e:
+                yield {"type": "error", "error": f"Transcription failed: {e}"}
+
+    def _handle(self, events):
+        for kind, *span in events:
+            if kind == "speech_start":
+                self._pending.put_nowait({"type": "speech_start"})
+            elif kind == "segment":
+                pcm = self.ring.read(*span)
+                if len(pcm) < self.sample_rate // 4:
+                    continue  # a click, not a word
+                task = asyncio.ensure_future(self.engine.transcribe_samples(pcm))
+                self._segments.append(task)
+                self._pending.put_nowait((task, lambda text: {"type": "partial", "text": text}))
+            elif kind == "utterance_end":
+                segments, self._segments = self._segments, []
+                self._pending.put_nowait((
+                    asyncio.gather(*segments),
+                    lambda texts: {"type": "transcript", "text": " ".join(t for t in texts if t)},
+                ))
+
+
+async def listen_once(engine, blocks):
+    """Feeds PCM blocks (an async iterator) until the user finishes one utterance; returns its text."""
+    transcriber = StreamingTranscriber(engine)
+
+    async def pump():
+        async for block in blocks:
+            transcriber.feed(block)
+        transcriber.close()
+
+    feeder = asyncio.create_task(pump())
+    try:
+        async for event in transcriber.events():
+            if event["type"] == "speech_start":
+                print("🗣️  Listening...")
+            elif event["type"] == "partial":
+                print(f"   … {event['text']}")
+            elif event["type"] == "transcript":
+                return event["text"]
+    finally:
+        feeder.cancel()
+    return ""
@@ -0,0 +1,228 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+import httpx
+
+from metrics import metrics, CACHE_REQUESTS
+
+# --- Config ---
+# Point at a local stub server for testing, e.g. http://127.0.0.1:8081/v1/marine
+MARINE_API_URL = os.getenv("MARINE_API_URL", "https://marine-api.open-meteo.com/v1/marine")
+MARINE_HOURLY_FIELDS = "wave_height,wind_wave_height,sea_surface_temperature"
+# Open-Meteo hourly data only changes hourly
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "3600"))
+# Requests are snapped to this grid (degrees, ~11 km), about the marine model's resolution
+WEATHER_GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", "0.1"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1024"))
+WEATHER_MAX_CONNECTIONS = int(os.getenv("WEATHER_MAX_CONNECTIONS", "8"))
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "10"))
+# Cells per multi-location request (Open-Meteo takes comma-separated coordinates)
+WEATHER_BATCH_SIZE = int(os.getenv("WEATHER_BATCH_SIZE", "50"))
+
+WEATHER_FETCH_SECONDS = metrics.histogram(
+    "assistant_weather_fetch_seconds", "Marine API round trips.")
+
+
+class WeatherUnavailableError(Exception):
+    """The marine API can't be reached and nothing is cached for the location."""
+
+
+class WeatherAPIError(Exception):
+    """The marine API answered with an error payload (e.g. an invalid position)."""
+
+
+def snap_to_grid(lat, lon, grid=WEATHER_GRID_DEG):
+    """Rounds a position to the cache grid; nearby requests share one cell."""
+    return round(round(lat / grid) * grid, 4), round(round(lon / grid) * grid, 4)
+
+
+class MarineWeatherClient:
+    """
+    Async Open-Meteo marine client with a shared connection pool.
+
+    Responses are cached per grid cell for WEATHER_CACHE_TTL seconds, and
+    concurrent requests for the same cell share one in-flight fetch. When the
+    API is unreachable (ships are often offline) the last response for the
+    cell is served regardless of age, flagged as stale. After a restart that
+    response comes from `fallback` (the weather store on disk).
+    """
+
+    def __init__(self, base_url=MARINE_API_URL, ttl=WEATHER_CACHE_TTL, grid=WEATHER_GRID_DEG,
+                 cache_size=WEATHER_CACHE_SIZE, max_connections=WEATHER_MAX_CONNECTIONS,
+                 timeout=WEATHER_TIMEOUT, on_fresh=None, fallback=None, batch_size=WEATHER_BATCH_SIZE):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.grid = grid
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.on_fresh = on_fresh  # called as on_fresh(cell, data) after each successful fetch
+        self.fallback = fallback  # fallback(cell) -> (fetched_at, data) or None, for cells not in memory
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._cache = OrderedDict()  # cell -> (fetched_at, data)
+        self._in_flight = {}         # cell -> task
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_served = 0
+        self.errors = 0
+        self.requests = 0
+
+    async def fetch(self, lat, lon):
+        """
+        Returns (data, meta) for the grid cell containing (lat, lon).
+        meta["cache"] is "hit", "miss" or "stale".
+        """
+        result = (await self.fetch_many([(lat, lon)]))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def fetch_many(self, positions):
+        """
+        fetch() for many positions at once. Cells that aren't cached or in
+        flight are fetched WEATHER_BATCH_SIZE at a time with Open-Meteo's
+        multi-location requests, the batches in parallel within the connection
+        pool's limit. Returns, in order, (data, meta) per position,
+        or the WeatherUnavailableError / WeatherAPIError for that position.
+        """
+        cells = [snap_to_grid(lat, lon, self.grid) for lat, lon in positions]
+        results, waiting, to_fetch = {}, {}, []
+        for cell in dict.fromkeys(cells):
+            cached = self._cache.get(cell)
+            if cached and time.time() - cached[0] < self.ttl:
+                self._cache.move_to_end(cell)
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="weather", result="hit")
+                results[cell] = (cached[1], self._meta(cell, "hit", cached[0]))
+            elif cell in self._in_flight:
+                self.coalesced += 1
+                CACHE_REQUESTS.inc(cache="weather", result="coalesced")
+                waiting[cell] = self._in_flight[cell]
+            else:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache="weather", result="miss")
+                to_fetch.append(cell)
+
+        for i in range(0, len(to_fetch), self.batch_size):
+            batch = asyncio.ensure_future(self._fetch_batch(to_fetch[i:i + self.batch_size]))
+            for cell in to_fetch[i:i + self.batch_size]:
+                task = asyncio.ensure_future(self._pick(batch, cell))
+                self._in_flight[cell] = waiting[cell] = task
+                task.add_done_callback(lambda _, cell=cell: self._in_flight.pop(cell, None))
+
+        for cell, task in waiting.items():
+            results[cell] = await self._resolve(cell, task)
+        return [results[cell] for cell in cells]
+
+    @staticmethod
+    async def _pick(batch, cell):
+        result = (await asyncio.shield(batch))[cell]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def _resolve(self, cell, task):
+        """Waits for a cell's fetch; on a network failure falls back to the last known data."""
+        try:
+            fetched_at, data = await asyncio.shield(task)
+            return data, self._meta(cell, "miss", fetched_at)
+        except WeatherAPIError as e:
+            return e
+        except (httpx.HTTPError, ValueError) as e:
+            cached = self._cache.get(cell)
+            if not cached and self.fallback:
+                cached = await asyncio.to_thread(self.fallback, cell)
+                if cached:
+                    self._remember(cell, *cached)
+            if cached:
+                self.stale_served += 1
+                CACHE_REQUESTS.inc(cache="weather", result="stale")
+                print(f"⚠️ Marine API unavailable ({e}); serving cached data for {cell}.")
+                return cached[1], self._meta(cell, "stale", cached[0])
+            return WeatherUnavailableError(f"Network error: {e}")
+
+    async def _fetch_batch(self, cells):
+        """Fetches several cells in one request. Returns {cell: (fetched_at, data)}."""
+        try:
+            responses = await self._request(cells)
+        except WeatherAPIError:
+            if len(cells) == 1:
+                raise
+            # One bad position fails the whole request; ask again cell by cell so the rest still get data
+            results = {}
+            for cell in cells:
+                try:
+                    results.update(await self._fetch_batch([cell]))
+                except WeatherAPIError as e:
+                    results[cell] = e
+            return results
+
+        fetched_at = time.time()
+        results = {}
+        for cell, data in zip(cells, responses):
+            self._remember(cell, fetched_at, data)
+            results[cell] = (fetched_at, data)
+            if self.on_fresh:
+                try:
+                    await asyncio.to_thread(self.on_fresh, cell, data)
+                except Exception as e:
+                    print(f"⚠️ Weather on_fresh hook failed: {e}")
+        return results
+
+    async def _request(self, cells):
+        """One API call for `cells`; returns their responses in order."""
+        params = {
+            "latitude": ",".join(str(lat) for lat, _ in cells),
+            "longitude": ",".join(str(lon) for _, lon in cells),
+            "hourly": MARINE_HOURLY_FIELDS,
+        }
+        try:
+            self.requests += 1
+            with WEATHER_FETCH_SECONDS.time():
+                response = await self._http.get(self.base_url, params=params)
+            if response.status_code == 400:
+                # Open-Meteo reports bad coordinates as {"error": true, "reason": ...}
+                raise WeatherAPIError(response.json().get("reason", "Bad request."))
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            self.errors += 1
+            raise
+        # Several locations come back as a list, one object per location
+        responses = data if isinstance(data, list) else [data]
+        for item in responses:
+            if "error" in item:
+                # The API answered; a bad request isn't something stale data should mask
+                raise WeatherAPIError(item.get("reason", "Unknown API error."))
+        if len(responses) != len(cells):
+            raise ValueError(f"Expected {len(cells)} locations, got {len(responses)}.")
+        return responses
+
+    def _remember(self, cell, fetched_at, data):
+        self._cache[cell] = (fetched_at, data)
+        self._cache.move_to_end(cell)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _meta(self, cell, status, fetched_at):
+        return {"cache": status, "cell": list(cell), "age_s": round(time.time() - fetched_at, 1)}
+
+    def stats(self):
+        return {
+            "cells": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale_served": self.stale_served,
+            "errors": self.errors,
+            "requests": self.requests,
+        }
+
+    async def close(self):
+        await self._http.aclose()
+
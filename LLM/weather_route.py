@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+
+from weather_client import WEATHER_GRID_DEG, WeatherAPIError, WeatherUnavailableError, snap_to_grid
+from weather_store import FIELDS, parse_forecast
+
+# --- Config ---
+ROUTE_MAX_WAYPOINTS = int(os.getenv("ROUTE_MAX_WAYPOINTS", "200"))
+EARTH_RADIUS_NM = 3440.065
+
+
+def schedule_etas(lats, lons, departure, speed_knots):
+    """ETAs (unix seconds) at each waypoint for a constant speed along great-circle legs."""
+    lat, lon = np.radians(lats), np.radians(lons)
+    dlat, dlon = np.diff(lat), np.diff(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    legs_nm = 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(a))
+    return departure + np.r_[0.0, np.cumsum(legs_nm)] / speed_knots * 3600
+
+
+def _corners(lats, lons, grid):
+    """The four surrounding grid cells of each point and their bilinear weights."""
+    y, x = np.asarray(lats) / grid, np.asarray(lons) / grid
+    y0, x0 = np.floor(y), np.floor(x)
+    fy, fx = y - y0, x - x0
+    corner_lat = np.stack([y0, y0, y0 + 1, y0 + 1], axis=1) * grid
+    corner_lon = np.stack([x0, x0 + 1, x0, x0 + 1], axis=1) * grid
+    weights = np.stack([(1 - fy) * (1 - fx), (1 - fy) * fx, fy * (1 - fx), fy * fx], axis=1)
+    return corner_lat, corner_lon, weights
+
+
+def _series_matrix(forecasts, field, axis):
+    """Resamples every cell's hourly series of `field` onto a shared time axis (NaN outside)."""
+    matrix = np.full((len(forecasts), len(axis)), np.nan)
+    for row, forecast in enumerate(forecasts):
+        if forecast is None:
+            continue
+        t, values = forecast["time"].astype("float64"), forecast[field].astype("float64")
+        if len(t):
+            matrix[row] = np.interp(axis, t, values, left=np.nan, right=np.nan)
+    return matrix
+
+
+async def route_forecast(client, lats, lons, etas, grid=WEATHER_GRID_DEG):
+    """
+    Forecast at each waypoint at its ETA: values are interpolated linearly in
+    time between forecast hours and bilinearly in space between the four
+    surrounding grid cells (ignoring cells without data, e.g. over land).
+
+    Every grid cell the route touches is fetched once, through the client's
+    multi-location requests: a 200-waypoint route costs a handful of API
+    calls, not one per cell.
+    """
+    lats, lons, etas = (np.asarray(v, dtype="float64") for v in (lats, lons, etas))
+    corner_lat, corner_lon, weights = _corners(lats, lons, grid)
+    # Points on a grid line get zero-weight corners; point those at a cell we fetch anyway
+    best = weights.argmax(axis=1)[:, None]
+    unused = weights == 0
+    corner_lat = np.where(unused, np.take_along_axis(corner_lat, best, axis=1), corner_lat)
+    corner_lon = np.where(unused, np.take_along_axis(corner_lon, best, axis=1), corner_lon)
+
+    # Dedupe: most neighbouring waypoints share cells
+    keys = [snap_to_grid(a, b, grid) for a, b in zip(corner_lat.ravel(), corner_lon.ravel())]
+    cells = list(dict.fromkeys(keys))
+    cell_index = {cell: i for i, cell in enumerate(cells)}
+    idx = np.array([cell_index[key] for key in keys]).reshape(corner_lat.shape)
+
+    cache_counts = {"hit": 0, "miss": 0, "stale": 0}
+    missing, forecasts = [], []
+    for cell, result in zip(cells, await client.fetch_many(cells)):
+        if isinstance(result, (WeatherUnavailableError, WeatherAPIError)):
+            missing.append({"cell": list(cell), "error": str(result)})
+            forecasts.append(None)
+            continue
+        data, meta = result
+        cache_counts[meta["cache"]] += 1
+        forecasts.append(parse_forecast(data))
+
+    # Shared time axis; cells of one forecast run line up exactly, so this is usually one cell's axis
+    times = [f["time"] for f in forecasts if f is not None and len(f["time"])]
+    axis = np.unique(np.concatenate(times)).astype("float64") if times else np.zeros(0)
+
+    result = {name: np.full(len(lats), np.nan) for name in FIELDS}
+    in_range = np.zeros(len(lats), dtype=bool)
+    if len(axis) >= 2:
+        # Time: position of each ETA between two forecast hours
+        k1 = np.clip(np.searchsorted(axis, etas), 1, len(axis) - 1)
+        k0 = k1 - 1
+        frac = ((etas - axis[k0]) / (axis[k1] - axis[k0]))[:, None]
+        in_range = (etas >= axis[0]) & (etas <= axis[-1])
+
+        for name in FIELDS:
+            matrix = _series_matrix(forecasts, name, axis)
+            at_eta = matrix[idx, k0[:, None]] * (1 - frac) + matrix[idx, k1[:, None]] * frac
+            # Space: bilinear weights, renormalized over corners that have data
+            w = np.where(np.isnan(at_eta), 0.0, weights)
+            total = w.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = np.nansum(w * np.nan_to_num(at_eta), axis=1) / total
+            values[(total == 0) | ~in_range] = np.nan
+            result[name] = values
+
+    return {
+        "points": result,
+        "in_range": in_range,
+        "cells": len(cells),
+        "cache": cache_counts,
+        "missing_cells": missing,
+    }
@@ -0,0 +1,305 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# --- Config ---
+WEATHER_STORE_PATH = "weather_store"
+WAVE_ALERT_M = float(os.getenv("WAVE_ALERT_M", "2.5"))
+SUMMARY_WINDOW_HOURS = int(os.getenv("WEATHER_SUMMARY_HOURS", "24"))
+
+# One file per column; row i of every file is the same observation
+COLUMNS = {
+    "cell": "<i4",        # index into cells.json
+    "time": "<i8",        # forecast hour, unix seconds (UTC)
+    "fetched": "<i8",     # when the forecast was fetched, unix seconds
+    "wave_height": "<f4",
+    "wind_wave_height": "<f4",
+    "sea_surface_temperature": "<f4",
+}
+FIELDS = ("wave_height", "wind_wave_height", "sea_surface_temperature")
+
+
+def _format_time(t):
+    return str(np.datetime64(int(t), "s").astype("datetime64[m]"))
+
+
+def parse_forecast(data):
+    """Hourly columns of an Open-Meteo marine response: UTC unix-second times, NaN for nulls."""
+    hourly = data.get("hourly", {})
+    # Hourly times are local to the response's utc_offset (GMT unless a timezone was asked for)
+    t = np.array(hourly.get("time", []), dtype="datetime64[m]").astype("datetime64[s]").astype("<i8")
+    t -= int(data.get("utc_offset_seconds", 0))
+
+    columns = {"time": t}
+    for field in FIELDS:
+        values = hourly.get(field) or [None] * len(t)
+        columns[field] = np.array([np.nan if v is None else v for v in values[:len(t)]], dtype="<f4")
+    return columns
+
+
+class WeatherStore:
+    """
+    Append-only, columnar store of marine forecasts.
+
+    Every fetch appends its hourly rows to per-column files that are read back
+    memory-mapped. An in-memory index keeps, per grid cell, the row range of
+    its newest forecast and a cached summary, so the latest summary for a
+    position is a dictionary lookup. History is never rewritten.
+    """
+
+    def __init__(self, path=WEATHER_STORE_PATH):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.cells_path = os.path.join(path, "cells.json")
+        self._lock = threading.Lock()
+        self._cells = []           # cell id -> (lat, lon)
+        self._cell_ids = {}        # (lat, lon) -> cell id
+        self._latest = {}          # cell id -> (start, end) of the newest forecast's rows
+        self._summaries = {}       # cell id -> (hour, summary)
+        self.latest_cell = None
+
+        if os.path.exists(self.cells_path):
+            with open(self.cells_path) as f:
+                self._cells = [tuple(cell) for cell in json.load(f)]
+            self._cell_ids = {cell: i for i, cell in enumerate(self._cells)}
+        self._truncate()
+        self._map()
+        self._build_index()
+
+    # --- Files ---
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _truncate(self):
+        """Cuts every column to the shortest one (drops a torn tail from an interrupted append)."""
+        sizes = {}
+        for name, dtype in COLUMNS.items():
+            column_path = self._column_path(name)
+            if not os.path.exists(column_path):
+                open(column_path, "wb").close()
+            sizes[name] = os.path.getsize(column_path) // np.dtype(dtype).itemsize
+        rows = min(sizes.values())
+        for name, dtype in COLUMNS.items():
+            if sizes[name] != rows:
+                with open(self._column_path(name), "r+b") as f:
+                    f.truncate(rows * np.dtype(dtype).itemsize)
+
+    def _map(self):
+        self.rows = os.path.getsize(self._column_path("cell")) // 4
+        self.columns = {
+            name: (np.memmap(self._column_path(name), dtype=dtype, mode="r", shape=(self.rows,))
+                   if self.rows else np.zeros(0, dtype=dtype))
+            for name, dtype in COLUMNS.items()
+        }
+
+    def _build_index(self):
+        """Finds each cell's newest forecast: rows of one fetch are contiguous."""
+        if not self.rows:
+            return
+        cell, fetched = self.columns["cell"], self.columns["fetched"]
+        starts = np.flatnonzero(np.r_[True, (cell[1:] != cell[:-1]) | (fetched[1:] != fetched[:-1])])
+        ends = np.r_[starts[1:], self.rows]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self._latest[int(cell[start])] = (start, end)
+        self.latest_cell = int(cell[-1])
+
+    # --- Writes ---
+
+    def append(self, cell, data, fetched_at=None):
+        """Appends the hourly rows of one Open-Meteo response for a grid cell."""
+        columns = parse_forecast(data)
+        n = len(columns["time"])
+        if not n:
+            return 0
+
+        with self._lock:
+            cell = tuple(cell)
+            if cell not in self._cell_ids:
+                self._cell_ids[cell] = len(self._cells)
+                self._cells.append(cell)
+                tmp_path = self.cells_path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(self._cells, f)
+                os.replace(tmp_path, self.cells_path)
+            cell_id = self._cell_ids[cell]
+            columns["cell"] = np.full(n, cell_id, dtype="<i4")
+            columns["fetched"] = np.full(n, int(fetched_at or time.time()), dtype="<i8")
+
+            for name, dtype in COLUMNS.items():
+                with open(self._column_path(name), "ab") as f:
+                    f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+            start = self.rows
+            self._map()
+            self._latest[cell_id] = (start, start + n)
+            self._summaries.pop(cell_id, None)
+            self.latest_cell = cell_id
+        return n
+
+    # --- Reads ---
+
+    def forecast(self, cell):
+        """Column arrays of the newest forecast for a grid cell, or None."""
+        cell_id = self._cell_ids.get(tuple(cell))
+        if cell_id is None:
+            return None
+        return self._forecast(cell_id)
+
+    def latest_response(self, cell):
+        """
+        The newest stored forecast for a grid cell, rebuilt as an Open-Meteo
+        response: (fetched_at, data), or None. Lets stale data be served after
+        a restart with no network.
+        """
+        cell_id = self._cell_ids.get(tuple(cell))
+        if cell_id is None:
+            return None
+        forecast = self._forecast(cell_id)
+        hourly = {"time": [_format_time(t) for t in forecast["time"]]}
+        for field in FIELDS:
+            hourly[field] = [None if np.isnan(v) else round(float(v), 2) for v in forecast[field]]
+        lat, lon = self._cells[cell_id]
+        data = {"latitude": lat, "longitude": lon, "utc_offset_seconds": 0, "timezone": "GMT", "hourly": hourly}
+        return int(self.columns["fetched"][self._latest[cell_id][0]]), data
+
+    def _forecast(self, cell_id):
+        start, end = self._latest[cell_id]
+        return {name: self.columns[name][start:end] for name in ("time", *FIELDS)}
+
+    def history(self, cell, field, since=None, until=None):
+        """
+        Every stored value of `field` for a cell, one per forecast hour, taken
+        from the newest fetch that covered that hour. Returns (times, values).
+        """
+        cell_id = self._cell_ids.get(tuple(cell))
+        if cell_id is None:
+            return np.zeros(0, dtype="<i8"), np.zeros(0, dtype="<f4")
+        t = self.columns["time"]
+        mask = self.columns["cell"] == cell_id
+        if since is not None:
+            mask &= t >= since
+        if until is not None:
+            mask &= t <= until
+        rows = np.flatnonzero(mask)
+        # Rows are in append order, so the last row per hour is the freshest forecast
+        times, last = np.unique(t[rows][::-1], return_index=True)
+        picked = rows[::-1][last]
+        return times, np.asarray(self.columns[field][picked])
+
+    def summary(self, cell=None, now=None):
+        """
+        Summary stats for a cell (default: the most recently fetched one),
+        cached until the hour changes.
+        """
+        cell_id = self.latest_cell if cell is None else self._cell_ids.get(tuple(cell))
+        if cell_id is None:
+            return None
+        now = int(now or time.time())
+        hour = now // 3600
+        cached = self._summaries.get(cell_id)
+        if cached and cached[0] == hour:
+            return cached[1]
+        result = summarize_forecast(self._forecast(cell_id), now)
+        if result:
+            result["cell"] = list(self._cells[cell_id])
+        self._summaries[cell_id] = (hour, result)
+        return result
+
+    def stats(self):
+        return {
+            "rows": self.rows,
+            "cells": len(self._cells),
+            "bytes": sum(os.path.getsize(self._column_path(name)) for name in COLUMNS),
+        }
+
+
+# --- Vectorized summaries ---
+
+def _trend_per_hour(hours, values):
+    """Least-squares slope in units per hour, ignoring NaNs."""
+    ok = ~np.isnan(values)
+    if ok.sum() < 2:
+        return 0.0
+    x, y = hours[ok], values[ok]
+    x = x - x.mean()
+    return float((x * (y - y.mean())).sum() / (x * x).sum())
+
+
+def summarize_forecast(forecast, now, window_hours=SUMMARY_WINDOW_HOURS, wave_alert=WAVE_ALERT_M):
+    """
+    Current conditions plus min/max/mean, trend and wave-height alerts over
+    the next `window_hours` of a forecast (columns as returned by WeatherStore).
+    """
+    t = np.asarray(forecast["time"])
+    if not len(t):
+        return None
+    waves = np.asarray(forecast["wave_height"])
+    if np.isnan(waves).all():
+        return None
+
+    # "Now" is the last forecast hour that has started; old data falls back to its final window
+    current = max(0, int(np.searchsorted(t, now, side="right")) - 1)
+    window = (t >= t[current]) & (t < t[current] + window_hours * 3600)
+    if window.sum() < 2:
+        window = t >= t[-1] - window_hours * 3600
+        current = int(np.flatnonzero(window)[0])
+    hours = (t[window] - t[window][0]) / 3600.0
+
+    result = {"time": _format_time(t[current]), "window_hours": window_hours, "current": {}, "next": {}}
+    for field in FIELDS:
+        values = np.asarray(forecast[field], dtype="float64")
+        in_window = values[window]
+        if np.isnan(in_window).all():
+            continue
+        result["current"][field] = None if np.isnan(values[current]) else round(float(values[current]), 2)
+        result["next"][field] = {
+            "min": round(float(np.nanmin(in_window)), 2),
+            "max": round(float(np.nanmax(in_window)), 2),
+            "mean": round(float(np.nanmean(in_window)), 2),
+            "trend_per_hour": round(_trend_per_hour(hours, in_window), 3),
+        }
+
+    wave_window = waves[window]
+    result["wave_alert"] = None
+    if np.isnan(wave_window).all():
+        return result  # waves known outside the window only: no range or alert to give
+    above = np.flatnonzero(wave_window >= wave_alert)  # NaN compares False
+    peak = int(np.nanargmax(wave_window))
+    result["wave_alert"] = {
+        "threshold_m": wave_alert,
+        "hours_above": int(len(above)),
+        "first_above": _format_time(t[window][above[0]]) if len(above) else None,
+        "peak_m": round(float(wave_window[peak]), 2),
+        "peak_time": _format_time(t[window][peak]),
+    }
+    return result
+
+
+def summary_text(stats):
+    """Turns a summary dict into the assistant's one-paragraph report."""
+    if not stats:
+        return "⚠️ Weather data is incomplete."
+    current, upcoming, alert = stats["current"], stats["next"], stats["wave_alert"]
+
+    text = f"🌊 At {stats['time']},"
+    if current.get("wave_height") is not None:
+        text += f" the waves are about {current['wave_height']:.1f} meters high."
+    if current.get("wind_wave_height") is not None:
+        text += f" Wind-driven waves are about {current['wind_wave_height']:.1f} meters."
+    if current.get("sea_surface_temperature") is not None:
+        text += f" Sea surface temperature is around {current['sea_surface_temperature']:.1f}°C."
+
+    waves = upcoming.get("wave_height")
+    if waves:
+        trend = waves["trend_per_hour"] * stats["window_hours"]
+        direction = "building" if trend > 0.2 else "easing" if trend < -0.2 else "steady"
+        text += (f" Over the next {stats['window_hours']} hours waves range {waves['min']:.1f}–{waves['max']:.1f} m"
+                 f" (avg {waves['mean']:.1f} m), {direction}.")
+    if alert and alert["hours_above"]:
+        text += (f" ⚠️ Waves above {alert['threshold_m']:.1f} m from {alert['first_above']},"
+                 f" peaking at {alert['peak_m']:.1f} m around {alert['peak_time']}.")
+    text += " Stay safe out there, captain."
+    return text
@@ -1,7 +1,26 @@
 import subprocess
 import os
+import io
+import wave
+import queue
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
-def whisper_transcript(file_name, model="tiny.en"):
+import numpy as np
+
+from metrics import metrics
+from resources import plan, pin_thread
+
+WHISPER_SAMPLE_RATE = 16000
+
+WHISPER_SECONDS = metrics.histogram(
+    "assistant_whisper_seconds", "Transcription time per clip.", ["mode"])
+WHISPER_AUDIO_SECONDS = metrics.counter(
+    "assistant_whisper_audio_seconds_total", "Seconds of audio transcribed.")
+
+
+def whisper_transcript(file_name, model="tiny.en", n_threads=None):
     model_bin = f"ggml-{model}.bin"
     model_path = os.path.join("whisper.cpp", "models", model_bin)
     cli_path = os.path.join("whisper.cpp", "build", "bin", "Release", "whisper-cli.exe")
@@ -15,12 +34,137 @@ def whisper_transcript(file_name, model="tiny.en"):
         "-m", model_path,
         "-f", file_name,
         "-nt",
-        "-otxt"
+        "-otxt",
+        "-t", str(n_threads or plan.whisper_threads()),
     ]
 
     result = subprocess.run(cmd, capture_output=True, text=True, check=True)
     return result.stdout.strip()
 
 
+# --- In-memory audio decoding ---
+
+def decode_wav_bytes(data: bytes) -> np.ndarray:
+    """Decodes WAV bytes into the mono float32 16 kHz PCM whisper.cpp expects."""
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        sample_rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if sample_width == 2:
+        pcm = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        pcm = np.frombuffer(frames, dtype=np.int32).astype(np.float32) / 2147483648.0
+    elif sample_width == 1:
+        pcm = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {sample_width} bytes")
+
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1)
+
+    return resample(pcm, sample_rate)
+
+
+def resample(pcm: np.ndarray, sample_rate: int, target_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """Linear resampling, good enough for speech going into whisper."""
+    if sample_rate == target_rate or len(pcm) == 0:
+        return np.ascontiguousarray(pcm, dtype=np.float32)
+    duration = len(pcm) / sample_rate
+    target_len = int(round(duration * target_rate))
+    src_t = np.linspace(0.0, duration, num=len(pcm), endpoint=False)
+    dst_t = np.linspace(0.0, duration, num=target_len, endpoint=False)
+    return np.interp(dst_t, src_t, pcm).astype(np.float32)
+
+
+# --- Persistent transcription engine ---
+
+class WhisperEngine:
+    """
+    Keeps whisper.cpp models loaded in-process and serves transcriptions
+    from a bounded worker pool. Each worker owns its own model context,
+    since a whisper context can't be shared between concurrent calls.
+    Falls back to spawning whisper-cli when the bindings are unavailable.
+    """
+
+    def __init__(self, model="tiny.en", workers=1, n_threads=None):
+        self.model = model
+        self.model_path = os.path.join("whisper.cpp", "models", f"ggml-{model}.bin")
+        self.workers = max(1, workers)
+        self.n_threads = n_threads or plan.whisper_threads(self.workers)
+        self._contexts = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="whisper",
+                                            initializer=pin_thread, initargs=("whisper",))
+        self.in_process = False
+
+    def load(self):
+        """Loads one model context per worker. Call once at startup."""
+        try:
+            from pywhispercpp.model import Model
+        except ImportError:
+            print("⚠️ pywhispercpp not installed, falling back to whisper-cli.")
+            return self
+
+        for _ in range(self.workers):
+            self._contexts.put(Model(self.model_path, n_threads=self.n_threads, print_progress=False,
+                                     print_realtime=False))
+        self.in_process = True
+        print(f"🎙️ Whisper {self.model} loaded in-process ({self.workers} worker(s)).")
+        return self
+
+    def transcribe_pcm(self, pcm: np.ndarray) -> str:
+        """Transcribes mono float32 16 kHz PCM, blocking the calling thread."""
+        WHISPER_AUDIO_SECONDS.inc(len(pcm) / WHISPER_SAMPLE_RATE)
+        if not self.in_process:
+            with WHISPER_SECONDS.time(mode="cli"):
+                return self._transcribe_with_cli(pcm)
+
+        ctx = self._contexts.get()
+        try:
+            with WHISPER_SECONDS.time(mode="in_process"):
+                segments = ctx.transcribe(pcm)
+        finally:
+            self._contexts.put(ctx)
+        return " ".join(seg.text.strip() for seg in segments).strip()
+
+    def transcribe_bytes(self, data: bytes) -> str:
+        """Transcribes an uploaded WAV held in memory."""
+        return self.transcribe_pcm(decode_wav_bytes(data))
+
+    async def transcribe(self, data: bytes) -> str:
+        """Async entry point: runs the transcription on the worker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.transcribe_bytes, data)
+
+    async def transcribe_samples(self, pcm: np.ndarray) -> str:
+        """Same, for PCM already decoded (e.g. a segment of a live stream)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.transcribe_pcm, pcm)
+
+    def _transcribe_with_cli(self, pcm: np.ndarray) -> str:
+        """Subprocess fallback: writes a temp 16-bit WAV and runs whisper-cli."""
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+            audio_path = tmp.name
+        try:
+            with wave.open(audio_path, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(WHISPER_SAMPLE_RATE)
+                wav.writeframes((np.clip(pcm, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+            return whisper_transcript(audio_path, self.model, self.n_threads)
+        finally:
+            os.remove(audio_path)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def init_whisper(model="tiny.en", workers=None):
+    """Builds and loads the shared transcription engine."""
+    workers = workers or int(os.getenv("WHISPER_WORKERS", "1"))
+    return WhisperEngine(model, workers=workers).load()
+
+
 if __name__ == "__main__":
-    print(whisper_transcript("harvard.wav"))
\ No newline at end of file
+    print(whisper_transcript("harvard.wav"))